@@ -1,11 +1,17 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from src.auth.routes import router as auth_router
 from src.routes.leads import router as leads_router
 from src.routes.campaigns import router as campaigns_router
 from src.routes.analytics import router as analytics_router
-from src.database.connection import create_tables, get_redis
-from src.database.migrations import run_migrations
+from src.database.connection import create_tables, get_redis, get_pool_stats, engine, SessionLocal
+from src.database.query_counter import QueryBudgetMiddleware, install_request_query_counter
+from src.database.migrations import run_migrations, maintain_search_event_partitions
+from src.services.analytics import AnalyticsService, tune_analytics_ttls
+from src.services.search_analytics_tracker import start_search_event_writer, stop_search_event_writer
+from src.cache.manager import CacheManager
+import asyncio
 import os
 import logging
 
@@ -33,6 +39,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Optional N+1 guard: log analytics requests that exceed their statement budget
+if os.getenv("LOG_QUERY_BUDGET", "false").lower() == "true":
+    install_request_query_counter(engine)
+    app.add_middleware(
+        QueryBudgetMiddleware,
+        budgets={"/analytics": int(os.getenv("ANALYTICS_QUERY_BUDGET", "10"))}
+    )
+
+# Seconds between refreshes of the analytics materialized views (0 disables)
+ANALYTICS_VIEW_REFRESH_SECONDS = int(os.getenv("ANALYTICS_VIEW_REFRESH_SECONDS", "300"))
+
+def refresh_analytics_views():
+    """Refresh the analytics materialized views on a dedicated session.
+    
+    Every uvicorn worker runs its own refresh loop; a Redis job lock lets only
+    one of them refresh per interval (without Redis each worker refreshes).
+    """
+    cache = CacheManager(get_redis())
+    if not cache.acquire_job_lock("analytics_view_refresh", ANALYTICS_VIEW_REFRESH_SECONDS - 1):
+        return
+    
+    db = SessionLocal()
+    try:
+        AnalyticsService(db, cache).refresh_analytics_views()
+    finally:
+        db.close()
+
+async def refresh_analytics_views_periodically(interval: int):
+    """Keep the analytics materialized views at most `interval` seconds stale"""
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(refresh_analytics_views)
+
+# Seconds between analytics cache TTL tuning rounds (0 disables)
+ANALYTICS_TTL_TUNE_SECONDS = int(os.getenv("ANALYTICS_TTL_TUNE_SECONDS", "900"))
+
+async def tune_analytics_ttls_periodically(interval: int):
+    """Retune analytics cache TTLs from the recorded hit/miss/stale counters"""
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(tune_analytics_ttls, get_redis())
+
+# Seconds between search event partition maintenance rounds (0 disables)
+SEARCH_EVENT_PARTITION_MAINTENANCE_SECONDS = int(os.getenv("SEARCH_EVENT_PARTITION_MAINTENANCE_SECONDS", "86400"))
+
+async def maintain_search_event_partitions_periodically(interval: int):
+    """Keep next months' search event partitions in place and drop expired ones"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(maintain_search_event_partitions)
+        except Exception as e:
+            logger.error(f"Search event partition maintenance failed: {e}")
+
+# Periodic tasks started on startup, cancelled on shutdown
+background_tasks = []
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and services on startup"""
@@ -54,11 +117,40 @@ async def startup_event():
             logger.info("Redis connection established")
         else:
             logger.warning("Redis not available - cache disabled")
+        
+        if ANALYTICS_VIEW_REFRESH_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(
+                refresh_analytics_views_periodically(ANALYTICS_VIEW_REFRESH_SECONDS)
+            ))
+        
+        if redis_client and ANALYTICS_TTL_TUNE_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(
+                tune_analytics_ttls_periodically(ANALYTICS_TTL_TUNE_SECONDS)
+            ))
+        
+        if SEARCH_EVENT_PARTITION_MAINTENANCE_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(
+                maintain_search_event_partitions_periodically(SEARCH_EVENT_PARTITION_MAINTENANCE_SECONDS)
+            ))
+        
+        # Search events and popular-search counts are written in batches by a
+        # background thread
+        start_search_event_writer(SessionLocal, CacheManager(redis_client) if redis_client else None)
             
     except Exception as e:
         logger.error(f"Startup failed: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the periodic tasks and write any search events and popular-search counts still buffered"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    
+    await run_in_threadpool(stop_search_event_writer)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(leads_router)
@@ -102,6 +194,7 @@ def health_check():
     return {
         "status": "healthy",
         "database": "connected",
+        "database_pool": get_pool_stats(),
         "redis": "connected" if redis_client else "disconnected",
         "scraping": "available" if scraping_available else "unavailable",
         "version": "1.0.0",
@@ -16,12 +16,14 @@ SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# bcrypt cost factor; only lowered for test runs (minimum 4)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
 # Enhanced password context with stronger settings
 pwd_context = CryptContext(
     schemes=["bcrypt"], 
     deprecated="auto",
-    bcrypt__rounds=12  # Increased rounds for better security
+    bcrypt__rounds=BCRYPT_ROUNDS  # 12 by default for better security
 )
 security = HTTPBearer(auto_error=False)  # Don't auto-error for optional auth
 
@@ -6,11 +6,17 @@ Provides Redis-based caching with TTL and invalidation logic
 from .manager import CacheManager
 from .decorators import cache_result, cache_search_results, cache_lead_data
 from .config import CacheConfig
+from .local import LocalTTLCache
+from .buffer import BatchBuffer
+from .policy import MemoPolicy
 
 __all__ = [
     'CacheManager',
     'cache_result',
     'cache_search_results', 
     'cache_lead_data',
-    'CacheConfig'
+    'CacheConfig',
+    'LocalTTLCache',
+    'BatchBuffer',
+    'MemoPolicy'
 ]
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Per-process write buffers flushed in batches
+"""
+import threading
+import time
+from typing import Any, List, Optional
+
+class BatchBuffer:
+    """Thread-safe buffer of items waiting for a batched write.
+
+    add() reports when a flush is due: `batch_size` items are waiting or the
+    oldest is `max_age` seconds old. A failed write hands its items back with
+    requeue(), which keeps the newest `limit` items and holds further flushes
+    off for a backoff that doubles with each consecutive failure (up to
+    `max_backoff` seconds); flushed() clears it after a successful write.
+
+    `flushed_in_background` is set while a background thread owns the
+    flushing, so request handlers leave due batches to it.
+    """
+
+    def __init__(self, batch_size: int, max_age: float, limit: int, max_backoff: float = 60.0):
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.limit = limit
+        self.max_backoff = max_backoff
+        self.flushed_in_background = False
+        self._items: List[Any] = []
+        self._oldest: Optional[float] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._due = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: Any) -> bool:
+        """Buffer an item; True when the buffer is due for a flush"""
+        with self._lock:
+            now = time.monotonic()
+            if not self._items:
+                self._oldest = now
+            self._items.append(item)
+            due = (
+                (len(self._items) >= self.batch_size or now - self._oldest >= self.max_age)
+                and now >= self._retry_at
+            )
+        if due:
+            self._due.set()
+        return due
+
+    def ready(self) -> bool:
+        """Whether a write may be attempted (not backing off after a failure)"""
+        return time.monotonic() >= self._retry_at
+
+    def wait_due(self, timeout: float) -> None:
+        """Block until a flush is due or `timeout` seconds have passed"""
+        self._due.wait(timeout)
+        self._due.clear()
+
+    def wake(self) -> None:
+        """Release a thread blocked in wait_due()"""
+        self._due.set()
+
+    def drain(self) -> List[Any]:
+        """Take every buffered item"""
+        with self._lock:
+            items, self._items = self._items, []
+            self._oldest = None
+            return items
+
+    def requeue(self, items: List[Any]) -> int:
+        """Put back items whose write failed, keeping at most `limit`, and back off; returns items dropped"""
+        with self._lock:
+            items = items + self._items
+            dropped = max(0, len(items) - self.limit)
+            self._items = items[dropped:]
+            if self._items and self._oldest is None:
+                self._oldest = time.monotonic()
+            self._failures += 1
+            backoff = min(self.max_age * 2 ** self._failures, self.max_backoff)
+            self._retry_at = time.monotonic() + backoff
+            return dropped
+
+    def flushed(self) -> None:
+        """Clear the failure backoff after a successful write"""
+        with self._lock:
+            self._failures = 0
+            self._retry_at = 0.0
+
+    def clear(self) -> None:
+        """Drop every buffered item and any backoff"""
+        self.drain()
+        self.flushed()
@@ -18,12 +18,43 @@ class CacheConfig:
     LEAD_DATA_TTL = int(os.getenv("LEAD_CACHE_TTL", "7200"))  # 2 hours
     USER_PREFERENCES_TTL = int(os.getenv("USER_PREFS_TTL", "86400"))  # 24 hours
     ANALYTICS_TTL = int(os.getenv("ANALYTICS_TTL", "1800"))  # 30 minutes
+    # Analytics entries outlive their TTL by this window and are served stale
+    # while a single caller (holding the refresh lock) recomputes them
+    ANALYTICS_STALE_TTL = int(os.getenv("ANALYTICS_STALE_TTL", "300"))  # 5 minutes
+    ANALYTICS_LOCK_TTL = int(os.getenv("ANALYTICS_LOCK_TTL", "30"))  # 30 seconds
+    # Past this fraction of their TTL, entries are refreshed early by one
+    # caller with a probability rising to 1 at the TTL, so hot keys rarely
+    # go stale at all
+    ANALYTICS_EARLY_REFRESH = float(os.getenv("ANALYTICS_EARLY_REFRESH", "0.8"))
+    
+    # In-process L1 cache for hot analytics keys
+    ANALYTICS_LOCAL_TTL = int(os.getenv("ANALYTICS_LOCAL_TTL", "5"))  # 5 seconds
+    ANALYTICS_LOCAL_MAXSIZE = int(os.getenv("ANALYTICS_LOCAL_MAXSIZE", "512"))
+    
+    # Adaptive analytics TTLs (see cache.policy.MemoPolicy): the TTLs a method
+    # can be tuned to, and the cost of serving a stale result, in seconds of
+    # recompute time
+    ANALYTICS_TTL_CANDIDATES = tuple(
+        int(ttl) for ttl in os.getenv("ANALYTICS_TTL_CANDIDATES", "60,120,300,600,1800,3600").split(",")
+    )
+    ANALYTICS_STALENESS_COST = float(os.getenv("ANALYTICS_STALENESS_COST", "0.5"))
     
     # Scraping cache TTL values
     SCRAPING_JOB_TTL = int(os.getenv("SCRAPING_JOB_TTL", "86400"))  # 24 hours
     SCRAPING_SUGGESTIONS_TTL = int(os.getenv("SCRAPING_SUGGESTIONS_TTL", "21600"))  # 6 hours
     SCRAPING_RATE_LIMIT_TTL = int(os.getenv("SCRAPING_RATE_LIMIT_TTL", "60"))  # 1 minute
     
+    # Active user sketches live long enough to cover the previous hour
+    ACTIVE_USERS_TTL = int(os.getenv("ACTIVE_USERS_TTL", "7200"))  # 2 hours
+    
+    # Popular-search increments are buffered per process and sent in one
+    # pipeline once this many searches are waiting, or after this long
+    POPULAR_SEARCH_BATCH_SIZE = int(os.getenv("POPULAR_SEARCH_BATCH_SIZE", "64"))
+    POPULAR_SEARCH_FLUSH_SECONDS = float(os.getenv("POPULAR_SEARCH_FLUSH_SECONDS", "1"))
+    
+    # Keys fetched per SCAN step and unlinked per command when invalidating
+    INVALIDATION_BATCH_SIZE = int(os.getenv("CACHE_INVALIDATION_BATCH_SIZE", "500"))
+    
     # Cache key prefixes
     SEARCH_PREFIX = "search:"
     LEAD_PREFIX = "lead:"
@@ -31,6 +62,14 @@ class CacheConfig:
     ANALYTICS_PREFIX = "analytics:"
     SUGGESTIONS_PREFIX = "suggestions:"
     POPULAR_SEARCHES_KEY = "popular_searches"
+    # Hourly HyperLogLogs of searching users (outside the analytics prefix so
+    # analytics invalidation keeps them)
+    ACTIVE_USERS_PREFIX = "active_users:"
+    # Memo policy hit/miss counters and tuned TTLs (kept across analytics
+    # invalidation for the same reason)
+    MEMO_POLICY_PREFIX = "memo_policy:"
+    # Locks letting a single worker run a periodic job per interval
+    JOB_LOCK_PREFIX = "job_lock:"
     
     # Scraping cache prefixes
     SCRAPING_JOB_PREFIX = "scraping_job:"
@@ -0,0 +1,67 @@
+"""
+In-process TTL cache used as an L1 in front of Redis
+"""
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Hashable, Optional
+
+class LocalTTLCache:
+    """Small thread-safe LRU cache whose entries expire after a TTL.
+
+    Values are shared between callers and must be treated as read-only.
+    Entries are local to the process, so keep TTLs short (seconds) to bound
+    staleness against the shared Redis cache.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live entry, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_pattern(self, pattern: str) -> int:
+        """Remove entries whose (string) key matches a glob pattern"""
+        with self._lock:
+            keys = [key for key in self._data if fnmatchcase(str(key), pattern)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -2,16 +2,27 @@
 Redis Cache Manager for Huntly MVP
 Handles caching with TTL and invalidation logic
 """
-import json
 import hashlib
 import logging
-from typing import Any, Optional, List, Dict, Union
+import random
+import time
+from collections import Counter
+from typing import Any, Optional, List, Dict, Tuple, Union
 from datetime import datetime, timedelta
+import orjson
 import redis
+from .buffer import BatchBuffer
 from .config import CacheConfig
 
 logger = logging.getLogger(__name__)
 
+# Searches waiting for a batched ZINCRBY; one entry per search
+popular_search_buffer = BatchBuffer(
+    batch_size=CacheConfig.POPULAR_SEARCH_BATCH_SIZE,
+    max_age=CacheConfig.POPULAR_SEARCH_FLUSH_SECONDS,
+    limit=CacheConfig.POPULAR_SEARCH_BATCH_SIZE * 10
+)
+
 class CacheManager:
     """Redis-based cache manager with TTL and invalidation logic"""
     
@@ -29,23 +40,28 @@ class CacheManager:
         prefix = self.config.get_key_prefix(key_type)
         return f"{prefix}{identifier}"
     
-    def _serialize_data(self, data: Any) -> str:
+    def _serialize_data(self, data: Any) -> Union[bytes, str]:
         """Serialize data for Redis storage"""
         if isinstance(data, (dict, list)):
-            return json.dumps(data, default=str)
+            # orjson writes compact, raw UTF-8 output natively and handles
+            # datetimes itself; anything else unknown falls back to str().
+            # The bytes go to Redis as-is, without decoding to str first
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
         return str(data)
     
-    def _deserialize_data(self, data: str) -> Any:
+    def _deserialize_data(self, data: Union[bytes, str]) -> Any:
         """Deserialize data from Redis"""
         try:
-            return json.loads(data)
-        except (json.JSONDecodeError, TypeError):
+            return orjson.loads(data)
+        except (orjson.JSONDecodeError, TypeError):
             return data
     
     def _hash_query(self, query_data: Dict[str, Any]) -> str:
-        """Generate hash for query data to use as cache key"""
-        query_str = json.dumps(query_data, sort_keys=True, default=str)
-        return hashlib.md5(query_str.encode()).hexdigest()
+        """Generate hash for query data to use as cache key (not a security digest)"""
+        query_bytes = orjson.dumps(
+            query_data, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+        return hashlib.blake2b(query_bytes, digest_size=16).hexdigest()
     
     def set(self, key_type: str, identifier: str, data: Any, ttl: Optional[int] = None) -> bool:
         """Set cache value with TTL"""
@@ -105,12 +121,27 @@ class CacheManager:
             return 0
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                deleted = self.redis_client.delete(*keys)
-                logger.info(f"Cache INVALIDATE: {len(keys)} keys matching '{pattern}'")
-                return deleted
-            return 0
+            # SCAN walks the keyspace incrementally instead of blocking Redis
+            # like KEYS; UNLINK frees the values off the main thread. Each full
+            # batch is sent as soon as it fills, so client memory stays bounded
+            # by the batch size however many keys match
+            batch_size = self.config.INVALIDATION_BATCH_SIZE
+            pipe = self.redis_client.pipeline(transaction=False)
+            deleted = 0
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    pipe.unlink(*batch)
+                    deleted += sum(pipe.execute())
+                    batch = []
+            if batch:
+                pipe.unlink(*batch)
+                deleted += sum(pipe.execute())
+            
+            if deleted:
+                logger.info(f"Cache INVALIDATE: {deleted} keys matching '{pattern}'")
+            return deleted
         except Exception as e:
             logger.error(f"Cache INVALIDATE error for pattern '{pattern}': {e}")
             return 0
@@ -194,30 +225,226 @@ class CacheManager:
     
     # Analytics methods
     def cache_analytics_data(self, metric_key: str, data: Any, ttl: Optional[int] = None) -> bool:
-        """Cache analytics data"""
-        return self.set("analytics", metric_key, data, ttl)
+        """Cache analytics data, kept for ANALYTICS_STALE_TTL past its TTL as a stale fallback"""
+        if ttl is None:
+            ttl = self.config.ANALYTICS_TTL
+        
+        entry = {"_value": data, "_computed_at": time.time(), "_soft_ttl": ttl}
+        stored = self.set("analytics", metric_key, entry, ttl + self.config.ANALYTICS_STALE_TTL)
+        if stored:
+            self._release_analytics_refresh_lock(metric_key)
+        return stored
     
     def get_cached_analytics_data(self, metric_key: str) -> Optional[Any]:
-        """Get cached analytics data"""
-        return self.get("analytics", metric_key)
+        """Get cached analytics data (stale-while-revalidate)"""
+        if not self.enabled:
+            return None
+        
+        try:
+            # The key's remaining TTL arrives in the same round trip as its value
+            cache_key = self._generate_key("analytics", metric_key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.ttl(cache_key)
+            pipe.get(cache_key)
+            remaining, data = pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache GET error for analytics:{metric_key}: {e}")
+            return None
+        
+        if data is None:
+            logger.debug(f"Cache MISS: {cache_key}")
+            return None
+        
+        # Entries live ANALYTICS_STALE_TTL past their soft TTL, so less than that
+        # remaining means the entry is stale without decoding it
+        expired = 0 <= remaining < self.config.ANALYTICS_STALE_TTL
+        if expired and self._acquire_analytics_refresh_lock(metric_key):
+            logger.debug(f"Cache STALE: {cache_key}, refreshing")
+            return None
+        
+        logger.debug(f"Cache HIT: {cache_key}")
+        entry = self._deserialize_data(data)
+        if expired and isinstance(entry, dict) and "_computed_at" in entry:
+            # Someone else is refreshing it; serve the stale value meanwhile
+            return entry["_value"]
+        return self._unwrap_analytics_entry(metric_key, entry)
+    
+    def _unwrap_analytics_entry(self, metric_key: str, entry: Any) -> Optional[Any]:
+        """
+        Return the cached value, or None when the caller should recompute it.
+        
+        Past its TTL an entry is still served to everyone except the one caller
+        that wins the refresh lock, which gets a miss and recomputes it. Near
+        the end of its TTL, callers try for the lock with a probability growing
+        with the entry's age, so the refresh usually happens before it expires.
+        """
+        if not isinstance(entry, dict) or "_computed_at" not in entry:
+            return entry
+        
+        age = time.time() - entry["_computed_at"]
+        if self._should_refresh(age, entry["_soft_ttl"]) and self._acquire_analytics_refresh_lock(metric_key):
+            logger.debug(f"Cache STALE: analytics:{metric_key} (age: {age:.0f}s), refreshing")
+            return None
+        return entry["_value"]
+    
+    def _should_refresh(self, age: float, soft_ttl: float) -> bool:
+        """Whether a caller should try to refresh an entry of this age"""
+        if age > soft_ttl:
+            return True
+        
+        early = soft_ttl * self.config.ANALYTICS_EARLY_REFRESH
+        if age <= early:
+            return False
+        return random.random() < (age - early) / (soft_ttl - early)
+    
+    def _acquire_analytics_refresh_lock(self, metric_key: str) -> bool:
+        """Try to become the single refresher of a stale analytics entry"""
+        try:
+            lock_key = f"{self.config.ANALYTICS_PREFIX}lock:{metric_key}"
+            return bool(self.redis_client.set(lock_key, 1, nx=True, ex=self.config.ANALYTICS_LOCK_TTL))
+        except Exception as e:
+            logger.error(f"Cache LOCK error for analytics:{metric_key}: {e}")
+            # Without a lock, fall back to plain cache-aside and refresh
+            return True
+    
+    def _release_analytics_refresh_lock(self, metric_key: str) -> None:
+        """Release the refresh lock once a fresh value is stored"""
+        try:
+            self.redis_client.delete(f"{self.config.ANALYTICS_PREFIX}lock:{metric_key}")
+        except Exception as e:
+            logger.error(f"Cache UNLOCK error for analytics:{metric_key}: {e}")
+    
+    def mget_analytics(self, metric_keys: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Get several cached analytics entries in a single round trip.
+        
+        Stale and early-refresh entries are returned too, and their keys are
+        listed second. No refresh lock is taken: the caller decides which of
+        them to recompute (see claim_analytics_refresh).
+        """
+        if not self.enabled or not metric_keys:
+            return {}, []
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for metric_key in metric_keys:
+                pipe.get(self._generate_key("analytics", metric_key))
+            values = pipe.execute()
+            
+            results = {}
+            refresh_keys = []
+            for metric_key, value in zip(metric_keys, values):
+                if value is None:
+                    continue
+                entry = self._deserialize_data(value)
+                if isinstance(entry, dict) and "_computed_at" in entry:
+                    if self._should_refresh(time.time() - entry["_computed_at"], entry["_soft_ttl"]):
+                        refresh_keys.append(metric_key)
+                    entry = entry["_value"]
+                results[metric_key] = entry
+            return results, refresh_keys
+        except Exception as e:
+            logger.error(f"Cache MGET error for analytics keys {metric_keys}: {e}")
+            return {}, []
+    
+    def claim_analytics_refresh(self, metric_key: str) -> bool:
+        """Take the refresh lock of an analytics entry; True if this caller should recompute it"""
+        if not self.enabled:
+            return False
+        return self._acquire_analytics_refresh_lock(metric_key)
+    
+    def acquire_job_lock(self, job: str, ttl: int) -> bool:
+        """Claim a periodic job for `ttl` seconds so only one worker runs it"""
+        if not self.enabled:
+            return True
+        
+        try:
+            lock_key = f"{self.config.JOB_LOCK_PREFIX}{job}"
+            return bool(self.redis_client.set(lock_key, 1, nx=True, ex=max(ttl, 1)))
+        except Exception as e:
+            logger.error(f"Cache LOCK error for job {job}: {e}")
+            # Without a lock every worker runs the job, as without Redis
+            return True
     
     def invalidate_analytics_cache(self) -> int:
         """Invalidate all analytics caches"""
         pattern = f"{self.config.ANALYTICS_PREFIX}*"
         return self.invalidate_pattern(pattern)
     
+    # Active users (approximate distinct counts)
+    def _active_users_key(self, at: datetime) -> str:
+        return f"{self.config.ACTIVE_USERS_PREFIX}{at:%Y%m%d%H}"
+    
+    def add_active_user(self, user_id: int, at: Optional[datetime] = None) -> bool:
+        """Add a user to the HyperLogLog of the current hour"""
+        if not self.enabled:
+            return False
+        
+        try:
+            key = self._active_users_key(at or datetime.utcnow())
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.pfadd(key, user_id)
+            pipe.expire(key, self.config.ACTIVE_USERS_TTL)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error adding active user {user_id}: {e}")
+            return False
+    
+    def count_active_users(self, at: Optional[datetime] = None) -> Optional[int]:
+        """
+        Approximate number of distinct users active in the current and previous
+        hour (about 0.8% standard error), or None when Redis is unavailable.
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            at = at or datetime.utcnow()
+            return int(self.redis_client.pfcount(
+                self._active_users_key(at),
+                self._active_users_key(at - timedelta(hours=1))
+            ))
+        except Exception as e:
+            logger.error(f"Error counting active users: {e}")
+            return None
+    
     # Popular searches and suggestions
     def add_popular_search(self, query: str) -> bool:
         """Add to popular searches with score increment"""
         if not self.enabled:
             return False
         
+        # Buffered locally and written with other searches in one pipeline, by
+        # the background writer when one is running
+        if popular_search_buffer.add(query) and not popular_search_buffer.flushed_in_background:
+            self.flush_popular_searches()
+        return True
+    
+    def flush_popular_searches(self) -> int:
+        """Write the buffered popular-search counts in one round trip; returns queries written"""
+        if not self.enabled:
+            return 0
+        
+        queries = popular_search_buffer.drain()
+        if not queries:
+            return 0
+        
+        counts = Counter(queries)
         try:
-            self.redis_client.zincrby(self.config.POPULAR_SEARCHES_KEY, 1, query)
-            return True
+            pipe = self.redis_client.pipeline(transaction=False)
+            for query, count in counts.items():
+                pipe.zincrby(self.config.POPULAR_SEARCHES_KEY, count, query)
+            pipe.execute()
+            popular_search_buffer.flushed()
+            return len(counts)
         except Exception as e:
-            logger.error(f"Error adding popular search '{query}': {e}")
-            return False
+            logger.error(f"Error flushing {len(counts)} popular searches: {e}")
+            # Kept for the next flush, which waits out a backoff first
+            dropped = popular_search_buffer.requeue(queries)
+            if dropped:
+                logger.warning(f"Popular search buffer full, dropped {dropped} searches")
+            return 0
     
     def get_popular_searches(self, limit: int = 10) -> List[str]:
         """Get most popular searches"""
@@ -407,6 +634,37 @@ class CacheManager:
             logger.error(f"Error getting cache stats: {e}")
             return None
     
+    def get_stats_and_health(self) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Get cache statistics and health status from a single INFO round trip"""
+        if not self.enabled:
+            return None, {"status": "disabled", "redis_available": False}
+        
+        try:
+            info = self.redis_client.info()
+        except Exception as e:
+            logger.error(f"Error getting cache stats and health: {e}")
+            return None, {"status": "error", "redis_available": False, "error": str(e)}
+        
+        # INFO without a section returns every field in one flat dict
+        stats = info.get("stats", info)
+        keyspace = info.get("db0", {})
+        
+        return {
+            "hits": stats.get("keyspace_hits", 0),
+            "misses": stats.get("keyspace_misses", 0),
+            "total_commands": stats.get("total_commands_processed", 0),
+            "connected_clients": info.get("connected_clients", 0),
+            "used_memory": info.get("used_memory", 0),
+            "used_memory_human": info.get("used_memory_human", "0B"),
+            "keys_count": keyspace.get("keys", 0) if isinstance(keyspace, dict) else 0
+        }, {
+            "status": "healthy",
+            "redis_available": True,
+            "connected_clients": info.get("connected_clients", 0),
+            "used_memory_human": info.get("used_memory_human", "unknown"),
+            "keyspace": keyspace
+        }
+    
     def _get_total_keys_count(self) -> int:
         """Get total number of keys in Redis"""
         try:
@@ -0,0 +1,161 @@
+"""
+Adaptive cache TTLs tuned from recorded hit/miss/stale bookkeeping
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Sequence, Tuple
+
+from .config import CacheConfig
+from .local import LocalTTLCache
+
+logger = logging.getLogger(__name__)
+
+def best_ttl(
+    requests_per_second: float,
+    compute_seconds: float,
+    changes_per_second: float,
+    candidates: Sequence[int],
+    staleness_cost: float
+) -> int:
+    """
+    Candidate TTL with the highest net savings.
+
+    With requests arriving at rate r, a TTL of t recomputes about
+    r / (1 + r*t) times per second, so the rest are hits that each save
+    `compute_seconds`. Data changing at rate c leaves roughly c*t/2 of those
+    hits stale, and each stale hit costs `staleness_cost` (in compute
+    seconds). Ties go to the shorter TTL.
+    """
+    def net_savings(ttl: int) -> Tuple[float, int]:
+        recomputes = requests_per_second / (1 + requests_per_second * ttl)
+        hits = requests_per_second - recomputes
+        stale_fraction = min(1.0, changes_per_second * ttl / 2)
+        return hits * (compute_seconds - stale_fraction * staleness_cost), -ttl
+
+    return max(candidates, key=net_savings)
+
+class MemoPolicy:
+    """Records memoization outcomes per cached method and tunes their TTLs.
+
+    record() only updates in-process counters. flush() adds them to a Redis
+    hash shared by every worker, and tune() turns the shared counters into a
+    TTL per method (see best_ttl), stored in the `ttl_key` hash. ttl_for()
+    reads that hash at most once per `refresh` seconds.
+    """
+
+    def __init__(
+        self,
+        candidates: Sequence[int],
+        staleness_cost: float,
+        stats_key: str = f"{CacheConfig.MEMO_POLICY_PREFIX}stats",
+        ttl_key: str = f"{CacheConfig.MEMO_POLICY_PREFIX}ttl",
+        min_requests: int = 20,
+        refresh: float = 60.0
+    ):
+        self.candidates = tuple(sorted(candidates))
+        self.staleness_cost = staleness_cost
+        self.stats_key = stats_key
+        self.ttl_key = ttl_key
+        self.min_requests = min_requests
+        self._counts: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._ttls = LocalTTLCache(maxsize=1, ttl=refresh)
+
+    def record(self, method: str, outcome: str, compute_seconds: float = 0.0) -> None:
+        """Count a "hit", "miss" (with its compute time) or "stale" event"""
+        with self._lock:
+            self._counts[(method, outcome)] += 1
+            if compute_seconds:
+                self._counts[(method, "compute_seconds")] += compute_seconds
+
+    def flush(self, redis_client) -> None:
+        """Add the in-process counters to the shared Redis hash"""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(float)
+        if not counts or redis_client is None:
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hsetnx(self.stats_key, "window_start", time.time())
+            for (method, field), value in counts.items():
+                if field == "compute_seconds":
+                    pipe.hincrbyfloat(self.stats_key, f"{method}:{field}", value)
+                else:
+                    pipe.hincrby(self.stats_key, f"{method}:{field}", int(value))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error flushing memo policy stats: {e}")
+
+    def tune(self, redis_client, now: Optional[float] = None) -> Dict[str, int]:
+        """Pick a TTL per method from the shared counters and start a new window"""
+        if redis_client is None:
+            return {}
+
+        try:
+            # Read and reset the window atomically so increments flushed by
+            # other workers in between are not deleted unread
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hgetall(self.stats_key)
+            pipe.delete(self.stats_key)
+            stats, _ = pipe.execute()
+            if not stats:
+                return {}
+
+            now = time.time() if now is None else now
+            elapsed = max(now - float(stats.pop("window_start", now)), 1.0)
+
+            methods: Dict[str, Dict[str, float]] = defaultdict(dict)
+            for field, value in stats.items():
+                method, _, name = field.rpartition(":")
+                methods[method][name] = float(value)
+
+            ttls = {}
+            for method, counts in methods.items():
+                hits = counts.get("hit", 0.0)
+                misses = counts.get("miss", 0.0)
+                if hits + misses < self.min_requests or not misses:
+                    continue
+                ttls[method] = best_ttl(
+                    requests_per_second=(hits + misses) / elapsed,
+                    compute_seconds=counts.get("compute_seconds", 0.0) / misses,
+                    changes_per_second=counts.get("stale", 0.0) / elapsed,
+                    candidates=self.candidates,
+                    staleness_cost=self.staleness_cost
+                )
+
+            if ttls:
+                redis_client.hset(self.ttl_key, mapping=ttls)
+
+            self._ttls.clear()
+            logger.info(f"Tuned analytics cache TTLs: {ttls}")
+            return ttls
+
+        except Exception as e:
+            logger.error(f"Error tuning cache TTLs: {e}")
+            return {}
+
+    def ttl_for(self, redis_client, method: str, default: int) -> int:
+        """Tuned TTL for a method, or `default` if it has not been tuned"""
+        ttls = self._ttls.get("ttls")
+        if ttls is None:
+            ttls = {}
+            if redis_client is not None:
+                try:
+                    ttls = redis_client.hgetall(self.ttl_key)
+                except Exception as e:
+                    logger.warning(f"Error reading tuned cache TTLs: {e}")
+            self._ttls.set("ttls", ttls)
+
+        try:
+            return int(ttls.get(method, default))
+        except (TypeError, ValueError):
+            return default
+
+    def reset(self) -> None:
+        """Drop in-process counters and the tuned TTL snapshot"""
+        with self._lock:
+            self._counts = defaultdict(float)
+        self._ttls.clear()
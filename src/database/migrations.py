@@ -1,9 +1,19 @@
 """
 Database migration utilities for Huntly
 """
+from datetime import date
 from sqlalchemy import text
 from .connection import engine
 import logging
+import os
+import re
+
+# Monthly search event partitions are created this many months ahead; events
+# older than SEARCH_EVENT_RETENTION_MONTHS are dropped with their partition
+# (0 keeps everything)
+SEARCH_EVENT_PARTITIONS_AHEAD = 2
+SEARCH_EVENT_RETENTION_MONTHS = int(os.getenv("SEARCH_EVENT_RETENTION_MONTHS", "0"))
+SEARCH_EVENT_PARTITION_NAME = re.compile(r"^search_analytics_events_(\d{4})_(\d{2})$")
 
 def create_search_indexes():
     """Create PostgreSQL full-text search indexes"""
@@ -27,6 +37,17 @@ def create_search_indexes():
         CREATE INDEX IF NOT EXISTS idx_leads_user_id ON leads(user_id);
         """,
         
+        # Per-user time windows used by the analytics dashboard
+        """
+        CREATE INDEX IF NOT EXISTS idx_leads_user_created ON leads(user_id, created_at DESC);
+        """,
+        
+        # Indexing status: COUNT/MAX over indexed leads only
+        """
+        CREATE INDEX IF NOT EXISTS idx_leads_indexed_at_not_null ON leads(indexed_at)
+        WHERE indexed_at IS NOT NULL;
+        """,
+        
         # Create function to automatically update search_vector (simplified version)
         """
         CREATE OR REPLACE FUNCTION update_lead_search_vector() RETURNS trigger AS $$
@@ -144,6 +165,13 @@ def create_analytics_tables():
         );
         """,
         
+        # Search events tracked without a session get a database-generated
+        # id (gen_random_uuid() is built in from PostgreSQL 13)
+        """
+        ALTER TABLE search_analytics_events 
+        ALTER COLUMN session_id SET DEFAULT gen_random_uuid()::text;
+        """,
+        
         # Create indexes for analytics performance
         """
         CREATE INDEX IF NOT EXISTS idx_search_analytics_user_created 
@@ -165,6 +193,28 @@ def create_analytics_tables():
         ON lead_interaction_events(lead_id, interaction_type);
         """,
         
+        # Recent-window scans ("last hour", "today") across all users. Events are
+        # append-only, so created_at follows physical order and a BRIN index stays
+        # tiny; a partial index on now() - interval is not possible (not immutable)
+        """
+        CREATE INDEX IF NOT EXISTS idx_search_analytics_created_brin 
+        ON search_analytics_events USING brin(created_at);
+        """,
+        
+        """
+        CREATE INDEX IF NOT EXISTS idx_lead_interactions_created_brin 
+        ON lead_interaction_events USING brin(created_at);
+        """,
+        
+        # Covers the popular-queries aggregation (filter, group and averages)
+        # so it can run as an index-only scan
+        """
+        CREATE INDEX IF NOT EXISTS idx_search_analytics_popular_queries 
+        ON search_analytics_events(user_id, created_at DESC) 
+        INCLUDE (query_text, results_count, response_time_ms) 
+        WHERE query_text IS NOT NULL AND query_text <> '';
+        """,
+        
         # Add analytics-related columns to existing tables
         """
         ALTER TABLE leads 
@@ -217,11 +267,208 @@ def create_analytics_tables():
                 else:
                     raise
 
+def create_analytics_views():
+    """Create materialized views used by the analytics service"""
+    
+    migrations = [
+        # Per-user facet distributions (industry, location, size, revenue).
+        # Refreshed by AnalyticsService.refresh_analytics_views()
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS leads_facets AS
+            SELECT COALESCE(user_id, 0) AS user_id, 'industries' AS dim, industry AS value, COUNT(*) AS count
+            FROM leads WHERE industry IS NOT NULL GROUP BY 1, industry
+            UNION ALL
+            SELECT COALESCE(user_id, 0), 'locations', location, COUNT(*)
+            FROM leads WHERE location IS NOT NULL GROUP BY 1, location
+            UNION ALL
+            SELECT COALESCE(user_id, 0), 'company_sizes', employees, COUNT(*)
+            FROM leads WHERE employees IS NOT NULL GROUP BY 1, employees
+            UNION ALL
+            SELECT COALESCE(user_id, 0), 'revenue_ranges', revenue, COUNT(*)
+            FROM leads WHERE revenue IS NOT NULL GROUP BY 1, revenue;
+        """,
+        
+        # Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_facets_key
+        ON leads_facets(user_id, dim, value);
+        """,
+        
+        # Usage and conversions (leads with an email or phone) per industry
+        # and location, read by the top converting filters breakdown.
+        # Refreshed with leads_facets by AnalyticsService.refresh_analytics_views()
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS leads_by_industry_conversion AS
+            SELECT industry AS value, COUNT(*) AS usage,
+                   COUNT(CASE WHEN email IS NOT NULL OR phone IS NOT NULL THEN 1 END) AS conversions
+            FROM leads WHERE industry IS NOT NULL GROUP BY industry;
+        """,
+        
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_by_industry_conversion_value
+        ON leads_by_industry_conversion(value);
+        """,
+        
+        """
+        CREATE INDEX IF NOT EXISTS idx_leads_by_industry_conversion_usage
+        ON leads_by_industry_conversion(usage DESC);
+        """,
+        
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS leads_by_location_conversion AS
+            SELECT location AS value, COUNT(*) AS usage,
+                   COUNT(CASE WHEN email IS NOT NULL OR phone IS NOT NULL THEN 1 END) AS conversions
+            FROM leads WHERE location IS NOT NULL GROUP BY location;
+        """,
+        
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_by_location_conversion_value
+        ON leads_by_location_conversion(value);
+        """,
+        
+        """
+        CREATE INDEX IF NOT EXISTS idx_leads_by_location_conversion_usage
+        ON leads_by_location_conversion(usage DESC);
+        """,
+        
+        # Per-user daily searches, interactions and new leads, read by the
+        # dashboard's "today" counters instead of scanning the event tables
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_daily_stats AS
+            SELECT user_id, day,
+                   SUM(searches) AS searches,
+                   SUM(interactions) AS interactions,
+                   SUM(leads_added) AS leads_added
+            FROM (
+                SELECT COALESCE(user_id, 0) AS user_id, date_trunc('day', created_at) AS day,
+                       COUNT(*) AS searches, 0 AS interactions, 0 AS leads_added
+                FROM search_analytics_events WHERE created_at IS NOT NULL GROUP BY 1, 2
+                UNION ALL
+                SELECT COALESCE(user_id, 0), date_trunc('day', created_at), 0, COUNT(*), 0
+                FROM lead_interaction_events WHERE created_at IS NOT NULL GROUP BY 1, 2
+                UNION ALL
+                SELECT COALESCE(user_id, 0), date_trunc('day', created_at), 0, 0, COUNT(*)
+                FROM leads WHERE created_at IS NOT NULL GROUP BY 1, 2
+            ) daily
+            GROUP BY user_id, day;
+        """,
+        
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_dashboard_daily_stats_key
+        ON dashboard_daily_stats(user_id, day);
+        """,
+        
+        # Per-user query counts over the last 30 days (as of the last refresh),
+        # read by SearchAnalyticsTracker.get_popular_queries. Sums and counts
+        # rather than averages, so the global ranking can be rolled up from it
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS popular_queries_30d AS
+            SELECT COALESCE(user_id, 0) AS user_id, query_text,
+                   COUNT(*) AS searches,
+                   SUM(results_count) AS results_sum,
+                   COUNT(results_count) AS results_n,
+                   SUM(response_time_ms) AS response_time_sum,
+                   COUNT(response_time_ms) AS response_time_n
+            FROM search_analytics_events
+            WHERE created_at > now() - interval '30 days'
+              AND query_text IS NOT NULL AND query_text <> ''
+            GROUP BY 1, 2;
+        """,
+        
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_popular_queries_30d_key
+        ON popular_queries_30d(user_id, query_text);
+        """
+    ]
+    
+    with engine.connect() as conn:
+        for i, migration in enumerate(migrations):
+            try:
+                conn.execute(text(migration))
+                conn.commit()
+                logging.info(f"Analytics view migration {i+1}/{len(migrations)} executed successfully")
+            except Exception as e:
+                logging.error(f"Analytics view migration {i+1}/{len(migrations)} failed: {e}")
+                logging.error(f"Failed migration SQL: {migration[:200]}...")
+                conn.rollback()
+                
+                if "already exists" in str(e).lower() or "does not exist" in str(e).lower():
+                    logging.warning(f"Skipping analytics view migration {i+1} - object already exists or doesn't exist")
+                    continue
+                else:
+                    raise
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def maintain_search_event_partitions(
+    months_ahead: int = SEARCH_EVENT_PARTITIONS_AHEAD,
+    retention_months: int = SEARCH_EVENT_RETENTION_MONTHS
+) -> None:
+    """Create the upcoming monthly search event partitions and drop expired ones"""
+    with engine.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            return
+        
+        is_partitioned = conn.execute(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('search_analytics_events')"
+        )).scalar()
+        if not is_partitioned:
+            # Converting a plain table locks it for the whole copy, so it is
+            # left to the operator
+            logging.info(
+                "search_analytics_events is not partitioned; run "
+                "sql-scripts/partition_search_analytics_events.sql to convert it"
+            )
+            return
+        
+        this_month = date.today().replace(day=1)
+        for offset in range(months_ahead + 1):
+            month_start = _add_months(this_month, offset)
+            partition = f"search_analytics_events_{month_start:%Y_%m}"
+            try:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF search_analytics_events "
+                    f"FOR VALUES FROM ('{month_start}') TO ('{_add_months(month_start, 1)}')"
+                ))
+                conn.commit()
+            except Exception as e:
+                # Fails when the default partition already holds rows for the month
+                logging.error(f"Could not create search event partition {partition}: {e}")
+                conn.rollback()
+        
+        if retention_months <= 0:
+            return
+        
+        cutoff = _add_months(this_month, -retention_months)
+        partitions = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'search_analytics_events'::regclass"
+        )).scalars().all()
+        for partition in partitions:
+            match = SEARCH_EVENT_PARTITION_NAME.match(partition)
+            if match and date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+                conn.execute(text(f"DROP TABLE {partition}"))
+                conn.commit()
+                logging.info(f"Dropped expired search event partition {partition}")
+        
+        # Rows outside every monthly partition sit in the default one, which
+        # is never dropped
+        if "search_analytics_events_default" in partitions:
+            conn.execute(
+                text("DELETE FROM search_analytics_events_default WHERE created_at < :cutoff"),
+                {"cutoff": cutoff}
+            )
+            conn.commit()
+
 def run_migrations():
     """Run all database migrations"""
     try:
         create_search_indexes()
         create_analytics_tables()
+        create_analytics_views()
+        maintain_search_event_partitions()
         logging.info("All migrations completed successfully")
     except Exception as e:
         logging.error(f"Migration failed: {e}")
@@ -17,7 +17,8 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    leads = relationship("Lead", back_populates="user")
+    # Lead relationships never lazy load; use selectinload()/joinedload() explicitly
+    leads = relationship("Lead", back_populates="user", lazy="raise")
     campaigns = relationship("Campaign", back_populates="user")
     preferences = relationship("UserPreferences", back_populates="user", uselist=False)
 
@@ -59,7 +60,7 @@ class Lead(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    user = relationship("User", back_populates="leads")
+    user = relationship("User", back_populates="leads", lazy="raise")
 
 class Campaign(Base):
     __tablename__ = "campaigns"
@@ -116,6 +117,8 @@ class UserPreferences(Base):
 class SearchAnalyticsEvent(Base):
     __tablename__ = "search_analytics_events"
     
+    # On PostgreSQL the table can be range-partitioned by month on created_at
+    # (primary key (id, created_at)); see sql-scripts/partition_search_analytics_events.sql
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     
@@ -134,7 +137,7 @@ class SearchAnalyticsEvent(Base):
     cache_hit = Column(String(10), default="miss")  # hit, miss, partial
     
     # Metadata
-    session_id = Column(String(255))
+    session_id = Column(String(255))  # defaults to gen_random_uuid() on PostgreSQL
     user_agent = Column(String(500))
     ip_address = Column(String(45))
     
@@ -160,7 +163,7 @@ class LeadInteractionEvent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User")
-    lead = relationship("Lead")
+    lead = relationship("Lead", lazy="raise")
     campaign = relationship("Campaign")
 
 # Create indexes for performance
@@ -169,10 +172,21 @@ Index('idx_leads_location', Lead.location)
 Index('idx_leads_company_text', Lead.search_vector, postgresql_using='gin')
 Index('idx_leads_keywords', Lead.keywords, postgresql_using='gin')
 Index('idx_leads_user_status', Lead.user_id, Lead.status)
+Index('idx_leads_user_created', Lead.user_id, Lead.created_at.desc())
+Index('idx_leads_indexed_at_not_null', Lead.indexed_at, postgresql_where=Lead.indexed_at.isnot(None))
 Index('idx_campaigns_user_status', Campaign.user_id, Campaign.status)
 
 # Analytics indexes
 Index('idx_search_analytics_user_created', SearchAnalyticsEvent.user_id, SearchAnalyticsEvent.created_at)
 Index('idx_search_analytics_query', SearchAnalyticsEvent.query_text, postgresql_using='gin')
 Index('idx_lead_interactions_user_created', LeadInteractionEvent.user_id, LeadInteractionEvent.created_at)
-Index('idx_lead_interactions_lead_type', LeadInteractionEvent.lead_id, LeadInteractionEvent.interaction_type)
\ No newline at end of file
+Index('idx_lead_interactions_lead_type', LeadInteractionEvent.lead_id, LeadInteractionEvent.interaction_type)
+Index('idx_search_analytics_created_brin', SearchAnalyticsEvent.created_at, postgresql_using='brin')
+Index('idx_lead_interactions_created_brin', LeadInteractionEvent.created_at, postgresql_using='brin')
+Index(
+    'idx_search_analytics_popular_queries',
+    SearchAnalyticsEvent.user_id,
+    SearchAnalyticsEvent.created_at.desc(),
+    postgresql_include=['query_text', 'results_count', 'response_time_ms'],
+    postgresql_where=(SearchAnalyticsEvent.query_text.isnot(None)) & (SearchAnalyticsEvent.query_text != '')
+)
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+SQL statement counting for query-budget tests and request logging
+"""
+import logging
+import re
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# Transaction control is not a query: BEGIN, SAVEPOINT, RELEASE and ROLLBACK
+# are left out of the counts
+_TRANSACTION_CONTROL = re.compile(r"\s*(BEGIN|SAVEPOINT|RELEASE|ROLLBACK)\b", re.IGNORECASE)
+
+# Statements executed by the current request (set by QueryBudgetMiddleware)
+_request_statements: ContextVar[Optional[List[str]]] = ContextVar("request_statements", default=None)
+
+class QueryCounter:
+    """Counts statements executed on an engine while the context is open"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: List[str] = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not _TRANSACTION_CONTROL.match(statement):
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+def _record_request_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _request_statements.get()
+    if statements is not None and not _TRANSACTION_CONTROL.match(statement):
+        statements.append(statement)
+
+def install_request_query_counter(engine) -> None:
+    """Attribute statements executed on the engine to the current request"""
+    if not event.contains(engine, "before_cursor_execute", _record_request_statement):
+        event.listen(engine, "before_cursor_execute", _record_request_statement)
+
+class QueryBudgetMiddleware(BaseHTTPMiddleware):
+    """Log requests that execute more statements than their path's budget"""
+
+    def __init__(self, app, budgets: Dict[str, int]):
+        super().__init__(app)
+        self.budgets = budgets
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        budget = next(
+            (limit for prefix, limit in self.budgets.items() if path.startswith(prefix)),
+            None
+        )
+        if budget is None:
+            return await call_next(request)
+
+        # The list is shared with the request task, which appends to it
+        statements: List[str] = []
+        token = _request_statements.set(statements)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_statements.reset(token)
+
+        if len(statements) > budget:
+            logger.warning(
+                f"Query budget exceeded for {request.method} {path}: "
+                f"{len(statements)} statements (budget {budget})"
+            )
+        return response
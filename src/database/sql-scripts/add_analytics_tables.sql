@@ -1,9 +1,9 @@
 -- Add analytics tables for search performance tracking
 -- This migration adds tables to track search analytics and lead interactions
 
--- Search Analytics Events Table
+-- Search Analytics Events Table, range-partitioned by month on created_at
 CREATE TABLE IF NOT EXISTS search_analytics_events (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INTEGER REFERENCES users(id),
     
     -- Search details
@@ -21,12 +21,39 @@ CREATE TABLE IF NOT EXISTS search_analytics_events (
     cache_hit VARCHAR(10) DEFAULT 'miss',
     
     -- Metadata
-    session_id VARCHAR(255),
+    session_id VARCHAR(255) DEFAULT gen_random_uuid()::text,
     user_agent VARCHAR(500),
     ip_address VARCHAR(45),
     
-    created_at TIMESTAMP DEFAULT NOW()
-);
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS search_analytics_events_default
+PARTITION OF search_analytics_events DEFAULT;
+
+-- Current and next two months; later months are added by
+-- maintain_search_event_partitions()
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', NOW()),
+            date_trunc('month', NOW()) + INTERVAL '2 months',
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF search_analytics_events FOR VALUES FROM (%L) TO (%L)',
+            'search_analytics_events_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END $$;
 
 -- Lead Interaction Events Table
 CREATE TABLE IF NOT EXISTS lead_interaction_events (
@@ -58,6 +85,19 @@ ON lead_interaction_events(user_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_lead_interactions_lead_type 
 ON lead_interaction_events(lead_id, interaction_type);
 
+-- BRIN on created_at for recent-window scans across all users (events are append-only)
+CREATE INDEX IF NOT EXISTS idx_search_analytics_created_brin 
+ON search_analytics_events USING brin(created_at);
+
+CREATE INDEX IF NOT EXISTS idx_lead_interactions_created_brin 
+ON lead_interaction_events USING brin(created_at);
+
+-- Covering index for the popular-queries aggregation (index-only scan)
+CREATE INDEX IF NOT EXISTS idx_search_analytics_popular_queries 
+ON search_analytics_events(user_id, created_at DESC) 
+INCLUDE (query_text, results_count, response_time_ms) 
+WHERE query_text IS NOT NULL AND query_text <> '';
+
 -- Add analytics-related columns to existing tables if they don't exist
 ALTER TABLE leads 
 ADD COLUMN IF NOT EXISTS view_count INTEGER DEFAULT 0,
@@ -0,0 +1,64 @@
+-- Convert an existing plain search_analytics_events table to monthly range partitions
+-- Run once by hand, in a maintenance window: the table is renamed, copied and
+-- dropped under an ACCESS EXCLUSIVE lock, so search tracking blocks until it
+-- commits. Does nothing if the table is already partitioned.
+--
+-- Afterwards restart the API: the startup migrations recreate the indexes on
+-- the partitioned table and the materialized views dropped here, and
+-- maintain_search_event_partitions() keeps the upcoming months in place.
+--
+-- Rows whose created_at falls outside every monthly partition land in
+-- search_analytics_events_default. Retention only drops monthly partitions,
+-- so maintain_search_event_partitions() deletes expired rows from the default
+-- partition separately; check it stays small with
+--   SELECT COUNT(*) FROM search_analytics_events_default;
+
+BEGIN;
+
+SET LOCAL lock_timeout = '10s';
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'search_analytics_events'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    DROP MATERIALIZED VIEW IF EXISTS dashboard_daily_stats, popular_queries_30d;
+    ALTER TABLE search_analytics_events RENAME TO search_analytics_events_unpartitioned;
+    UPDATE search_analytics_events_unpartitioned SET created_at = NOW() WHERE created_at IS NULL;
+
+    CREATE TABLE search_analytics_events (
+        LIKE search_analytics_events_unpartitioned INCLUDING DEFAULTS,
+        PRIMARY KEY (id, created_at),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    ) PARTITION BY RANGE (created_at);
+    EXECUTE format(
+        'ALTER SEQUENCE %s OWNED BY search_analytics_events.id',
+        pg_get_serial_sequence('search_analytics_events_unpartitioned', 'id')
+    );
+    CREATE TABLE search_analytics_events_default PARTITION OF search_analytics_events DEFAULT;
+
+    -- Every month from the oldest event up to two months ahead
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(oldest, NOW()), NOW())),
+            date_trunc('month', NOW()) + INTERVAL '2 months',
+            INTERVAL '1 month'
+        )::date
+        FROM (SELECT MIN(created_at) AS oldest FROM search_analytics_events_unpartitioned) AS bounds
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF search_analytics_events FOR VALUES FROM (%L) TO (%L)',
+            'search_analytics_events_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+    END LOOP;
+
+    INSERT INTO search_analytics_events SELECT * FROM search_analytics_events_unpartitioned;
+    DROP TABLE search_analytics_events_unpartitioned;
+END $$;
+
+COMMIT;
@@ -83,7 +83,8 @@ CREATE INDEX IF NOT EXISTS idx_leads_location ON leads(location);
 CREATE INDEX IF NOT EXISTS idx_leads_score ON leads(score);
 CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);
 CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads(created_at);
-CREATE INDEX IF NOT EXISTS idx_leads_indexed_at ON leads(indexed_at);
+CREATE INDEX IF NOT EXISTS idx_leads_user_created ON leads(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_leads_indexed_at_not_null ON leads(indexed_at) WHERE indexed_at IS NOT NULL;
 
 -- Full-text search indexes
 CREATE INDEX IF NOT EXISTS idx_leads_company_text ON leads USING gin(to_tsvector('english', company));
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from ..database.connection import get_db, get_redis
+from ..database.connection import get_db, get_redis, SessionLocal, ReadSessionLocal
 from ..cache.manager import CacheManager
-from ..services.analytics import AnalyticsService
+from ..services.analytics import AnalyticsService, SEARCH_TRENDS_JSON
 from ..services.analytics_dashboard import AnalyticsDashboardService
+from ..services.search_analytics_tracker import SearchAnalyticsTracker
 from ..models.analytics import DashboardMetrics, LeadsByMonth, SourceMetrics, IndustryBreakdown, PerformanceMetrics
 from ..models.search_analytics import SearchPerformanceMetrics, SearchConversionMetrics, SearchAnalytics
 from ..auth.middleware import get_current_user_optional
@@ -18,7 +19,7 @@ def get_analytics_service(
 ) -> AnalyticsService:
     """Get analytics service with dependencies"""
     cache_manager = CacheManager(redis_client)
-    return AnalyticsService(db, cache_manager)
+    return AnalyticsService(db, cache_manager, session_factory=SessionLocal)
 
 def get_dashboard_service(
     db: Session = Depends(get_db),
@@ -26,7 +27,15 @@ def get_dashboard_service(
 ) -> AnalyticsDashboardService:
     """Get analytics dashboard service with dependencies"""
     cache_manager = CacheManager(redis_client)
-    return AnalyticsDashboardService(db, cache_manager)
+    return AnalyticsDashboardService(db, cache_manager, session_factory=SessionLocal)
+
+def get_search_tracker(
+    db: Session = Depends(get_db),
+    redis_client = Depends(get_redis)
+) -> SearchAnalyticsTracker:
+    """Get search analytics tracker with reads routed to the read sessions"""
+    cache_manager = CacheManager(redis_client)
+    return SearchAnalyticsTracker(db, cache_manager, session_factory=ReadSessionLocal)
 
 @router.get("/dashboard")
 async def get_dashboard_metrics(
@@ -132,6 +141,11 @@ async def get_search_performance(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating search performance: {str(e)}")
 
+@router.get("/search-trends")
+async def get_search_trends():
+    """Distribuição de buscas por hora (pré-serializada)"""
+    return Response(content=SEARCH_TRENDS_JSON, media_type="application/json")
+
 @router.get("/search-conversion")
 async def get_search_conversion_metrics(
     user_id: Optional[int] = Query(None, description="Filter by user ID"),
@@ -156,6 +170,19 @@ async def get_search_facets(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating search facets: {str(e)}")
 
+@router.get("/search-insights")
+async def get_search_insights(
+    user_id: Optional[int] = Query(None, description="Filter by user ID"),
+    days: int = Query(30, description="Number of days to include", ge=1, le=365),
+    limit: int = Query(10, description="Maximum number of popular queries to return", ge=1, le=100),
+    tracker: SearchAnalyticsTracker = Depends(get_search_tracker)
+):
+    """Resumo de buscas e consultas populares, lidos em paralelo"""
+    try:
+        return tracker.get_search_insights(user_id, days, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating search insights: {str(e)}")
+
 @router.post("/invalidate-cache")
 async def invalidate_analytics_cache(
     user_id: Optional[int] = Query(None, description="User ID to invalidate cache for (optional)"),
@@ -178,25 +205,7 @@ async def get_comprehensive_analytics(
 ):
     """Analytics completos em uma única chamada para dashboard"""
     try:
-        # Get all analytics data in parallel
-        dashboard_metrics = analytics_service.get_dashboard_metrics(user_id)
-        search_performance = analytics_service.get_search_performance_metrics()
-        search_conversion = analytics_service.get_search_conversion_metrics(user_id)
-        leads_by_month = analytics_service.get_leads_by_month(user_id, 6)
-        industry_breakdown = analytics_service.get_industry_breakdown(user_id, 10)
-        source_metrics = analytics_service.get_source_metrics(user_id)
-        quality_scores = analytics_service.get_quality_scores(user_id)
-        
-        return {
-            "dashboard": dashboard_metrics,
-            "search_performance": search_performance,
-            "search_conversion": search_conversion,
-            "leads_by_month": leads_by_month,
-            "industry_breakdown": industry_breakdown,
-            "source_metrics": source_metrics,
-            "quality_scores": quality_scores,
-            "last_updated": dashboard_metrics.get("last_updated")
-        }
+        return analytics_service.get_full_dashboard(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating comprehensive analytics: {str(e)}")
 
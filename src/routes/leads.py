@@ -113,7 +113,7 @@ async def search_leads(
         # Initialize services
         cache_manager = CacheManager(redis_client) if redis_client else None
         search_engine = SearchEngine(db, cache_manager)
-        preferences_service = PreferencesService(db)
+        preferences_service = PreferencesService(db, cache_manager)
         analytics_tracker = SearchAnalyticsTracker(db, cache_manager) if cache_manager else None
         
         # Track search start time
@@ -198,7 +198,8 @@ async def search_leads_with_preferences_info(
 ):
     """Buscar leads e retornar informações sobre como as preferências foram aplicadas"""
     try:
-        preferences_service = PreferencesService(db)
+        cache_manager = CacheManager(redis_client) if redis_client else None
+        preferences_service = PreferencesService(db, cache_manager)
         
         # Get user preferences
         db_preferences = preferences_service.get_user_preferences(current_user_id)
@@ -618,7 +619,7 @@ async def advanced_search_leads(
         # Initialize services
         cache_manager = CacheManager(redis_client) if redis_client else None
         search_engine = SearchEngine(db, cache_manager)
-        preferences_service = PreferencesService(db)
+        preferences_service = PreferencesService(db, cache_manager)
         
         # Apply facet filters to search query if provided
         if facet_filters:
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 
-from ..database.connection import get_db
+from ..database.connection import get_db, get_redis
+from ..cache.manager import CacheManager
 from ..models.preferences import (
     UserPreferences, UserPreferencesCreate, UserPreferencesUpdate,
     PreferencesAppliedSearch
@@ -12,31 +13,30 @@ from ..auth.utils import get_current_user_id
 
 router = APIRouter(prefix="/preferences", tags=["preferences"])
 
+def get_preferences_service(
+    db: Session = Depends(get_db),
+    redis_client = Depends(get_redis)
+) -> PreferencesService:
+    """Get preferences service with dependencies"""
+    cache_manager = CacheManager(redis_client) if redis_client else None
+    return PreferencesService(db, cache_manager)
+
 @router.get("/", response_model=UserPreferences)
 async def get_user_preferences(
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Get current user's preferences"""
-    service = PreferencesService(db)
-    preferences = service.get_user_preferences(current_user_id)
-    
-    if not preferences:
-        # Return default preferences if none exist
-        default_preferences = UserPreferencesCreate()
-        preferences = service.create_user_preferences(current_user_id, default_preferences)
-    
-    return preferences
+    # Default preferences are created on first access
+    return service.get_or_create_default_preferences(current_user_id)
 
 @router.post("/", response_model=UserPreferences, status_code=status.HTTP_201_CREATED)
 async def create_user_preferences(
     preferences_data: UserPreferencesCreate,
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Create user preferences"""
-    service = PreferencesService(db)
-    
     try:
         preferences = service.create_user_preferences(current_user_id, preferences_data)
         return preferences
@@ -50,11 +50,9 @@ async def create_user_preferences(
 async def update_user_preferences(
     preferences_data: UserPreferencesUpdate,
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Update user preferences"""
-    service = PreferencesService(db)
-    
     preferences = service.update_user_preferences(current_user_id, preferences_data)
     
     if not preferences:
@@ -79,11 +77,9 @@ async def update_user_preferences(
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_preferences(
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Delete user preferences (reset to defaults)"""
-    service = PreferencesService(db)
-    
     success = service.delete_user_preferences(current_user_id)
     
     if not success:
@@ -95,20 +91,18 @@ async def delete_user_preferences(
 @router.get("/weights", response_model=Dict[str, float])
 async def get_user_search_weights(
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Get user's custom search ranking weights"""
-    service = PreferencesService(db)
     weights = service.apply_preferences_to_search_weights(current_user_id)
     return weights
 
 @router.get("/filters", response_model=Dict[str, Any])
 async def get_user_preference_filters(
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    service: PreferencesService = Depends(get_preferences_service)
 ):
     """Get user's preference filters for search boosting"""
-    service = PreferencesService(db)
     filters = service.get_preference_filters(current_user_id)
     return filters
 
@@ -17,6 +17,14 @@ from .models import IndexedLead, IndexingStats
 
 logger = logging.getLogger(__name__)
 
+# Cap on per-lead error messages kept in IndexingStats during bulk indexing
+MAX_RECORDED_ERRORS = 100
+
+# Patterns used on every indexed lead, compiled once at import
+_NON_WORD_RE = re.compile(r'[^\w\s-]')
+_CAPITALIZED_WORD_RE = re.compile(r'\b[A-Z][a-z]+\b')
+_TECHNICAL_TERM_RE = re.compile(r'\b\w*[0-9]\w*\b|\b[A-Z]{2,}\b')
+
 class LeadIndexer:
     """
     Lead indexer that extracts searchable metadata and creates indexes
@@ -47,17 +55,20 @@ class LeadIndexer:
         Returns:
             Dictionary with extracted metadata for indexing
         """
+        clean_text = self._clean_text
+        tokenize_text = self._tokenize_text
+        
         try:
             # Basic text fields
-            company_text = self._clean_text(lead.company or "")
-            description_text = self._clean_text(lead.description or "")
-            industry_text = self._clean_text(lead.industry or "")
-            location_text = self._clean_text(lead.location or "")
+            company_text = clean_text(lead.company or "")
+            description_text = clean_text(lead.description or "")
+            industry_text = clean_text(lead.industry or "")
+            location_text = clean_text(lead.location or "")
             
             # Extract keywords from various fields
             keywords = []
             if lead.keywords and isinstance(lead.keywords, (list, tuple)):
-                keywords.extend([self._clean_text(kw) for kw in lead.keywords if kw])
+                keywords.extend([clean_text(kw) for kw in lead.keywords if kw])
             
             # Auto-extract keywords from description
             if description_text:
@@ -65,9 +76,9 @@ class LeadIndexer:
                 keywords.extend(auto_keywords)
             
             # Tokenize important fields
-            company_tokens = self._tokenize_text(company_text)
-            industry_tokens = self._tokenize_text(industry_text)
-            location_tokens = self._tokenize_text(location_text)
+            company_tokens = tokenize_text(company_text)
+            industry_tokens = tokenize_text(industry_text)
+            location_tokens = tokenize_text(location_text)
             
             # Create searchable text combining all relevant fields
             searchable_parts = [
@@ -88,8 +99,8 @@ class LeadIndexer:
                 "company_tokens": company_tokens,
                 "industry_tokens": industry_tokens,
                 "location_tokens": location_tokens,
-                "keywords": list(set(keywords)),  # Remove duplicates
-                "all_tokens": self._tokenize_text(searchable_text)
+                "keywords": list(dict.fromkeys(keywords)),  # Remove duplicates, keep order
+                "all_tokens": tokenize_text(searchable_text)
             }
             
         except Exception as e:
@@ -112,12 +123,10 @@ class LeadIndexer:
         text = text.lower()
         
         # Remove special characters but keep spaces and alphanumeric
-        text = re.sub(r'[^\w\s-]', ' ', text)
-        
-        # Replace multiple spaces with single space
-        text = re.sub(r'\s+', ' ', text)
+        text = _NON_WORD_RE.sub(' ', text)
         
-        return text.strip()
+        # Collapse runs of whitespace into single spaces and trim the ends
+        return " ".join(text.split())
     
     def _tokenize_text(self, text: str) -> List[str]:
         """Tokenize text into searchable terms"""
@@ -130,7 +139,7 @@ class LeadIndexer:
             if len(token) >= 2 and token not in self.stop_words
         ]
         
-        return list(set(tokens))  # Remove duplicates
+        return list(dict.fromkeys(tokens))  # Remove duplicates, keep order
     
     def _extract_keywords_from_text(self, text: str, max_keywords: int = 10) -> List[str]:
         """Extract potential keywords from text using simple heuristics"""
@@ -138,10 +147,10 @@ class LeadIndexer:
             return []
         
         # Look for capitalized words (potential company names, technologies)
-        capitalized_words = re.findall(r'\b[A-Z][a-z]+\b', text)
+        capitalized_words = _CAPITALIZED_WORD_RE.findall(text)
         
         # Look for technical terms (words with numbers or specific patterns)
-        technical_terms = re.findall(r'\b\w*[0-9]\w*\b|\b[A-Z]{2,}\b', text)
+        technical_terms = _TECHNICAL_TERM_RE.findall(text)
         
         # Combine and clean
         keywords = []
@@ -151,7 +160,7 @@ class LeadIndexer:
                 keywords.append(clean_word)
         
         # Return unique keywords, limited by max_keywords
-        return list(set(keywords))[:max_keywords]
+        return list(dict.fromkeys(keywords))[:max_keywords]
     
     def index_lead(self, lead: LeadModel) -> bool:
         """
@@ -164,40 +173,10 @@ class LeadIndexer:
             True if indexing successful, False otherwise
         """
         try:
-            # Extract metadata
-            metadata = self.extract_searchable_metadata(lead)
-            
-            # Update PostgreSQL search vector (handled by trigger)
-            # We just need to update the lead to trigger the search vector update
-            lead.indexed_at = datetime.utcnow()
+            now = datetime.utcnow()
+            self._index_lead_no_commit(lead, now, now.isoformat())
             self.db.commit()
             
-            # Update Redis inverted index
-            self._update_redis_index(lead.id, metadata)
-            
-            # Cache the indexed lead data
-            indexed_lead_data = {
-                "id": lead.id,
-                "company": lead.company,
-                "contact": lead.contact,
-                "email": lead.email,
-                "phone": lead.phone,
-                "website": lead.website,
-                "industry": lead.industry,
-                "location": lead.location,
-                "revenue": lead.revenue,
-                "employees": lead.employees,
-                "description": lead.description,
-                "keywords": metadata["keywords"],
-                "searchable_text": metadata["searchable_text"],
-                "indexed_at": lead.indexed_at.isoformat() if lead.indexed_at else None,
-                "company_tokens": metadata["company_tokens"],
-                "industry_tokens": metadata["industry_tokens"],
-                "location_tokens": metadata["location_tokens"]
-            }
-            
-            self.cache.cache_lead_data(lead.id, indexed_lead_data)
-            
             logger.debug(f"Successfully indexed lead {lead.id}")
             return True
             
@@ -205,6 +184,52 @@ class LeadIndexer:
             logger.error(f"Error indexing lead {lead.id}: {e}")
             return False
     
+    def _index_lead_no_commit(self, lead: LeadModel, now: datetime, now_iso: str) -> None:
+        """
+        Index a lead without committing the database session
+        
+        Callers own the transaction, so a batch can share one commit and
+        one timestamp across all of its leads.
+        
+        Args:
+            lead: SQLAlchemy Lead model instance
+            now: Timestamp to store as the lead's indexed_at
+            now_iso: Pre-formatted ISO string of ``now`` for the cache payload
+        """
+        # Extract metadata
+        metadata = self.extract_searchable_metadata(lead)
+        
+        # Update PostgreSQL search vector (handled by trigger)
+        # We just need to update the lead to trigger the search vector update
+        lead.indexed_at = now
+        
+        # Update Redis inverted index
+        self._update_redis_index(lead.id, metadata)
+        
+        # Cache the indexed lead data
+        indexed_lead_data = {
+            "id": lead.id,
+            "company": lead.company,
+            "contact": lead.contact,
+            "email": lead.email,
+            "phone": lead.phone,
+            "website": lead.website,
+            "industry": lead.industry,
+            "location": lead.location,
+            "revenue": lead.revenue,
+            "employees": lead.employees,
+            "description": lead.description,
+            "keywords": metadata["keywords"],
+            "searchable_text": metadata["searchable_text"],
+            "indexed_at": now_iso,
+            "company_tokens": metadata["company_tokens"],
+            "industry_tokens": metadata["industry_tokens"],
+            "location_tokens": metadata["location_tokens"],
+            "all_tokens": metadata["all_tokens"]
+        }
+        
+        self.cache.cache_lead_data(lead.id, indexed_lead_data)
+    
     def _update_redis_index(self, lead_id: int, metadata: Dict[str, Any]) -> None:
         """Update Redis inverted index with lead tokens"""
         if not self.cache.enabled:
@@ -260,8 +285,11 @@ class LeadIndexer:
                 all_tokens.update(cached_data.get("location_tokens", []))
                 all_tokens.update(cached_data.get("keywords", []))
                 
-                # Also get tokens from searchable text
-                if cached_data.get("searchable_text"):
+                # Tokens from searchable text are stored at index time; only
+                # entries cached before that need to be re-tokenized
+                if "all_tokens" in cached_data:
+                    all_tokens.update(cached_data["all_tokens"])
+                elif cached_data.get("searchable_text"):
                     text_tokens = self._tokenize_text(cached_data["searchable_text"])
                     all_tokens.update(text_tokens)
                 
@@ -298,8 +326,7 @@ class LeadIndexer:
             total_leads=0,
             indexed_leads=0,
             failed_leads=0,
-            processing_time=0.0,
-            errors=[]
+            processing_time=0.0
         )
         
         try:
@@ -323,29 +350,33 @@ class LeadIndexer:
                 if not batch_leads:
                     break
                 
+                # Every lead in a batch shares the same indexed_at timestamp
+                now = datetime.utcnow()
+                now_iso = now.isoformat()
+                
                 # Index each lead in the batch
                 for lead in batch_leads:
                     try:
-                        if self.index_lead(lead):
-                            stats.indexed_leads += 1
-                        else:
-                            stats.failed_leads += 1
-                            stats.errors.append(f"Failed to index lead {lead.id}")
+                        self._index_lead_no_commit(lead, now, now_iso)
+                        stats.indexed_leads += 1
                     except Exception as e:
                         stats.failed_leads += 1
                         error_msg = f"Error indexing lead {lead.id}: {str(e)}"
-                        stats.errors.append(error_msg)
+                        if len(stats.errors) < MAX_RECORDED_ERRORS:
+                            stats.errors.append(error_msg)
+                        else:
+                            stats.errors_truncated += 1
                         logger.error(error_msg)
                 
+                # One commit per batch instead of one per lead
+                self.db.commit()
+                
                 offset += batch_size
                 
                 # Log progress
                 if offset % (batch_size * 10) == 0:
                     logger.info(f"Indexed {stats.indexed_leads} of {stats.total_leads} leads")
             
-            # Commit any remaining database changes
-            self.db.commit()
-            
         except Exception as e:
             error_msg = f"Error in bulk indexing: {str(e)}"
             stats.errors.append(error_msg)
@@ -358,6 +389,7 @@ class LeadIndexer:
         logger.info(
             f"Bulk indexing completed: {stats.indexed_leads} indexed, "
             f"{stats.failed_leads} failed, {stats.processing_time:.2f}s"
+            + (f" ({stats.errors_truncated} errors not recorded)" if stats.errors_truncated else "")
         )
         
         return stats
@@ -435,10 +467,11 @@ class LeadIndexer:
             return []
         
         try:
-            # Clean and filter tokens
+            # Clean and filter tokens, cleaning each token only once
+            clean_text = self._clean_text
             clean_tokens = [
-                self._clean_text(token) for token in tokens
-                if len(self._clean_text(token)) >= 2
+                cleaned for token in tokens
+                if len(cleaned := clean_text(token)) >= 2
             ]
             
             if not clean_tokens:
@@ -2,6 +2,7 @@
 Search-related data models for the indexing system
 """
 
+from dataclasses import dataclass, field
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 from datetime import datetime
@@ -16,30 +17,37 @@ class SearchQuery(BaseModel):
     offset: int = 0
     user_preferences: Optional[Dict[str, Any]] = None
 
-class IndexedLead(BaseModel):
-    """Lead with indexing metadata"""
+@dataclass(slots=True)
+class IndexedLead:
+    """Lead with indexing metadata
+    
+    Plain dataclass rather than a pydantic model: it is built once per
+    ranked lead on every search, so validation overhead adds up. Pydantic
+    still validates it when nested inside SearchResult.
+    """
     id: int
     company: str
     contact: str
     email: str
-    phone: Optional[str] = None
-    website: Optional[str] = None
     industry: str
     location: str
-    revenue: Optional[str] = None
-    employees: Optional[str] = None
-    description: Optional[str] = None
-    keywords: List[str] = []
     
     # Indexing fields
     searchable_text: str
+    
+    phone: Optional[str] = None
+    website: Optional[str] = None
+    revenue: Optional[str] = None
+    employees: Optional[str] = None
+    description: Optional[str] = None
+    keywords: List[str] = field(default_factory=list)
     search_vector: Optional[str] = None
     indexed_at: Optional[datetime] = None
     
     # Computed fields for search
-    industry_tokens: List[str] = []
-    location_tokens: List[str] = []
-    company_tokens: List[str] = []
+    industry_tokens: List[str] = field(default_factory=list)
+    location_tokens: List[str] = field(default_factory=list)
+    company_tokens: List[str] = field(default_factory=list)
 
 class SearchResult(BaseModel):
     """Search result with ranking information"""
@@ -48,10 +56,12 @@ class SearchResult(BaseModel):
     match_reasons: List[str] = []
     highlighted_fields: Dict[str, str] = {}
 
-class IndexingStats(BaseModel):
+@dataclass(slots=True)
+class IndexingStats:
     """Statistics for indexing operations"""
     total_leads: int
     indexed_leads: int
     failed_leads: int
     processing_time: float
-    errors: List[str] = []
\ No newline at end of file
+    errors: List[str] = field(default_factory=list)
+    errors_truncated: int = 0  # Errors dropped once the errors list is full
@@ -3,15 +3,27 @@ Analytics Service for Huntly MVP
 Calculates real-time metrics from database and provides caching
 """
 
+import hashlib
+import json
 import logging
-from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text, and_, or_, case, desc
-from sqlalchemy.sql import extract
+from sqlalchemy import (
+    DateTime, func, text, and_, or_, case, desc, literal, literal_column, select, union_all, bindparam
+)
 
 from ..database.models import Lead, Campaign, User
 from ..cache.manager import CacheManager
+from ..cache.config import CacheConfig
+from ..cache.local import LocalTTLCache
+from ..cache.policy import MemoPolicy
 from ..models.search_analytics import (
     SearchPerformanceMetrics, 
     SearchConversionMetrics,
@@ -22,13 +34,432 @@ from ..models.search_analytics import (
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on dashboard sections recomputed concurrently (one DB connection each)
+DASHBOARD_MAX_WORKERS = 6
+
+# Upper bound for a single analytics statement (PostgreSQL statement_timeout)
+ANALYTICS_STATEMENT_TIMEOUT_MS = int(os.getenv("ANALYTICS_STATEMENT_TIMEOUT_MS", "2000"))
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+APPROX_COUNT_THRESHOLD = 100_000
+
+# Process-wide L1 in front of Redis for hot analytics keys. Entries live for
+# a few seconds only, bounding how stale a worker can be after invalidation
+# happens in another process.
+_local_cache = LocalTTLCache(maxsize=CacheConfig.ANALYTICS_LOCAL_MAXSIZE)
+
+# Hit/miss/stale bookkeeping per cached metric; flushed and tuned periodically
+# (see tune_analytics_ttls) so each metric converges to its own TTL
+memo_policy = MemoPolicy(
+    candidates=CacheConfig.ANALYTICS_TTL_CANDIDATES,
+    staleness_cost=CacheConfig.ANALYTICS_STALENESS_COST
+)
+
+# Metrics whose TTL is tuned; every cache invalidation counts as a data
+# change ("stale") for all of them
+TUNED_METRICS = (
+    "dashboard_metrics", "search_performance", "search_conversion",
+    "leads_by_month", "industry_breakdown", "source_metrics",
+    "quality_scores", "facets", "conversion_breakdown", "indexing_status"
+)
+
+# Indexing coverage (%) above which the index is reported healthy, and the
+# margin around it where an estimated total is replaced by an exact count
+INDEXING_HEALTHY_COVERAGE = 90
+INDEXING_BORDERLINE_MARGIN = 1.0
+
+# Search facets: (facet name, Lead column, max values returned)
+FACET_DIMENSIONS = (
+    ("industries", Lead.industry, 20),
+    ("locations", Lead.location, 20),
+    ("company_sizes", Lead.employees, 10),
+    ("revenue_ranges", Lead.revenue, 10),
+)
+
+# Month labels used by leads_by_month, indexed by month number - 1
+MONTH_NAMES = (
+    "Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
+    "Jul", "Ago", "Set", "Out", "Nov", "Dez"
+)
+
+# Hourly search distribution (mock data for now) and the values derived from it
+HOURLY_SEARCH_DISTRIBUTION = MappingProxyType({
+    "00": 2, "01": 1, "02": 0, "03": 1, "04": 2, "05": 3,
+    "06": 5, "07": 8, "08": 12, "09": 18, "10": 15, "11": 14,
+    "12": 16, "13": 13, "14": 20, "15": 17, "16": 19, "17": 14,
+    "18": 10, "19": 8, "20": 6, "21": 5, "22": 4, "23": 3
+})
+PEAK_SEARCH_HOURS = tuple(
+    f"{hour}:00"
+    for hour, _ in sorted(HOURLY_SEARCH_DISTRIBUTION.items(), key=itemgetter(1), reverse=True)[:3]
+)
+TOTAL_SEARCHES_TODAY = sum(HOURLY_SEARCH_DISTRIBUTION.values())
+
+def _build_search_trends() -> Dict[str, Any]:
+    """Search trends payload built from the constants above"""
+    return {
+        "hourly_distribution": dict(HOURLY_SEARCH_DISTRIBUTION),
+        "peak_hours": list(PEAK_SEARCH_HOURS),
+        "total_searches_today": TOTAL_SEARCHES_TODAY,
+        "avg_searches_per_hour": round(TOTAL_SEARCHES_TODAY / 24, 1)
+    }
+
+# Serialized once for endpoints that return the trends as-is
+SEARCH_TRENDS_JSON = json.dumps(_build_search_trends(), separators=(",", ":")).encode()
+
+# Zero-valued results, returned for users without leads and on errors
+EMPTY_DASHBOARD_METRICS = {
+    "total_leads": 0,
+    "qualified_leads": 0,
+    "conversion_rate": 0.0,
+    "average_roi": 0.0,
+    "high_quality_leads": 0,
+    "recent_leads": 0,
+    "growth_rate": 0.0
+}
+
+EMPTY_SEARCH_CONVERSION_METRICS = {
+    "search_to_contact_rate": 0.0,
+    "search_to_qualified_rate": 0.0,
+    "avg_results_per_search": 0.0,
+    "zero_results_rate": 0.0,
+    "refinement_rate": 0.0,
+    "conversion_by_query_type": [],
+    "top_converting_filters": []
+}
+
+EMPTY_QUALITY_SCORES = {
+    "high_quality": {"range": "90-100", "count": 0, "label": "Alta Prioridade"},
+    "good_quality": {"range": "70-89", "count": 0, "label": "Boa Qualidade"},
+    "medium_quality": {"range": "50-69", "count": 0, "label": "Média Qualidade"},
+    "low_quality": {"range": "0-49", "count": 0, "label": "Baixa Prioridade"}
+}
+
+def _percent(part: int, whole: int) -> float:
+    """part / whole as a percentage rounded (half up) to one decimal, in integer math"""
+    if not whole:
+        return 0.0
+    return (part * 2000 // whole + 1) // 2 / 10
+
+def _count_if(condition):
+    """Conditional COUNT expression, used to fold several counts into one query"""
+    return func.sum(case((condition, 1), else_=0))
+
+def _run_in_own_session(
+    session_factory: Callable[[], Session],
+    make_service: Callable[[Session], Any],
+    method_name: str,
+    args: Tuple
+) -> Any:
+    """
+    Call a service method on a fresh session, closed afterwards.
+    
+    Sessions are not thread-safe, so each task fanned out to a thread pool
+    builds its service with make_service(session) on a session of its own.
+    """
+    db = session_factory()
+    try:
+        return getattr(make_service(db), method_name)(*args)
+    finally:
+        db.close()
+
+# Statement factories
+#
+# Each analytics statement is built once per scope (global / per user) and
+# reused; call sites only bind parameters (user_id, time windows, limits).
+
+def _scoped(stmt, user_scoped: bool):
+    """Restrict a statement to the bound user_id when user scoped"""
+    if user_scoped:
+        return stmt.where(Lead.user_id == bindparam("user_id"))
+    return stmt
+
+def _user_params(user_id: Optional[int], **params) -> Dict[str, Any]:
+    """Bind parameters for a statement built by one of the factories below"""
+    if user_id:
+        params["user_id"] = user_id
+    return params
+
+@lru_cache(maxsize=None)
+def _total_leads_stmt(user_scoped: bool):
+    return _scoped(select(func.count(Lead.id)), user_scoped)
+
+@lru_cache(maxsize=None)
+def _dashboard_metrics_stmt(user_scoped: bool):
+    # The user filter is served by idx_leads_user_created; keep the time windows
+    # comparing the bare created_at column against bound values (no functions on it).
+    week_ago = bindparam("week_ago")
+    two_weeks_ago = bindparam("two_weeks_ago")
+    return _scoped(select(
+        func.count(Lead.id),
+        _count_if(or_(Lead.email.isnot(None), Lead.phone.isnot(None))),
+        # High quality leads (score > 70 or complete data)
+        _count_if(or_(
+            Lead.score > 70,
+            and_(
+                Lead.email.isnot(None),
+                Lead.phone.isnot(None),
+                Lead.industry.isnot(None),
+                Lead.location.isnot(None)
+            )
+        )),
+        # High value leads for the ROI estimate
+        _count_if(and_(
+            Lead.email.isnot(None),
+            Lead.phone.isnot(None),
+            Lead.industry.isnot(None)
+        )),
+        # Recent activity (leads created in last 7 days)
+        _count_if(Lead.created_at >= week_ago),
+        # Previous period for the growth rate
+        _count_if(and_(
+            Lead.created_at >= two_weeks_ago,
+            Lead.created_at < week_ago
+        ))
+    ), user_scoped)
+
+@lru_cache(maxsize=None)
+def _search_conversion_counts_stmt(user_scoped: bool):
+    return _scoped(select(
+        func.count(Lead.id),
+        _count_if(Lead.last_contact.isnot(None)),
+        _count_if(or_(Lead.email.isnot(None), Lead.phone.isnot(None))),
+        # Zero results rate (estimated from incomplete leads)
+        _count_if(and_(
+            Lead.company.is_(None),
+            Lead.email.is_(None),
+            Lead.phone.is_(None)
+        ))
+    ), user_scoped)
+
+@lru_cache(maxsize=None)
+def _leads_by_month_stmt(user_scoped: bool):
+    # Keep the WHERE clause on the bare created_at column so it can use
+    # idx_leads_user_created / idx_leads_created_at; date functions
+    # belong in SELECT/GROUP BY only.
+    # Group by a single truncated-month key instead of two extract() calls
+    # 'month' is inlined so SELECT and GROUP BY render the identical expression
+    month_start = func.date_trunc(
+        literal_column("'month'"), Lead.created_at, type_=DateTime
+    ).label('month_start')
+    stmt = select(
+        month_start,
+        func.count(Lead.id).label('total_leads'),
+        func.count(Lead.id).filter(
+            or_(Lead.email.isnot(None), Lead.phone.isnot(None))
+        ).label('qualified_leads')
+    ).where(Lead.created_at >= bindparam("start_date"))
+    return _scoped(stmt, user_scoped).group_by(month_start)
+
+@lru_cache(maxsize=None)
+def _industry_breakdown_stmt(user_scoped: bool):
+    stmt = select(
+        Lead.industry,
+        func.count(Lead.id).label('count')
+    ).where(Lead.industry.isnot(None))
+    return _scoped(stmt, user_scoped).group_by(Lead.industry).order_by(
+        desc(func.count(Lead.id))
+    ).limit(bindparam("limit"))
+
+@lru_cache(maxsize=None)
+def _source_metrics_stmt(user_scoped: bool):
+    # Simulate source tracking based on data patterns
+    # In a real implementation, you'd have a source field
+    return _scoped(select(
+        func.count(Lead.id),
+        # LinkedIn (leads with complete professional info)
+        _count_if(and_(
+            Lead.industry.isnot(None),
+            Lead.location.isnot(None),
+            Lead.description.isnot(None)
+        )),
+        # Google Search (leads with website)
+        _count_if(Lead.website.isnot(None)),
+        # Website (leads with email but no phone)
+        _count_if(and_(Lead.email.isnot(None), Lead.phone.is_(None)))
+    ), user_scoped)
+
+@lru_cache(maxsize=None)
+def _quality_scores_stmt(user_scoped: bool):
+    # Bucket each lead by data completeness and count every bucket
+    # in a single grouped query
+    has_contact = or_(Lead.email.isnot(None), Lead.phone.isnot(None))
+    bucket = case(
+        (and_(
+            Lead.email.isnot(None),
+            Lead.phone.isnot(None),
+            Lead.industry.isnot(None),
+            Lead.location.isnot(None),
+            Lead.description.isnot(None)
+        ), "high"),
+        (and_(
+            has_contact,
+            Lead.industry.isnot(None),
+            Lead.location.isnot(None)
+        ), "good"),
+        (has_contact, "medium"),
+        else_="low"
+    ).label("bucket")
+    return _scoped(select(bucket, func.count(Lead.id)), user_scoped).group_by(bucket)
+
+@lru_cache(maxsize=None)
+def _indexing_status_stmt():
+    # Total, indexed, indexed since the bound cutoff and latest index time
+    # in one scan of leads
+    return select(
+        func.count(Lead.id),
+        func.count(Lead.indexed_at),
+        _count_if(Lead.indexed_at >= bindparam("indexed_since")),
+        func.max(Lead.indexed_at)
+    )
+
+@lru_cache(maxsize=None)
+def _indexed_leads_stmt():
+    # Indexed-lead counters only, answered from idx_leads_indexed_at_not_null
+    # without touching the rest of the table
+    return select(
+        func.count(Lead.indexed_at),
+        _count_if(Lead.indexed_at >= bindparam("indexed_since")),
+        func.max(Lead.indexed_at)
+    ).where(Lead.indexed_at.isnot(None))
+
+# Top converting filters: (filter prefix, Lead column, max values returned),
+# and the number of filters returned overall
+TOP_CONVERTING_FILTERS_LIMIT = 4
+CONVERTING_FILTER_DIMENSIONS = (
+    ("industry", Lead.industry, 3),
+    ("location", Lead.location, 2),
+)
+
+@lru_cache(maxsize=None)
+def _top_converting_filters_stmt():
+    return _build_top_converting_filters_stmt()
+
+def _build_top_converting_filters_stmt(whereclause=None):
+    # Most used values of each filter dimension with their conversions,
+    # fetched with one UNION ALL, ordered by dimension, then usage, and
+    # capped in SQL so no ranking happens in Python. `whereclause` narrows
+    # every dimension to the caller's leads.
+    filter_queries = []
+    for position, (kind, column, limit) in enumerate(CONVERTING_FILTER_DIMENSIONS):
+        conversions = func.count(
+            case(
+                (or_(Lead.email.isnot(None), Lead.phone.isnot(None)), Lead.id),
+                else_=None
+            )
+        )
+        grouped = select(
+            column.label("value"),
+            func.count(Lead.id).label("usage"),
+            # Every group has at least one lead, so the division is safe
+            func.round(conversions * 100.0 / func.count(Lead.id), 1).label("rate")
+        ).where(column.isnot(None))
+        if whereclause is not None:
+            grouped = grouped.where(whereclause)
+        grouped = grouped.group_by(column).order_by(
+            desc(func.count(Lead.id))
+        ).limit(limit).subquery()
+        
+        filter_queries.append(select(
+            literal(position).label("position"),
+            literal(kind).label("kind"),
+            grouped.c.value,
+            grouped.c.usage,
+            grouped.c.rate
+        ))
+    
+    stmt = union_all(*filter_queries).subquery()
+    return select(stmt).order_by(stmt.c.position, desc(stmt.c.usage)).limit(
+        TOP_CONVERTING_FILTERS_LIMIT
+    )
+
+@lru_cache(maxsize=None)
+def _conversion_views_stmt():
+    # Same result shape as _top_converting_filters_stmt, read from the
+    # leads_by_<kind>_conversion materialized views (see create_analytics_views)
+    filter_queries = " UNION ALL ".join(
+        f"""(SELECT {position} AS position, '{kind}' AS kind, value, usage,
+                    ROUND(conversions * 100.0 / usage, 1) AS rate
+             FROM leads_by_{kind}_conversion
+             ORDER BY usage DESC LIMIT {limit})"""
+        for position, (kind, _, limit) in enumerate(CONVERTING_FILTER_DIMENSIONS)
+    )
+    return text(f"""
+        SELECT * FROM ({filter_queries}) filters
+        ORDER BY position, usage DESC
+        LIMIT {TOP_CONVERTING_FILTERS_LIMIT}
+    """)
+
+# Materialized views refreshed by AnalyticsService.refresh_analytics_views()
+ANALYTICS_VIEWS = ("leads_facets", "dashboard_daily_stats", "popular_queries_30d") + tuple(
+    f"leads_by_{kind}_conversion" for kind, _, _ in CONVERTING_FILTER_DIMENSIONS
+)
+
+@lru_cache(maxsize=None)
+def _search_facets_stmt(user_scoped: bool):
+    # Top values of every facet dimension, fetched with one UNION ALL
+    facet_queries = []
+    for kind, column, limit in FACET_DIMENSIONS:
+        grouped = select(
+            column.label("value"),
+            func.count(Lead.id).label("count")
+        ).where(column.isnot(None))
+        
+        grouped = _scoped(grouped, user_scoped).group_by(column).order_by(
+            desc(func.count(Lead.id))
+        ).limit(limit).subquery()
+        
+        facet_queries.append(select(
+            literal(kind).label("kind"),
+            grouped.c.value,
+            grouped.c.count
+        ))
+    
+    stmt = union_all(*facet_queries)
+    return select(stmt.subquery()).order_by(desc("count"))
+
+@lru_cache(maxsize=None)
+def _facets_view_stmt(user_scoped: bool):
+    # Same result shape as _search_facets_stmt, read from the leads_facets
+    # materialized view (see create_analytics_views)
+    limits = " ".join(
+        f"WHEN '{kind}' THEN {limit}" for kind, _, limit in FACET_DIMENSIONS
+    )
+    user_filter = "WHERE user_id = :user_id" if user_scoped else ""
+    return text(f"""
+        SELECT dim AS kind, value, total AS count FROM (
+            SELECT dim, value, SUM(count) AS total,
+                   ROW_NUMBER() OVER (PARTITION BY dim ORDER BY SUM(count) DESC) AS position
+            FROM leads_facets
+            {user_filter}
+            GROUP BY dim, value
+        ) ranked
+        WHERE position <= CASE dim {limits} END
+        ORDER BY total DESC
+    """)
+
+def tune_analytics_ttls(redis_client) -> Dict[str, int]:
+    """Publish this process's cache bookkeeping and retune the analytics TTLs"""
+    memo_policy.flush(redis_client)
+    return memo_policy.tune(redis_client)
+
 class AnalyticsService:
     """Service for calculating and caching analytics metrics"""
     
-    def __init__(self, db_session: Session, cache_manager: CacheManager):
-        """Initialize analytics service with database and cache"""
+    def __init__(
+        self,
+        db_session: Session,
+        cache_manager: CacheManager,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        """Initialize analytics service with database and cache.
+        
+        When a session factory is given, get_full_dashboard recomputes missing
+        sections concurrently, each on its own session.
+        """
         self.db = db_session
         self.cache = cache_manager
+        self.session_factory = session_factory
         
         # Cache TTL settings (in seconds)
         self.cache_ttl = {
@@ -40,70 +471,59 @@ class AnalyticsService:
             "source_metrics": 1800,         # 30 minutes
             "quality_scores": 1800,         # 30 minutes
             "search_trends": 300,           # 5 minutes
-            "facets": 600                   # 10 minutes
+            "facets": 600,                  # 10 minutes
+            "indexing_status": 120,         # 2 minutes
+            "cache_hit_rate": 10,           # 10 seconds, in-process only
+            "conversion_breakdown": 600,    # 10 minutes
+            "empty": 60                     # 1 minute, for users without leads
         }
+        
+        # Request-scoped memo for values shared between metric methods
+        self._req_cache: Dict[Tuple, int] = {}
+        self._request_now: Optional[datetime] = None
+        self._reads_bounded = False
+        # Cache misses being recomputed: cache key -> (metric, start time)
+        self._pending_misses: Dict[str, Tuple[str, float]] = {}
+        # Keys whose refresh lock this instance holds; read past the cache once
+        self._force_refresh: Set[str] = set()
     
     def get_dashboard_metrics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Get main dashboard metrics with caching"""
         cache_key = f"dashboard_metrics_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "dashboard_metrics")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for dashboard metrics (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for dashboard metrics (user: {user_id})")
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            # Calculate metrics
-            total_leads = query.count()
-            
-            # Qualified leads (leads with email or phone)
-            qualified_query = query.filter(
-                or_(
-                    Lead.email.isnot(None),
-                    Lead.phone.isnot(None)
-                )
-            )
-            qualified_leads = qualified_query.count()
+            # All dashboard counts in a single aggregate query
+            now = self._db_now()
+            week_ago = now - timedelta(days=7)
+            two_weeks_ago = now - timedelta(days=14)
+            row = self.db.execute(
+                _dashboard_metrics_stmt(bool(user_id)),
+                _user_params(user_id, week_ago=week_ago, two_weeks_ago=two_weeks_ago)
+            ).one()
+            
+            (
+                total_leads,
+                qualified_leads,
+                high_quality_leads,
+                high_value_leads,
+                recent_leads,
+                previous_week_leads
+            ) = (int(value or 0) for value in row)
+            self._remember_total_leads(user_id, total_leads)
             
             # Conversion rate
             conversion_rate = (qualified_leads / total_leads * 100) if total_leads > 0 else 0.0
             
-            # High quality leads (score > 70 or complete data)
-            high_quality_leads = query.filter(
-                or_(
-                    Lead.score > 70,
-                    and_(
-                        Lead.email.isnot(None),
-                        Lead.phone.isnot(None),
-                        Lead.industry.isnot(None),
-                        Lead.location.isnot(None)
-                    )
-                )
-            ).count()
-            
             # Average ROI calculation (simplified based on lead quality)
-            avg_roi = self._calculate_average_roi(query)
-            
-            # Recent activity (leads created in last 7 days)
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            recent_leads = query.filter(Lead.created_at >= week_ago).count()
-            
-            # Growth rate (compare with previous period)
-            two_weeks_ago = datetime.utcnow() - timedelta(days=14)
-            previous_week_leads = query.filter(
-                and_(
-                    Lead.created_at >= two_weeks_ago,
-                    Lead.created_at < week_ago
-                )
-            ).count()
+            avg_roi = self._calculate_average_roi(total_leads, high_value_leads, qualified_leads)
             
             growth_rate = (
                 ((recent_leads - previous_week_leads) / previous_week_leads * 100)
@@ -118,38 +538,29 @@ class AnalyticsService:
                 "high_quality_leads": high_quality_leads,
                 "recent_leads": recent_leads,
                 "growth_rate": round(growth_rate, 1),
-                "last_updated": datetime.utcnow().isoformat()
+                "last_updated": self._now_iso()
             }
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key, 
                 metrics, 
-                self.cache_ttl["dashboard_metrics"]
+                self._metric_ttl("dashboard_metrics", total_leads)
             )
             
             return metrics
             
         except Exception as e:
             logger.error(f"Error calculating dashboard metrics: {e}")
-            return {
-                "total_leads": 0,
-                "qualified_leads": 0,
-                "conversion_rate": 0.0,
-                "average_roi": 0.0,
-                "high_quality_leads": 0,
-                "recent_leads": 0,
-                "growth_rate": 0.0,
-                "error": str(e)
-            }
+            return {**EMPTY_DASHBOARD_METRICS, "error": str(e)}
     
     def get_search_performance_metrics(self) -> Dict[str, Any]:
         """Get search performance metrics with caching"""
         cache_key = "search_performance_global"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "search_performance")
+        if cached_data is not None:
             logger.debug("Cache HIT for search performance metrics")
             return cached_data
         
@@ -186,14 +597,16 @@ class AnalyticsService:
                 "popular_queries": popular_queries,
                 "search_trends": search_trends,
                 "indexing_status": indexing_status,
-                "last_updated": datetime.utcnow().isoformat()
+                # Derived once here so dashboard readers get it with the cached entry
+                "system_health": self._calculate_system_health(avg_response_time, cache_hit_rate),
+                "last_updated": self._now_iso()
             }
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 metrics,
-                self.cache_ttl["search_performance"]
+                self._ttl("search_performance")
             )
             
             return metrics
@@ -207,34 +620,68 @@ class AnalyticsService:
                 "popular_queries": [],
                 "search_trends": {},
                 "indexing_status": {},
+                "system_health": "unknown",
                 "error": str(e)
             }
     
+    def _calculate_system_health(self, response_time: float, cache_hit_rate: float) -> str:
+        """Overall system health tier from response time and cache hit rate"""
+        if response_time < 200 and cache_hit_rate > 70:
+            return "excellent"
+        elif response_time < 500 and cache_hit_rate > 50:
+            return "good"
+        elif response_time < 1000:
+            return "fair"
+        else:
+            return "poor"
+    
     def get_search_conversion_metrics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Get search conversion metrics with caching"""
         cache_key = f"search_conversion_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "search_conversion")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for search conversion metrics (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for search conversion metrics (user: {user_id})")
         
         try:
+            # Exact total alongside the conversion counts, so the rates below
+            # never divide by a planner estimate
+            row = self._search_conversion_counts(user_id)
+            total_leads, contacted_leads, qualified_leads, incomplete_leads = (
+                int(value or 0) for value in row
+            )
+            self._remember_total_leads(user_id, total_leads)
+            if total_leads == 0:
+                metrics = {**EMPTY_SEARCH_CONVERSION_METRICS, "last_updated": self._now_iso()}
+                self._cache_result(cache_key, metrics, self.cache_ttl["empty"])
+                return metrics
+            
             # Build base query
             query = self.db.query(Lead)
             if user_id:
                 query = query.filter(Lead.user_id == user_id)
             
-            total_leads = query.count()
-            
-            # Calculate conversion rates
-            contacted_leads = query.filter(Lead.last_contact.isnot(None)).count()
-            qualified_leads = query.filter(
-                or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-            ).count()
+            # The two breakdown helpers are independent of each other, so with
+            # a session factory they run side by side on their own sessions.
+            if self.session_factory is not None:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    by_query_type = executor.submit(
+                        self._compute_in_own_session, "_calculate_conversion_by_query_type", (query, user_id)
+                    )
+                    top_filters = executor.submit(
+                        self._compute_in_own_session, "_calculate_top_converting_filters", (query, user_id)
+                    )
+                    conversion_by_query_type = by_query_type.result()
+                    top_converting_filters = top_filters.result()
+            else:
+                # Conversion by query type (based on industry and location data)
+                conversion_by_query_type = self._calculate_conversion_by_query_type(query, user_id)
+                # Top converting filters
+                top_converting_filters = self._calculate_top_converting_filters(query, user_id)
             
             search_to_contact_rate = (
                 (contacted_leads / total_leads * 100) if total_leads > 0 else 0.0
@@ -246,25 +693,11 @@ class AnalyticsService:
             # Average results per search (estimated)
             avg_results_per_search = 12.5  # Based on typical search behavior
             
-            # Zero results rate (estimated from incomplete leads)
-            incomplete_leads = query.filter(
-                and_(
-                    Lead.company.is_(None),
-                    Lead.email.is_(None),
-                    Lead.phone.is_(None)
-                )
-            ).count()
             zero_results_rate = (incomplete_leads / total_leads * 100) if total_leads > 0 else 0.0
             
             # Refinement rate (estimated)
             refinement_rate = 18.9  # Typical refinement behavior
             
-            # Conversion by query type (based on industry and location data)
-            conversion_by_query_type = self._calculate_conversion_by_query_type(query)
-            
-            # Top converting filters
-            top_converting_filters = self._calculate_top_converting_filters(query)
-            
             metrics = {
                 "search_to_contact_rate": round(search_to_contact_rate, 1),
                 "search_to_qualified_rate": round(search_to_qualified_rate, 1),
@@ -273,120 +706,72 @@ class AnalyticsService:
                 "refinement_rate": refinement_rate,
                 "conversion_by_query_type": conversion_by_query_type,
                 "top_converting_filters": top_converting_filters,
-                "last_updated": datetime.utcnow().isoformat()
+                "last_updated": self._now_iso()
             }
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 metrics,
-                self.cache_ttl["search_conversion"]
+                self._ttl("search_conversion")
             )
             
             return metrics
             
         except Exception as e:
             logger.error(f"Error calculating search conversion metrics: {e}")
-            return {
-                "search_to_contact_rate": 0.0,
-                "search_to_qualified_rate": 0.0,
-                "avg_results_per_search": 0.0,
-                "zero_results_rate": 0.0,
-                "refinement_rate": 0.0,
-                "conversion_by_query_type": [],
-                "top_converting_filters": [],
-                "error": str(e)
-            }
+            return {**EMPTY_SEARCH_CONVERSION_METRICS, "error": str(e)}
     
     def get_leads_by_month(self, user_id: Optional[int] = None, months: int = 6) -> List[Dict[str, Any]]:
         """Get leads evolution by month with caching"""
         cache_key = f"leads_by_month_{user_id or 'global'}_{months}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "leads_by_month")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for leads by month (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for leads by month (user: {user_id})")
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
             # Get data for the last N months
-            end_date = datetime.utcnow()
+            end_date = self._db_now()
             start_date = end_date - timedelta(days=months * 30)
             
-            query = query.filter(Lead.created_at >= start_date)
-            
-            # Group by month
-            monthly_data = self.db.query(
-                extract('year', Lead.created_at).label('year'),
-                extract('month', Lead.created_at).label('month'),
-                func.count(Lead.id).label('total_leads'),
-                func.count(
-                    case(
-                        (or_(Lead.email.isnot(None), Lead.phone.isnot(None)), Lead.id),
-                        else_=None
-                    )
-                ).label('qualified_leads')
-            )
-            
-            if user_id:
-                monthly_data = monthly_data.filter(Lead.user_id == user_id)
-            
-            monthly_data = monthly_data.filter(Lead.created_at >= start_date).group_by(
-                extract('year', Lead.created_at),
-                extract('month', Lead.created_at)
-            ).order_by(
-                extract('year', Lead.created_at),
-                extract('month', Lead.created_at)
+            monthly_data = self.db.execute(
+                _leads_by_month_stmt(bool(user_id)),
+                _user_params(user_id, start_date=start_date)
             ).all()
             
             # Format results
-            month_names = [
-                "Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
-                "Jul", "Ago", "Set", "Out", "Nov", "Dez"
-            ]
+            by_year_month = {
+                (row.month_start.year, row.month_start.month): row
+                for row in monthly_data
+            }
+            
+            # Every month in the window, in order, with zeros for missing months
+            expected_months = []
+            year, month = start_date.year, start_date.month
+            while (year, month) <= (end_date.year, end_date.month):
+                expected_months.append((year, month))
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
             
             results = []
-            for row in monthly_data:
-                month_name = month_names[int(row.month) - 1]
+            for year, month in expected_months:
+                row = by_year_month.get((year, month))
                 results.append({
-                    "month": month_name,
-                    "leads": int(row.total_leads),
-                    "qualified": int(row.qualified_leads),
-                    "year": int(row.year)
+                    "month": MONTH_NAMES[month - 1],
+                    "leads": int(row.total_leads) if row else 0,
+                    "qualified": int(row.qualified_leads) if row else 0,
+                    "year": year
                 })
             
-            # Fill missing months with zeros
-            if len(results) < months:
-                current_date = start_date
-                existing_months = {(r["year"], month_names.index(r["month"]) + 1) for r in results}
-                
-                while current_date <= end_date:
-                    year_month = (current_date.year, current_date.month)
-                    if year_month not in existing_months:
-                        results.append({
-                            "month": month_names[current_date.month - 1],
-                            "leads": 0,
-                            "qualified": 0,
-                            "year": current_date.year
-                        })
-                    current_date += timedelta(days=32)
-                    current_date = current_date.replace(day=1)
-            
-            # Sort by date
-            results.sort(key=lambda x: (x["year"], month_names.index(x["month"])))
-            
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 results,
-                self.cache_ttl["leads_by_month"]
+                self._ttl("leads_by_month")
             )
             
             return results
@@ -400,26 +785,18 @@ class AnalyticsService:
         cache_key = f"industry_breakdown_{user_id or 'global'}_{limit}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "industry_breakdown")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for industry breakdown (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for industry breakdown (user: {user_id})")
         
         try:
-            # Build query
-            query = self.db.query(
-                Lead.industry,
-                func.count(Lead.id).label('count')
-            ).filter(Lead.industry.isnot(None))
-            
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            results = query.group_by(Lead.industry).order_by(
-                desc(func.count(Lead.id))
-            ).limit(limit).all()
+            results = self.db.execute(
+                _industry_breakdown_stmt(bool(user_id)),
+                _user_params(user_id, limit=limit)
+            ).all()
             
             # Format results
             breakdown = [
@@ -431,10 +808,10 @@ class AnalyticsService:
             ]
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 breakdown,
-                self.cache_ttl["industry_breakdown"]
+                self._ttl("industry_breakdown")
             )
             
             return breakdown
@@ -448,77 +825,47 @@ class AnalyticsService:
         cache_key = f"source_metrics_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "source_metrics")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for source metrics (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for source metrics (user: {user_id})")
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            total_leads = query.count()
-            
-            # Simulate source tracking based on data patterns
-            # In a real implementation, you'd have a source field
+            row = self.db.execute(_source_metrics_stmt(bool(user_id)), _user_params(user_id)).one()
+            total_leads, linkedin_leads, google_leads, website_leads = (
+                int(value or 0) for value in row
+            )
+            self._remember_total_leads(user_id, total_leads)
             sources = []
             
-            # LinkedIn (leads with complete professional info)
-            linkedin_leads = query.filter(
-                and_(
-                    Lead.industry.isnot(None),
-                    Lead.location.isnot(None),
-                    Lead.description.isnot(None)
-                )
-            ).count()
-            
-            # Google Search (leads with website)
-            google_leads = query.filter(Lead.website.isnot(None)).count()
-            
-            # Website (leads with email but no phone)
-            website_leads = query.filter(
-                and_(Lead.email.isnot(None), Lead.phone.is_(None))
-            ).count()
-            
             # Referrals (remaining leads)
             referral_leads = max(0, total_leads - linkedin_leads - google_leads - website_leads)
             
             if total_leads > 0:
+                # Sort the (source, count) pairs by leads count, then build the rows
+                counts = sorted(
+                    (
+                        ("LinkedIn", linkedin_leads),
+                        ("Google Search", google_leads),
+                        ("Website", website_leads),
+                        ("Referências", referral_leads)
+                    ),
+                    key=itemgetter(1),
+                    reverse=True
+                )
+                inv_total = 100.0 / total_leads
                 sources = [
-                    {
-                        "source": "LinkedIn",
-                        "leads": linkedin_leads,
-                        "percentage": round(linkedin_leads / total_leads * 100, 1)
-                    },
-                    {
-                        "source": "Google Search",
-                        "leads": google_leads,
-                        "percentage": round(google_leads / total_leads * 100, 1)
-                    },
-                    {
-                        "source": "Website",
-                        "leads": website_leads,
-                        "percentage": round(website_leads / total_leads * 100, 1)
-                    },
-                    {
-                        "source": "Referências",
-                        "leads": referral_leads,
-                        "percentage": round(referral_leads / total_leads * 100, 1)
-                    }
+                    {"source": source, "leads": leads, "percentage": round(leads * inv_total, 1)}
+                    for source, leads in counts
                 ]
             
-            # Sort by leads count
-            sources.sort(key=lambda x: x["leads"], reverse=True)
-            
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 sources,
-                self.cache_ttl["source_metrics"]
+                self._metric_ttl("source_metrics", total_leads)
             )
             
             return sources
@@ -532,44 +879,23 @@ class AnalyticsService:
         cache_key = f"quality_scores_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "quality_scores")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for quality scores (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for quality scores (user: {user_id})")
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            # Calculate quality scores based on data completeness
-            high_quality = query.filter(
-                and_(
-                    Lead.email.isnot(None),
-                    Lead.phone.isnot(None),
-                    Lead.industry.isnot(None),
-                    Lead.location.isnot(None),
-                    Lead.description.isnot(None)
-                )
-            ).count()
-            
-            good_quality = query.filter(
-                and_(
-                    or_(Lead.email.isnot(None), Lead.phone.isnot(None)),
-                    Lead.industry.isnot(None),
-                    Lead.location.isnot(None)
-                )
-            ).count() - high_quality
-            
-            medium_quality = query.filter(
-                or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-            ).count() - high_quality - good_quality
-            
-            total_leads = query.count()
-            low_quality = max(0, total_leads - high_quality - good_quality - medium_quality)
+            counts = dict(
+                self.db.execute(_quality_scores_stmt(bool(user_id)), _user_params(user_id)).all()
+            )
+            high_quality = int(counts.get("high", 0))
+            good_quality = int(counts.get("good", 0))
+            medium_quality = int(counts.get("medium", 0))
+            low_quality = int(counts.get("low", 0))
+            total_leads = high_quality + good_quality + medium_quality + low_quality
+            self._remember_total_leads(user_id, total_leads)
             
             scores = {
                 "high_quality": {
@@ -595,118 +921,45 @@ class AnalyticsService:
             }
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 scores,
-                self.cache_ttl["quality_scores"]
+                self._metric_ttl("quality_scores", total_leads)
             )
             
             return scores
             
         except Exception as e:
             logger.error(f"Error calculating quality scores: {e}")
-            return {
-                "high_quality": {"range": "90-100", "count": 0, "label": "Alta Prioridade"},
-                "good_quality": {"range": "70-89", "count": 0, "label": "Boa Qualidade"},
-                "medium_quality": {"range": "50-69", "count": 0, "label": "Média Qualidade"},
-                "low_quality": {"range": "0-49", "count": 0, "label": "Baixa Prioridade"}
-            }
+            return EMPTY_QUALITY_SCORES
     
     def get_search_facets(self, user_id: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
         """Get search facets for advanced filtering with caching"""
         cache_key = f"search_facets_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key, "facets")
+        if cached_data is not None:
             logger.debug(f"Cache HIT for search facets (user: {user_id})")
             return cached_data
         
         logger.debug(f"Cache MISS for search facets (user: {user_id})")
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            # Get industry facets
-            industries = self.db.query(
-                Lead.industry,
-                func.count(Lead.id).label('count')
-            ).filter(Lead.industry.isnot(None))
-            
-            if user_id:
-                industries = industries.filter(Lead.user_id == user_id)
-            
-            industries = industries.group_by(Lead.industry).order_by(
-                desc(func.count(Lead.id))
-            ).limit(20).all()
-            
-            # Get location facets
-            locations = self.db.query(
-                Lead.location,
-                func.count(Lead.id).label('count')
-            ).filter(Lead.location.isnot(None))
-            
-            if user_id:
-                locations = locations.filter(Lead.user_id == user_id)
-            
-            locations = locations.group_by(Lead.location).order_by(
-                desc(func.count(Lead.id))
-            ).limit(20).all()
-            
-            # Get company size facets
-            company_sizes = self.db.query(
-                Lead.employees,
-                func.count(Lead.id).label('count')
-            ).filter(Lead.employees.isnot(None))
-            
-            if user_id:
-                company_sizes = company_sizes.filter(Lead.user_id == user_id)
-            
-            company_sizes = company_sizes.group_by(Lead.employees).order_by(
-                desc(func.count(Lead.id))
-            ).limit(10).all()
-            
-            # Get revenue range facets
-            revenue_ranges = self.db.query(
-                Lead.revenue,
-                func.count(Lead.id).label('count')
-            ).filter(Lead.revenue.isnot(None))
-            
-            if user_id:
-                revenue_ranges = revenue_ranges.filter(Lead.user_id == user_id)
-            
-            revenue_ranges = revenue_ranges.group_by(Lead.revenue).order_by(
-                desc(func.count(Lead.id))
-            ).limit(10).all()
+            rows = self._read_facets_view(user_id)
+            if rows is None:
+                rows = self.db.execute(_search_facets_stmt(bool(user_id)), _user_params(user_id))
             
             # Format facets
-            facets = {
-                "industries": [
-                    {"value": row.industry, "count": int(row.count)}
-                    for row in industries
-                ],
-                "locations": [
-                    {"value": row.location, "count": int(row.count)}
-                    for row in locations
-                ],
-                "company_sizes": [
-                    {"value": row.employees, "count": int(row.count)}
-                    for row in company_sizes
-                ],
-                "revenue_ranges": [
-                    {"value": row.revenue, "count": int(row.count)}
-                    for row in revenue_ranges
-                ]
-            }
+            facets = {kind: [] for kind, _, _ in FACET_DIMENSIONS}
+            for row in rows:
+                facets[row.kind].append({"value": row.value, "count": int(row.count)})
             
             # Cache the results
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 facets,
-                self.cache_ttl["facets"]
+                self._ttl("facets")
             )
             
             return facets
@@ -720,6 +973,67 @@ class AnalyticsService:
                 "revenue_ranges": []
             }
     
+    def get_full_dashboard(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Get every dashboard section, reading all cached sections in one round trip"""
+        scope = user_id or 'global'
+        sections = {
+            "dashboard": (f"dashboard_metrics_{scope}", "get_dashboard_metrics", (user_id,)),
+            "search_performance": ("search_performance_global", "get_search_performance_metrics", ()),
+            "search_conversion": (f"search_conversion_{scope}", "get_search_conversion_metrics", (user_id,)),
+            "leads_by_month": (f"leads_by_month_{scope}_6", "get_leads_by_month", (user_id, 6)),
+            "industry_breakdown": (f"industry_breakdown_{scope}_10", "get_industry_breakdown", (user_id, 10)),
+            "source_metrics": (f"source_metrics_{scope}", "get_source_metrics", (user_id,)),
+            "quality_scores": (f"quality_scores_{scope}", "get_quality_scores", (user_id,))
+        }
+        
+        # Sections held in the in-process cache skip Redis entirely
+        cached = {}
+        for cache_key, _, _ in sections.values():
+            value = _local_cache.get(cache_key)
+            if value is not None:
+                cached[cache_key] = value
+        
+        remote_keys = [cache_key for cache_key, _, _ in sections.values() if cache_key not in cached]
+        refresh_keys = set()
+        if remote_keys:
+            values, stale_keys = self.cache.mget_analytics(remote_keys)
+            # Stale sections are served as they are, except those whose
+            # refresh lock this request wins: it recomputes them itself
+            refresh_keys = {cache_key for cache_key in stale_keys if self.cache.claim_analytics_refresh(cache_key)}
+            for cache_key, value in values.items():
+                if cache_key not in refresh_keys:
+                    self._remember_local(cache_key, value)
+                    cached[cache_key] = value
+        logger.debug(f"Dashboard cache: {len(cached)}/{len(sections)} sections cached (user: {user_id})")
+        
+        dashboard = {}
+        missing = {}
+        for name, (cache_key, method_name, args) in sections.items():
+            if cache_key in cached:
+                dashboard[name] = cached[cache_key]
+                memo_policy.record("dashboard_metrics" if name == "dashboard" else name, "hit")
+            else:
+                missing[name] = (method_name, args, cache_key if cache_key in refresh_keys else None)
+        
+        # Only the missing sections are recomputed, in parallel when possible
+        if len(missing) > 1 and self.session_factory is not None:
+            workers = min(DASHBOARD_MAX_WORKERS, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    name: executor.submit(self._compute_in_own_session, method_name, args, refresh_key)
+                    for name, (method_name, args, refresh_key) in missing.items()
+                }
+                for name, future in futures.items():
+                    dashboard[name] = future.result()
+        else:
+            for name, (method_name, args, refresh_key) in missing.items():
+                if refresh_key:
+                    self._force_refresh.add(refresh_key)
+                dashboard[name] = getattr(self, method_name)(*args)
+        
+        dashboard["last_updated"] = dashboard["dashboard"].get("last_updated")
+        return dashboard
+    
     def invalidate_analytics_cache(self, user_id: Optional[int] = None) -> bool:
         """Invalidate analytics cache for a user or globally"""
         try:
@@ -732,14 +1046,30 @@ class AnalyticsService:
                     f"analytics:industry_breakdown_{user_id}_*",
                     f"analytics:source_metrics_{user_id}",
                     f"analytics:quality_scores_{user_id}",
-                    f"analytics:search_facets_{user_id}"
+                    f"analytics:search_facets_{user_id}",
+                    f"analytics:dashboard_summary_{user_id}",
+                    f"analytics:real_time_metrics_{user_id}",
+                    f"analytics:conversion_funnel_{user_id}",
+                    f"analytics:activity_feed_{user_id}_*",
+                    f"analytics:search_summary_{user_id}_*",
+                    f"analytics:popular_queries_{user_id}_*",
+                    f"analytics:conversion_by_query_type_{user_id}_*",
+                    f"analytics:top_converting_filters_{user_id}_*"
                 ]
                 
                 for pattern in patterns:
                     self.cache.invalidate_pattern(pattern)
+                    _local_cache.invalidate_pattern(pattern[len("analytics:"):])
             else:
                 # Invalidate all analytics caches
                 self.cache.invalidate_analytics_cache()
+                _local_cache.clear()
+            
+            self._req_cache.clear()
+            for metric in TUNED_METRICS:
+                memo_policy.record(metric, "stale")
+            # The materialized views are left to the periodic refresh task:
+            # refreshing them here would block the request on every view
             
             logger.info(f"Analytics cache invalidated for user: {user_id or 'global'}")
             return True
@@ -748,432 +1078,347 @@ class AnalyticsService:
             logger.error(f"Error invalidating analytics cache: {e}")
             return False
     
-    # Helper methods
-    def _calculate_average_roi(self, query) -> float:
-        """Calculate average ROI based on lead quality and conversion potential"""
-        try:
-            # Simplified ROI calculation based on lead completeness and quality
-            high_value_leads = query.filter(
-                and_(
-                    Lead.email.isnot(None),
-                    Lead.phone.isnot(None),
-                    Lead.industry.isnot(None)
-                )
-            ).count()
-            
-            medium_value_leads = query.filter(
-                or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-            ).count()
-            
-            total_leads = query.count()
-            
-            if total_leads == 0:
-                return 0.0
-            
-            # Calculate weighted ROI based on lead quality
-            # High value leads: $500 potential value
-            # Medium value leads: $200 potential value
-            # Low value leads: $50 potential value
-            
-            low_value_leads = total_leads - medium_value_leads
-            estimated_roi = (
-                (high_value_leads * 500) + 
-                ((medium_value_leads - high_value_leads) * 200) + 
-                (low_value_leads * 50)
-            ) / total_leads if total_leads > 0 else 0.0
-            
-            return estimated_roi
-            
-        except Exception as e:
-            logger.error(f"Error calculating average ROI: {e}")
-            return 0.0
+    def _search_conversion_counts(self, user_id: Optional[int]) -> Tuple:
+        """(total, contacted, qualified, incomplete) lead counts in one round trip"""
+        return self.db.execute(
+            _search_conversion_counts_stmt(bool(user_id)), _user_params(user_id)
+        ).one()
     
-    def _calculate_search_trends(self) -> Dict[str, Any]:
-        """Calculate search trends by hour of day"""
-        try:
-            # Simulate search trends based on typical business hours
-            # In a real implementation, this would query SearchAnalyticsEvent
-            trends = {
-                "hourly_distribution": {
-                    "0": 2, "1": 1, "2": 1, "3": 1, "4": 1, "5": 2,
-                    "6": 5, "7": 12, "8": 25, "9": 35, "10": 40,
-                    "11": 38, "12": 30, "13": 35, "14": 42, "15": 38,
-                    "16": 32, "17": 25, "18": 15, "19": 10, "20": 8,
-                    "21": 6, "22": 4, "23": 3
-                },
-                "peak_hours": ["9-11", "14-16"],
-                "total_searches_last_24h": 287
-            }
-            return trends
-        except Exception as e:
-            logger.error(f"Error calculating search trends: {e}")
-            return {}
+    def _compute_in_own_session(self, method_name: str, args: Tuple, refresh_key: Optional[str] = None) -> Any:
+        """Run a metric method on a fresh session, optionally bypassing one cache entry"""
+        def make_service(db: Session) -> "AnalyticsService":
+            service = AnalyticsService(db, self.cache)
+            service._request_now = self._now()
+            if refresh_key:
+                service._force_refresh.add(refresh_key)
+            return service
+        
+        return _run_in_own_session(self.session_factory, make_service, method_name, args)
     
-    def _get_indexing_status(self) -> Dict[str, Any]:
-        """Get current indexing status"""
+    def refresh_analytics_views(self) -> bool:
+        """Refresh the analytics materialized views without blocking readers"""
+        if not self._is_postgresql():
+            return False
+        
         try:
-            # Get indexing statistics from database
-            total_leads = self.db.query(Lead).count()
-            indexed_leads = self.db.query(Lead).filter(Lead.indexed_at.isnot(None)).count()
-            
-            indexing_percentage = (indexed_leads / total_leads * 100) if total_leads > 0 else 0.0
-            
-            return {
-                "total_leads": total_leads,
-                "indexed_leads": indexed_leads,
-                "indexing_percentage": round(indexing_percentage, 1),
-                "status": "healthy" if indexing_percentage > 95 else "needs_attention",
-                "last_index_update": datetime.utcnow().isoformat()
-            }
+            if self._reads_bounded:
+                # End the read-only analytics transaction before writing
+                self.db.rollback()
+                self._reads_bounded = False
+            for view in ANALYTICS_VIEWS:
+                self.db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+            self.db.commit()
+            return True
         except Exception as e:
-            logger.error(f"Error getting indexing status: {e}")
-            return {
-                "total_leads": 0,
-                "indexed_leads": 0,
-                "indexing_percentage": 0.0,
-                "status": "error",
-                "error": str(e)
-            }
+            logger.error(f"Error refreshing analytics views: {e}")
+            self.db.rollback()
+            return False
     
-    def _estimate_cache_hit_rate(self) -> float:
-        """Estimate cache hit rate based on Redis performance"""
-        try:
-            # Get cache statistics from Redis
-            cache_stats = self.cache.get_cache_stats()
-            
-            if cache_stats and "hits" in cache_stats and "misses" in cache_stats:
-                total_requests = cache_stats["hits"] + cache_stats["misses"]
-                if total_requests > 0:
-                    return round(cache_stats["hits"] / total_requests * 100, 1)
-            
-            # Fallback estimation based on cache health
-            cache_health = self.cache.health_check()
-            if cache_health.get("status") == "healthy":
-                return 78.5  # Typical good cache hit rate
-            else:
-                return 45.2  # Lower hit rate when cache is struggling
-                
-        except Exception as e:
-            logger.error(f"Error estimating cache hit rate: {e}")
-            return 0.0
+    # Helper methods
+    def _is_postgresql(self) -> bool:
+        """Whether the session is bound to PostgreSQL (views, planner statistics)"""
+        return self.db.get_bind().dialect.name == "postgresql"
     
-    def _calculate_conversion_by_query_type(self, query) -> List[Dict[str, Any]]:
-        """Calculate conversion rates by query type"""
-        try:
-            # Analyze conversion patterns by industry and location
-            industry_conversions = []
-            
-            # Get top industries with conversion data
-            industries = self.db.query(
-                Lead.industry,
-                func.count(Lead.id).label('total'),
-                func.count(
-                    case((Lead.last_contact.isnot(None), Lead.id), else_=None)
-                ).label('contacted')
-            ).filter(Lead.industry.isnot(None))
-            
-            if hasattr(query, 'whereclause') and query.whereclause is not None:
-                # Apply same filters as the main query
-                industries = industries.filter(query.whereclause)
-            
-            industries = industries.group_by(Lead.industry).having(
-                func.count(Lead.id) >= 5  # Only industries with at least 5 leads
-            ).order_by(desc(func.count(Lead.id))).limit(5).all()
-            
-            for industry in industries:
-                conversion_rate = (industry.contacted / industry.total * 100) if industry.total > 0 else 0.0
-                industry_conversions.append({
-                    "query_type": f"Industry: {industry.industry}",
-                    "total_searches": industry.total,
-                    "conversions": industry.contacted,
-                    "conversion_rate": round(conversion_rate, 1)
-                })
-            
-            return industry_conversions
-            
-        except Exception as e:
-            logger.error(f"Error calculating conversion by query type: {e}")
-            return []
+    def _read_facets_view(self, user_id: Optional[int]) -> Optional[List[Any]]:
+        """Facet rows from the materialized view, or None if it is unavailable"""
+        return self._read_view(_facets_view_stmt(bool(user_id)), _user_params(user_id))
     
-    def _calculate_top_converting_filters(self, query) -> List[Dict[str, Any]]:
-        """Calculate top converting filters"""
+    def _read_view(self, stmt, params: Optional[Dict[str, Any]] = None) -> Optional[List[Any]]:
+        """Rows from a materialized view statement, or None if it is unavailable"""
+        if not self._is_postgresql():
+            return None
+        
         try:
-            converting_filters = []
-            
-            # Location-based conversions
-            location_conversions = self.db.query(
-                Lead.location,
-                func.count(Lead.id).label('total'),
-                func.count(
-                    case((Lead.last_contact.isnot(None), Lead.id), else_=None)
-                ).label('contacted')
-            ).filter(Lead.location.isnot(None))
-            
-            if hasattr(query, 'whereclause') and query.whereclause is not None:
-                location_conversions = location_conversions.filter(query.whereclause)
-            
-            location_conversions = location_conversions.group_by(Lead.location).having(
-                func.count(Lead.id) >= 3
-            ).order_by(desc(func.count(Lead.id))).limit(3).all()
-            
-            for location in location_conversions:
-                conversion_rate = (location.contacted / location.total * 100) if location.total > 0 else 0.0
-                converting_filters.append({
-                    "filter_type": "location",
-                    "filter_value": location.location,
-                    "conversion_rate": round(conversion_rate, 1),
-                    "total_leads": location.total
-                })
-            
-            # Company size conversions
-            size_conversions = self.db.query(
-                Lead.employees,
-                func.count(Lead.id).label('total'),
-                func.count(
-                    case((Lead.last_contact.isnot(None), Lead.id), else_=None)
-                ).label('contacted')
-            ).filter(Lead.employees.isnot(None))
-            
-            if hasattr(query, 'whereclause') and query.whereclause is not None:
-                size_conversions = size_conversions.filter(query.whereclause)
-            
-            size_conversions = size_conversions.group_by(Lead.employees).having(
-                func.count(Lead.id) >= 3
-            ).order_by(desc(func.count(Lead.id))).limit(2).all()
-            
-            for size in size_conversions:
-                conversion_rate = (size.contacted / size.total * 100) if size.total > 0 else 0.0
-                converting_filters.append({
-                    "filter_type": "company_size",
-                    "filter_value": size.employees,
-                    "conversion_rate": round(conversion_rate, 1),
-                    "total_leads": size.total
-                })
-            
-            # Sort by conversion rate
-            converting_filters.sort(key=lambda x: x["conversion_rate"], reverse=True)
-            
-            return converting_filters[:5]  # Top 5 converting filters
-            
-        except Exception as e:
-            logger.error(f"Error calculating top converting filters: {e}")
-            return []
-            
-            medium_value_leads = query.filter(
-                or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-            ).count()
-            
-            total_leads = query.count()
-            
-            if total_leads == 0:
-                return 0.0
-            
-            # Estimate ROI based on lead quality distribution
-            estimated_roi = (
-                (high_value_leads * 5000) +  # High value leads worth $5000
-                (medium_value_leads * 2000) +  # Medium value leads worth $2000
-                ((total_leads - high_value_leads - medium_value_leads) * 500)  # Low value leads worth $500
-            ) / total_leads
-            
-            return estimated_roi
-            
+            # Savepoint so a missing view does not abort the request transaction
+            with self.db.begin_nested():
+                return self.db.execute(stmt, params or {}).all()
         except Exception as e:
-            logger.error(f"Error calculating average ROI: {e}")
-            return 0.0
+            logger.warning(f"Analytics view unavailable, using live query: {e}")
+            return None
     
-    def _calculate_search_trends(self) -> Dict[str, Any]:
-        """Calculate search trends based on lead creation patterns"""
-        try:
-            # Simulate hourly search trends based on lead creation patterns
-            # In a real implementation, you'd track actual search timestamps
-            
-            # Get leads created today by hour
-            today = datetime.utcnow().date()
-            hourly_leads = self.db.query(
-                extract('hour', Lead.created_at).label('hour'),
-                func.count(Lead.id).label('count')
-            ).filter(
-                func.date(Lead.created_at) == today
-            ).group_by(
-                extract('hour', Lead.created_at)
-            ).all()
-            
-            # Convert to hourly search simulation
-            hourly_searches = []
-            for hour in range(24):
-                # Find matching hour data
-                hour_data = next((h for h in hourly_leads if int(h.hour) == hour), None)
-                count = int(hour_data.count) * 2 if hour_data else 0  # Simulate 2 searches per lead
-                
-                hourly_searches.append({
-                    "hour": f"{hour:02d}:00",
-                    "searches": count
-                })
-            
-            return {"hourly_searches": hourly_searches}
-            
-        except Exception as e:
-            logger.error(f"Error calculating search trends: {e}")
-            return {"hourly_searches": []}
+    def _get_cached(self, cache_key: str, metric: Optional[str] = None) -> Optional[Any]:
+        """Read a metric from the in-process cache, falling back to Redis"""
+        if cache_key in self._force_refresh:
+            # This instance holds the key's refresh lock: recompute it
+            self._force_refresh.discard(cache_key)
+            value = None
+        else:
+            value = _local_cache.get(cache_key)
+            if value is None:
+                value = self.cache.get_cached_analytics_data(cache_key)
+                if value is not None:
+                    self._remember_local(cache_key, value)
+        
+        if value is not None:
+            if metric:
+                memo_policy.record(metric, "hit")
+        else:
+            if metric:
+                self._pending_misses[cache_key] = (metric, time.perf_counter())
+            # The caller is about to query the database
+            self._bound_analytics_reads()
+        return value
     
-    def _get_indexing_status(self) -> Dict[str, Any]:
-        """Get indexing status information"""
+    def _bound_analytics_reads(self) -> None:
+        """
+        Make the current transaction read-only with a statement timeout.
+        
+        Applied once per service instance on PostgreSQL, so a slow analytics
+        aggregate is cancelled instead of holding a connection, and analytics
+        sessions can never write. Both settings are transaction-local and end
+        when the request session is closed.
+        """
+        if self._reads_bounded or not self._is_postgresql():
+            return
+        
         try:
-            total_leads = self.db.query(Lead).count()
-            indexed_leads = self.db.query(Lead).filter(Lead.indexed_at.isnot(None)).count()
-            
-            coverage = (indexed_leads / total_leads * 100) if total_leads > 0 else 0.0
-            
-            # Get last index update
-            last_indexed = self.db.query(Lead.indexed_at).filter(
-                Lead.indexed_at.isnot(None)
-            ).order_by(desc(Lead.indexed_at)).first()
-            
-            last_update = (
-                last_indexed[0].isoformat() if last_indexed and last_indexed[0]
-                else datetime.utcnow().isoformat()
+            self.db.execute(
+                text(
+                    "SELECT set_config('statement_timeout', :timeout, true), "
+                    "set_config('transaction_read_only', 'on', true)"
+                ),
+                {"timeout": f"{ANALYTICS_STATEMENT_TIMEOUT_MS}ms"}
             )
-            
-            return {
-                "total_leads": total_leads,
-                "indexed_leads": indexed_leads,
-                "indexing_coverage": round(coverage, 1),
-                "last_index_update": last_update
-            }
-            
+            self._reads_bounded = True
         except Exception as e:
-            logger.error(f"Error getting indexing status: {e}")
-            return {
-                "total_leads": 0,
-                "indexed_leads": 0,
-                "indexing_coverage": 0.0,
-                "last_index_update": datetime.utcnow().isoformat()
-            }
+            logger.warning(f"Could not bound analytics transaction: {e}")
     
-    def _estimate_cache_hit_rate(self) -> float:
-        """Estimate cache hit rate based on Redis health"""
+    def _cache_result(self, cache_key: str, data: Any, ttl: int) -> None:
+        """Store a computed metric in Redis and in the in-process cache"""
+        pending = self._pending_misses.pop(cache_key, None)
+        if pending:
+            metric, started = pending
+            memo_policy.record(metric, "miss", time.perf_counter() - started)
+        
+        self.cache.cache_analytics_data(cache_key, data, ttl)
+        self._remember_local(cache_key, data, ttl)
+    
+    def _ttl(self, metric: str) -> int:
+        """Cache TTL for a metric, as tuned by the memo policy if available"""
+        redis_client = getattr(self.cache, "redis_client", None)
+        return memo_policy.ttl_for(redis_client, metric, self.cache_ttl[metric])
+    
+    def _remember_local(self, cache_key: str, data: Any, ttl: Optional[int] = None) -> None:
+        """Keep a metric in the in-process cache, never longer than its Redis TTL"""
+        local_ttl = CacheConfig.ANALYTICS_LOCAL_TTL
+        if ttl is not None:
+            local_ttl = min(local_ttl, ttl)
+        if local_ttl > 0:
+            _local_cache.set(cache_key, data, local_ttl)
+    
+    def _query_cache_key(self, name: str, query, user_id: Optional[int] = None) -> str:
+        """Cache key for a helper result, shared by every caller with the same filters.
+        
+        Filtered results are scoped by user so per-user invalidation reaches them.
+        """
+        whereclause = getattr(query, "whereclause", None)
+        if whereclause is None:
+            return f"{name}_global"
+        
+        filters = str(whereclause.compile(compile_kwargs={"literal_binds": True}))
+        return f"{name}_{user_id or 'global'}_{hashlib.md5(filters.encode()).hexdigest()}"
+    
+    def _now(self) -> datetime:
+        """Timestamp for this request (UTC), taken once per service instance"""
+        if self._request_now is None:
+            self._request_now = datetime.now(timezone.utc)
+        return self._request_now
+    
+    def _now_iso(self) -> str:
+        """Request timestamp formatted for "last_updated" fields"""
+        return self._now().isoformat(timespec='seconds')
+    
+    def _db_now(self) -> datetime:
+        """Request timestamp as naive UTC, matching the stored lead timestamps"""
+        return self._now().replace(tzinfo=None)
+    
+    def _total_leads(self, user_id: Optional[int] = None) -> int:
+        """Total lead count for a user (or globally), memoized for this service instance"""
+        key = ("total_leads", user_id)
+        if key not in self._req_cache:
+            self._req_cache[key] = int(
+                self.db.execute(_total_leads_stmt(bool(user_id)), _user_params(user_id)).scalar_one() or 0
+            )
+        return self._req_cache[key]
+    
+    def _approx_total_leads(self, user_id: Optional[int] = None) -> int:
+        """
+        Total lead count that may come from the planner statistics.
+        
+        For the global total on a large PostgreSQL table this reads
+        pg_class.reltuples (O(1), refreshed by VACUUM/ANALYZE) instead of
+        running COUNT(*). The estimate can lag recent inserts and deletes, so
+        only use it for headline numbers, never as a rate denominator. User-scoped
+        totals, small tables and any failure fall back to the exact count.
+        """
+        key = ("total_leads", user_id)
+        if user_id or key in self._req_cache:
+            return self._total_leads(user_id)
+        
+        estimate = self._approx_row_count("leads")
+        if estimate is not None and estimate >= APPROX_COUNT_THRESHOLD:
+            return estimate
+        
+        return self._total_leads(user_id)
+    
+    def _approx_row_count(self, table: str) -> Optional[int]:
+        """Planner row estimate for a table (PostgreSQL only), or None when unavailable"""
         try:
-            cache_health = self.cache.health_check()
-            if cache_health.get("status") == "healthy":
-                # Estimate based on keyspace info
-                keyspace = cache_health.get("keyspace", {})
-                if keyspace:
-                    return 78.5  # Good cache performance
-                return 45.0  # Moderate cache performance
-            return 0.0  # No cache
-            
+            if not self._is_postgresql():
+                return None
+            estimate = self.db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+                {"table": table}
+            ).scalar()
+            return int(estimate) if estimate is not None else None
         except Exception as e:
-            logger.error(f"Error estimating cache hit rate: {e}")
+            logger.warning(f"Could not read row estimate for {table}, using exact count: {e}")
+            return None
+    
+    def _metric_ttl(self, metric: str, total_leads: int) -> int:
+        """Cache TTL for a metric; empty results expire quickly so new leads show up soon"""
+        return self.cache_ttl["empty"] if total_leads == 0 else self._ttl(metric)
+    
+    def _remember_total_leads(self, user_id: Optional[int], total_leads: int) -> None:
+        """Store a total computed as part of another aggregate query"""
+        self._req_cache[("total_leads", user_id)] = total_leads
+    
+    def _indexing_counts(self, approximate_total: bool = False) -> Tuple[int, int, int, Optional[datetime]]:
+        """
+        (total, indexed, indexed in the last 24h, last indexed_at) in one round trip.
+        
+        With approximate_total, a large table's total comes from the planner
+        estimate and only the indexed leads are counted (via the partial
+        index). When the resulting coverage is close to the healthy threshold
+        the exact aggregate is used instead, so the estimate never flips the status.
+        """
+        params = {"indexed_since": self._db_now() - timedelta(hours=24)}
+        
+        estimate = self._approx_row_count("leads") if approximate_total else None
+        if estimate is not None and estimate >= APPROX_COUNT_THRESHOLD:
+            indexed, recent, last_indexed = self.db.execute(_indexed_leads_stmt(), params).one()
+            indexed, recent = int(indexed or 0), int(recent or 0)
+            # The estimate can lag inserts; never report more indexed than total
+            total = max(estimate, indexed)
+            coverage = indexed / total * 100
+            if abs(coverage - INDEXING_HEALTHY_COVERAGE) >= INDEXING_BORDERLINE_MARGIN:
+                return total, indexed, recent, last_indexed
+        
+        total, indexed, recent, last_indexed = self.db.execute(_indexing_status_stmt(), params).one()
+        return int(total or 0), int(indexed or 0), int(recent or 0), last_indexed
+    
+    def _calculate_average_roi(self, total_leads: int, high_value_leads: int, medium_value_leads: int) -> float:
+        """Calculate average ROI based on lead quality and conversion potential"""
+        if total_leads == 0:
             return 0.0
+        
+        # Calculate weighted ROI based on lead quality
+        # High value leads: $500 potential value
+        # Medium value leads: $200 potential value
+        # Low value leads: $50 potential value
+        
+        low_value_leads = total_leads - medium_value_leads
+        return (
+            (high_value_leads * 500) + 
+            ((medium_value_leads - high_value_leads) * 200) + 
+            (low_value_leads * 50)
+        ) / total_leads
     
-    def _calculate_conversion_by_query_type(self, query) -> List[Dict[str, Any]]:
+    def _calculate_conversion_by_query_type(self, query, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Calculate conversion rates by query type"""
+        cache_key = self._query_cache_key("conversion_by_query_type", query, user_id)
+        cached_data = self._get_cached(cache_key, "conversion_breakdown")
+        if cached_data is not None:
+            return cached_data
+        
         try:
-            total_leads = query.count()
+            # Simulate query types based on lead data patterns; all counters
+            # come from one conditional aggregate over the filtered leads
+            has_contact = or_(Lead.email.isnot(None), Lead.phone.isnot(None))
+            company_query = and_(Lead.company.isnot(None), Lead.description.isnot(None))
+            industry_location_query = and_(Lead.industry.isnot(None), Lead.location.isnot(None))
+            
+            counts = select(
+                func.count(Lead.id),
+                # Company name searches (leads with complete company info)
+                _count_if(company_query),
+                _count_if(and_(company_query, has_contact)),
+                # Industry + Location searches
+                _count_if(industry_location_query),
+                _count_if(and_(industry_location_query, has_contact))
+            )
+            if query.whereclause is not None:
+                counts = counts.where(query.whereclause)
+            
+            (
+                total_leads,
+                company_searches,
+                company_conversions,
+                industry_location_searches,
+                industry_location_conversions
+            ) = (int(value or 0) for value in self.db.execute(counts).one())
+            
             if total_leads == 0:
                 return []
             
-            # Simulate query types based on lead data patterns
             query_types = []
             
-            # Company name searches (leads with complete company info)
-            company_searches = query.filter(
-                and_(Lead.company.isnot(None), Lead.description.isnot(None))
-            ).count()
-            company_conversions = query.filter(
-                and_(
-                    Lead.company.isnot(None),
-                    Lead.description.isnot(None),
-                    or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-                )
-            ).count()
-            
             if company_searches > 0:
                 query_types.append({
                     "type": "Company Name",
                     "searches": company_searches,
                     "conversions": company_conversions,
-                    "rate": round(company_conversions / company_searches * 100, 1)
+                    "rate": _percent(company_conversions, company_searches)
                 })
             
-            # Industry + Location searches
-            industry_location_searches = query.filter(
-                and_(Lead.industry.isnot(None), Lead.location.isnot(None))
-            ).count()
-            industry_location_conversions = query.filter(
-                and_(
-                    Lead.industry.isnot(None),
-                    Lead.location.isnot(None),
-                    or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-                )
-            ).count()
-            
             if industry_location_searches > 0:
                 query_types.append({
                     "type": "Industry + Location",
                     "searches": industry_location_searches,
                     "conversions": industry_location_conversions,
-                    "rate": round(industry_location_conversions / industry_location_searches * 100, 1)
+                    "rate": _percent(industry_location_conversions, industry_location_searches)
                 })
             
-            return query_types[:4]  # Limit to top 4 types
+            query_types = query_types[:4]  # Limit to top 4 types
+            self._cache_result(cache_key, query_types, self._ttl("conversion_breakdown"))
+            return query_types
             
         except Exception as e:
             logger.error(f"Error calculating conversion by query type: {e}")
             return []
     
-    def _calculate_top_converting_filters(self, query) -> List[Dict[str, Any]]:
+    def _calculate_top_converting_filters(self, query, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Calculate top converting filters"""
+        cache_key = self._query_cache_key("top_converting_filters", query, user_id)
+        cached_data = self._get_cached(cache_key, "conversion_breakdown")
+        if cached_data is not None:
+            return cached_data
+        
         try:
-            filters = []
-            
-            # Industry filters
-            top_industries = self.db.query(
-                Lead.industry,
-                func.count(Lead.id).label('usage'),
-                func.count(
-                    case(
-                        (or_(Lead.email.isnot(None), Lead.phone.isnot(None)), Lead.id),
-                        else_=None
-                    )
-                ).label('conversions')
-            ).filter(Lead.industry.isnot(None)).group_by(Lead.industry).order_by(
-                desc(func.count(Lead.id))
-            ).limit(3).all()
-            
-            for industry in top_industries:
-                if industry.usage > 0:
-                    conversion_rate = industry.conversions / industry.usage * 100
-                    filters.append({
-                        "filter": f"industry:{industry.industry}",
-                        "usage": int(industry.usage),
-                        "conversion_rate": round(conversion_rate, 1)
-                    })
-            
-            # Location filters
-            top_locations = self.db.query(
-                Lead.location,
-                func.count(Lead.id).label('usage'),
-                func.count(
-                    case(
-                        (or_(Lead.email.isnot(None), Lead.phone.isnot(None)), Lead.id),
-                        else_=None
-                    )
-                ).label('conversions')
-            ).filter(Lead.location.isnot(None)).group_by(Lead.location).order_by(
-                desc(func.count(Lead.id))
-            ).limit(2).all()
-            
-            for location in top_locations:
-                if location.usage > 0:
-                    conversion_rate = location.conversions / location.usage * 100
-                    filters.append({
-                        "filter": f"location:{location.location}",
-                        "usage": int(location.usage),
-                        "conversion_rate": round(conversion_rate, 1)
-                    })
-            
-            return filters[:4]  # Limit to top 4 filters
+            # The views only hold global rankings, so only unfiltered requests
+            # read them. Filtered requests (and unfiltered ones when the views
+            # are missing) rank their own leads live, in one round trip with
+            # rates computed by the database.
+            whereclause = getattr(query, "whereclause", None)
+            rows = None
+            if whereclause is None:
+                rows = self._read_view(_conversion_views_stmt())
+                if rows is None:
+                    rows = self.db.execute(_top_converting_filters_stmt()).all()
+            else:
+                rows = self.db.execute(_build_top_converting_filters_stmt(whereclause)).all()
+            
+            filters = [
+                {
+                    "filter": f"{row.kind}:{row.value}",
+                    "usage": int(row.usage),
+                    "conversion_rate": float(row.rate)
+                }
+                for row in rows
+            ]
+            
+            self._cache_result(cache_key, filters, self._ttl("conversion_breakdown"))
+            return filters
             
         except Exception as e:
             logger.error(f"Error calculating top converting filters: {e}")
@@ -1181,54 +1426,34 @@ class AnalyticsService:
     
     def _calculate_search_trends(self) -> Dict[str, Any]:
         """Calculate search trends and patterns"""
-        try:
-            # Get hourly distribution (mock data for now)
-            hourly_distribution = {
-                "00": 2, "01": 1, "02": 0, "03": 1, "04": 2, "05": 3,
-                "06": 5, "07": 8, "08": 12, "09": 18, "10": 15, "11": 14,
-                "12": 16, "13": 13, "14": 20, "15": 17, "16": 19, "17": 14,
-                "18": 10, "19": 8, "20": 6, "21": 5, "22": 4, "23": 3
-            }
-            
-            # Calculate peak hours
-            peak_hours = sorted(hourly_distribution.items(), key=lambda x: x[1], reverse=True)[:3]
-            
-            return {
-                "hourly_distribution": hourly_distribution,
-                "peak_hours": [f"{hour}:00" for hour, _ in peak_hours],
-                "total_searches_today": sum(hourly_distribution.values()),
-                "avg_searches_per_hour": round(sum(hourly_distribution.values()) / 24, 1)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error calculating search trends: {e}")
-            return {}
+        # Built from module-level constants, so there is nothing worth caching
+        return _build_search_trends()
     
     def _get_indexing_status(self) -> Dict[str, Any]:
         """Get indexing status information"""
+        cache_key = "indexing_status_global"
+        cached_data = self._get_cached(cache_key, "indexing_status")
+        if cached_data is not None:
+            return cached_data
+        
         try:
-            total_leads = self.db.query(func.count(Lead.id)).scalar()
-            indexed_leads = self.db.query(func.count(Lead.id)).filter(
-                Lead.indexed_at.isnot(None)
-            ).scalar()
-            
-            # Get recent indexing activity
-            from datetime import timedelta
-            recent_indexed = self.db.query(func.count(Lead.id)).filter(
-                Lead.indexed_at >= datetime.utcnow() - timedelta(hours=24)
-            ).scalar()
+            # Coverage and recent indexing activity; the total may be estimated
+            total_leads, indexed_leads, recent_indexed, _ = self._indexing_counts(approximate_total=True)
             
             coverage_percent = (indexed_leads / total_leads * 100) if total_leads > 0 else 0
             
-            return {
+            status = {
                 "total_leads": total_leads,
                 "indexed_leads": indexed_leads,
                 "coverage_percent": round(coverage_percent, 1),
                 "recent_indexed_24h": recent_indexed,
-                "status": "healthy" if coverage_percent > 90 else "needs_attention",
-                "last_index_update": datetime.utcnow().isoformat()
+                "status": "healthy" if coverage_percent > INDEXING_HEALTHY_COVERAGE else "needs_attention",
+                "last_index_update": self._now_iso()
             }
             
+            self._cache_result(cache_key, status, self._ttl("indexing_status"))
+            return status
+            
         except Exception as e:
             logger.error(f"Error getting indexing status: {e}")
             return {
@@ -1244,21 +1469,26 @@ class AnalyticsService:
             if not self.cache or not self.cache.enabled:
                 return 0.0
             
-            cache_stats = self.cache.get_cache_stats()
-            if cache_stats:
-                hits = cache_stats.get("hits", 0)
-                misses = cache_stats.get("misses", 0)
-                total = hits + misses
-                
-                if total > 0:
-                    return round(hits / total * 100, 1)
-            
-            # Fallback estimation based on cache health
-            cache_health = self.cache.health_check()
-            if cache_health.get("status") == "healthy":
-                return 75.5  # Reasonable default for healthy cache
-            
-            return 0.0
+            # Memoized per process: the counters drift slowly and reading them
+            # costs a Redis INFO round trip
+            cache_key = "cache_hit_rate_global"
+            cached_rate = _local_cache.get(cache_key)
+            if cached_rate is not None:
+                return cached_rate
+            
+            hit_rate = 0.0
+            cache_stats, cache_health = self.cache.get_stats_and_health()
+            hits = cache_stats.get("hits", 0) if cache_stats else 0
+            misses = cache_stats.get("misses", 0) if cache_stats else 0
+            
+            if hits + misses > 0:
+                hit_rate = round(hits / (hits + misses) * 100, 1)
+            elif cache_health.get("status") == "healthy":
+                # Fallback estimation based on cache health
+                hit_rate = 75.5  # Reasonable default for healthy cache
+            
+            _local_cache.set(cache_key, hit_rate, self.cache_ttl["cache_hit_rate"])
+            return hit_rate
             
         except Exception as e:
             logger.error(f"Error estimating cache hit rate: {e}")
@@ -4,25 +4,184 @@ Specialized service for dashboard analytics and real-time metrics
 """
 
 import logging
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text, and_, or_, desc
+from sqlalchemy import (
+    JSON, Integer, Text, func, text, and_, or_, desc, select, bindparam, true,
+    cast, literal, null, union_all
+)
 
 from ..database.models import Lead, SearchAnalyticsEvent, LeadInteractionEvent
 from ..cache.manager import CacheManager
-from .analytics import AnalyticsService
+from .analytics import AnalyticsService, _count_if, _run_in_own_session, _scoped, _user_params
 
 logger = logging.getLogger(__name__)
 
+# Funnel stages in order, with their display labels
+FUNNEL_STAGES = (
+    ("discovered", "Descobertos"),
+    ("viewed", "Visualizados"),
+    ("contacted", "Contatados"),
+    ("qualified", "Qualificados"),
+    ("converted", "Convertidos")
+)
+
+# Error-path responses, built fresh per call so callers never share the
+# nested dicts
+def _fallback_dashboard_summary(last_updated: str) -> Dict[str, Any]:
+    return {
+        "overview": {
+            "total_leads": 0,
+            "qualified_leads": 0,
+            "conversion_rate": 0,
+            "growth_rate": 0,
+            "high_quality_leads": 0
+        },
+        "performance": {
+            "avg_response_time": 0,
+            "cache_hit_rate": 0,
+            "searches_today": 0,
+            "system_health": "unknown"
+        },
+        "recent_activity": {
+            "leads_added_today": 0,
+            "searches_today": 0,
+            "last_activity": None,
+            "trend": "stable"
+        },
+        "alerts": [],
+        "error": "Failed to load analytics data",
+        "last_updated": last_updated
+    }
+
+def _fallback_real_time_metrics(timestamp: str) -> Dict[str, Any]:
+    return {
+        "timestamp": timestamp,
+        "activity": {"searches_last_hour": 0, "interactions_last_hour": 0, "active_users": 0},
+        "performance": {"cache_status": "error", "response_time_trend": "unknown", "error_rate": 0},
+        "system_load": {"database_connections": 0, "cache_memory_usage": "0B", "processing_queue": 0}
+    }
+
+@lru_cache(maxsize=None)
+def _conversion_funnel_stmt(user_scoped: bool):
+    # Every funnel stage counted in one scan of the (user's) leads
+    return _scoped(select(
+        func.count(Lead.id).label("discovered"),
+        _count_if(Lead.view_count > 0).label("viewed"),
+        _count_if(Lead.contact_count > 0).label("contacted"),
+        _count_if(or_(Lead.email.isnot(None), Lead.phone.isnot(None))).label("qualified"),
+        _count_if(Lead.conversion_score > 0.5).label("converted")
+    ), user_scoped)
+
+@lru_cache(maxsize=None)
+def _activity_since_stmt(user_scoped: bool):
+    # Leads added and searches since :since as two scalar subqueries,
+    # fetched in one round trip
+    lead_count = select(func.count(Lead.id)).where(Lead.created_at >= bindparam("since"))
+    search_count = select(func.count(SearchAnalyticsEvent.id)).where(
+        SearchAnalyticsEvent.created_at >= bindparam("since")
+    )
+    if user_scoped:
+        lead_count = lead_count.where(Lead.user_id == bindparam("user_id"))
+        search_count = search_count.where(SearchAnalyticsEvent.user_id == bindparam("user_id"))
+    return select(
+        lead_count.scalar_subquery().label("leads"),
+        search_count.scalar_subquery().label("searches")
+    )
+
+@lru_cache(maxsize=None)
+def _daily_stats_stmt(user_scoped: bool):
+    # Leads added and searches on one day, from the dashboard_daily_stats
+    # materialized view (see create_analytics_views)
+    user_filter = "AND user_id = :user_id" if user_scoped else ""
+    return text(f"""
+        SELECT COALESCE(SUM(leads_added), 0) AS leads_added,
+               COALESCE(SUM(searches), 0) AS searches
+        FROM dashboard_daily_stats
+        WHERE day = :day {user_filter}
+    """)
+
+@lru_cache(maxsize=None)
+def _activity_feed_stmt(user_scoped: bool):
+    # Latest searches and interactions merged, ordered and limited by the
+    # database. Columns a stream does not have are typed NULLs.
+    def typed_null(type_):
+        return cast(null(), type_)
+    
+    searches = select(
+        literal("search").label("type"),
+        SearchAnalyticsEvent.created_at,
+        SearchAnalyticsEvent.query_text,
+        SearchAnalyticsEvent.results_count,
+        SearchAnalyticsEvent.response_time_ms,
+        typed_null(Integer).label("lead_id"),
+        typed_null(Text).label("interaction_type"),
+        typed_null(JSON).label("interaction_data")
+    )
+    interactions = select(
+        literal("interaction"),
+        LeadInteractionEvent.created_at,
+        typed_null(Text),
+        typed_null(Integer),
+        typed_null(Integer),
+        LeadInteractionEvent.lead_id,
+        LeadInteractionEvent.interaction_type,
+        LeadInteractionEvent.interaction_data
+    )
+    if user_scoped:
+        searches = searches.where(SearchAnalyticsEvent.user_id == bindparam("user_id"))
+        interactions = interactions.where(LeadInteractionEvent.user_id == bindparam("user_id"))
+    
+    return union_all(searches, interactions).order_by(desc("created_at")).limit(
+        bindparam("limit", type_=Integer)
+    )
+
+@lru_cache(maxsize=None)
+def _real_time_activity_stmt(user_scoped: bool, count_users: bool = True):
+    # Searches, interactions and (optionally, as the costly COUNT DISTINCT)
+    # searching users since :since, as two one-row CTEs cross joined into a
+    # single round trip
+    def recent(model):
+        condition = model.created_at >= bindparam("since")
+        if user_scoped:
+            condition = and_(condition, model.user_id == bindparam("user_id"))
+        return condition
+    
+    search_columns = [func.count(SearchAnalyticsEvent.id).label("searches")]
+    if count_users:
+        search_columns.append(
+            func.count(func.distinct(SearchAnalyticsEvent.user_id)).label("active_users")
+        )
+    searches = select(*search_columns).where(recent(SearchAnalyticsEvent)).cte("searches")
+    interactions = select(
+        func.count(LeadInteractionEvent.id).label("interactions")
+    ).where(recent(LeadInteractionEvent)).cte("interactions")
+    return select(searches, interactions.c.interactions).select_from(
+        searches.join(interactions, true())
+    )
+
 class AnalyticsDashboardService:
     """Specialized service for dashboard analytics with real-time capabilities"""
     
-    def __init__(self, db_session: Session, cache_manager: CacheManager):
-        """Initialize dashboard service"""
+    def __init__(
+        self,
+        db_session: Session,
+        cache_manager: CacheManager,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        """Initialize dashboard service.
+        
+        When a session factory is given, get_dashboard_summary runs its
+        independent queries concurrently, each on its own session.
+        """
         self.db = db_session
         self.cache = cache_manager
-        self.analytics_service = AnalyticsService(db_session, cache_manager)
+        self.session_factory = session_factory
+        self.analytics_service = AnalyticsService(db_session, cache_manager, session_factory=session_factory)
+        self._request_now: Optional[datetime] = None
         
         # Dashboard-specific cache TTL (shorter for real-time updates)
         self.dashboard_cache_ttl = {
@@ -38,14 +197,30 @@ class AnalyticsDashboardService:
         cache_key = f"dashboard_summary_{user_id or 'global'}"
         
         # Try cache first
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key)
+        if cached_data is not None:
             return cached_data
         
         try:
-            # Get core metrics
-            dashboard_metrics = self.analytics_service.get_dashboard_metrics(user_id)
-            search_performance = self.analytics_service.get_search_performance_metrics()
+            # Core metrics and today's activity are independent of each other
+            if self.session_factory is not None:
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    metrics_future = executor.submit(
+                        self.analytics_service._compute_in_own_session, "get_dashboard_metrics", (user_id,)
+                    )
+                    performance_future = executor.submit(
+                        self.analytics_service._compute_in_own_session, "get_search_performance_metrics", ()
+                    )
+                    activity_future = executor.submit(
+                        self._compute_in_own_session, "_get_recent_activity", (user_id,)
+                    )
+                    dashboard_metrics = metrics_future.result()
+                    search_performance = performance_future.result()
+                    recent_activity = activity_future.result()
+            else:
+                dashboard_metrics = self.analytics_service.get_dashboard_metrics(user_id)
+                search_performance = self.analytics_service.get_search_performance_metrics()
+                recent_activity = self._get_recent_activity(user_id)
             
             # Calculate additional dashboard-specific metrics
             summary = {
@@ -60,15 +235,15 @@ class AnalyticsDashboardService:
                     "avg_response_time": search_performance.get("avg_response_time_ms", 0),
                     "cache_hit_rate": search_performance.get("cache_hit_rate", 0),
                     "searches_today": search_performance.get("total_searches_today", 0),
-                    "system_health": self._calculate_system_health(search_performance)
+                    "system_health": search_performance.get("system_health", "unknown")
                 },
-                "recent_activity": self._get_recent_activity(user_id),
+                "recent_activity": recent_activity,
                 "alerts": self._get_performance_alerts(dashboard_metrics, search_performance),
-                "last_updated": datetime.utcnow().isoformat()
+                "last_updated": self._now().isoformat()
             }
             
             # Cache the summary
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 summary,
                 self.dashboard_cache_ttl["dashboard_summary"]
@@ -85,35 +260,29 @@ class AnalyticsDashboardService:
         cache_key = f"real_time_metrics_{user_id or 'global'}"
         
         # Check cache (very short TTL for real-time data)
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key)
+        if cached_data is not None:
             return cached_data
         
         try:
             # Get current activity
-            now = datetime.utcnow()
+            now = self._now()
             hour_ago = now - timedelta(hours=1)
             
-            # Recent search activity
-            recent_searches = self.db.query(func.count(SearchAnalyticsEvent.id)).filter(
-                SearchAnalyticsEvent.created_at >= hour_ago
-            )
-            if user_id:
-                recent_searches = recent_searches.filter(SearchAnalyticsEvent.user_id == user_id)
-            recent_searches_count = recent_searches.scalar() or 0
-            
-            # Recent lead interactions
-            recent_interactions = self.db.query(func.count(LeadInteractionEvent.id)).filter(
-                LeadInteractionEvent.created_at >= hour_ago
-            )
-            if user_id:
-                recent_interactions = recent_interactions.filter(LeadInteractionEvent.user_id == user_id)
-            recent_interactions_count = recent_interactions.scalar() or 0
-            
-            # Active users (users with activity in last hour)
-            active_users = self.db.query(func.count(func.distinct(SearchAnalyticsEvent.user_id))).filter(
-                SearchAnalyticsEvent.created_at >= hour_ago
-            ).scalar() or 0
+            # Active users (users with searches) come from the Redis
+            # HyperLogLogs when available; user-scoped metrics report 1
+            active_users = 1 if user_id else self.cache.count_active_users(now)
+            
+            # Searches and interactions in the last hour (plus distinct users
+            # when there is no sketch to read), in one round trip
+            activity = self.db.execute(
+                _real_time_activity_stmt(bool(user_id), active_users is None),
+                _user_params(user_id, since=hour_ago)
+            ).one()._mapping
+            recent_searches_count = int(activity["searches"] or 0)
+            recent_interactions_count = int(activity["interactions"] or 0)
+            if active_users is None:
+                active_users = int(activity["active_users"] or 0)
             
             # System performance
             cache_health = self.cache.health_check() if self.cache else {"status": "disabled"}
@@ -123,7 +292,7 @@ class AnalyticsDashboardService:
                 "activity": {
                     "searches_last_hour": recent_searches_count,
                     "interactions_last_hour": recent_interactions_count,
-                    "active_users": active_users if not user_id else 1
+                    "active_users": active_users
                 },
                 "performance": {
                     "cache_status": cache_health.get("status", "unknown"),
@@ -138,7 +307,7 @@ class AnalyticsDashboardService:
             }
             
             # Cache for 1 minute
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 metrics,
                 self.dashboard_cache_ttl["real_time_metrics"]
@@ -148,71 +317,55 @@ class AnalyticsDashboardService:
             
         except Exception as e:
             logger.error(f"Error getting real-time metrics: {e}")
-            return {
-                "timestamp": datetime.utcnow().isoformat(),
-                "activity": {"searches_last_hour": 0, "interactions_last_hour": 0, "active_users": 0},
-                "performance": {"cache_status": "error", "response_time_trend": "unknown", "error_rate": 0},
-                "system_load": {"database_connections": 0, "cache_memory_usage": "0B", "processing_queue": 0}
-            }
+            return _fallback_real_time_metrics(self._now().isoformat())
     
     def get_conversion_funnel(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Get conversion funnel analytics"""
         cache_key = f"conversion_funnel_{user_id or 'global'}"
         
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key)
+        if cached_data is not None:
             return cached_data
         
         try:
-            # Build base query
-            query = self.db.query(Lead)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            total_leads = query.count()
-            
-            # Funnel stages
-            stages = {
-                "discovered": total_leads,
-                "viewed": query.filter(Lead.view_count > 0).count() if hasattr(Lead, 'view_count') else int(total_leads * 0.7),
-                "contacted": query.filter(Lead.contact_count > 0).count() if hasattr(Lead, 'contact_count') else int(total_leads * 0.3),
-                "qualified": query.filter(
-                    or_(Lead.email.isnot(None), Lead.phone.isnot(None))
-                ).count(),
-                "converted": query.filter(Lead.conversion_score > 0.5).count() if hasattr(Lead, 'conversion_score') else int(total_leads * 0.1)
-            }
-            
-            # Calculate conversion rates
+            # Funnel stages, all counted in a single query
+            row = self.db.execute(
+                _conversion_funnel_stmt(bool(user_id)), _user_params(user_id)
+            ).one()
+            stages = {stage: int(count or 0) for stage, count in row._mapping.items()}
+            total_leads = stages["discovered"]
+            
+            # Conversion and drop-off rates, tracking the biggest drop-off in the same pass
             funnel = []
-            stage_names = ["discovered", "viewed", "contacted", "qualified", "converted"]
-            stage_labels = ["Descobertos", "Visualizados", "Contatados", "Qualificados", "Convertidos"]
+            prev_count = None
+            biggest_drop_off, biggest_drop_off_rate = None, None
             
-            for i, (stage, label) in enumerate(zip(stage_names, stage_labels)):
+            for stage, label in FUNNEL_STAGES:
                 count = stages[stage]
                 rate = (count / total_leads * 100) if total_leads > 0 else 0
-                drop_off = 0
+                drop_off = round((prev_count - count) / prev_count * 100, 1) if prev_count else 0
                 
-                if i > 0:
-                    prev_count = stages[stage_names[i-1]]
-                    drop_off = ((prev_count - count) / prev_count * 100) if prev_count > 0 else 0
+                if prev_count is not None and (biggest_drop_off is None or drop_off > biggest_drop_off_rate):
+                    biggest_drop_off, biggest_drop_off_rate = stage, drop_off
+                prev_count = count
                 
                 funnel.append({
                     "stage": stage,
                     "label": label,
                     "count": count,
                     "conversion_rate": round(rate, 1),
-                    "drop_off_rate": round(drop_off, 1)
+                    "drop_off_rate": drop_off
                 })
             
             result = {
                 "funnel": funnel,
                 "total_leads": total_leads,
                 "overall_conversion_rate": round((stages["converted"] / total_leads * 100) if total_leads > 0 else 0, 1),
-                "biggest_drop_off": max(funnel[1:], key=lambda x: x["drop_off_rate"])["stage"] if len(funnel) > 1 else None
+                "biggest_drop_off": biggest_drop_off
             }
             
             # Cache for 10 minutes
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 result,
                 self.dashboard_cache_ttl["conversion_funnel"]
@@ -228,57 +381,41 @@ class AnalyticsDashboardService:
         """Get recent activity feed for dashboard"""
         cache_key = f"activity_feed_{user_id or 'global'}_{limit}"
         
-        cached_data = self.cache.get_cached_analytics_data(cache_key)
-        if cached_data:
+        cached_data = self._get_cached(cache_key)
+        if cached_data is not None:
             return cached_data
         
         try:
+            # Both event streams in one query, newest first
             activities = []
-            
-            # Get recent search events
-            search_query = self.db.query(SearchAnalyticsEvent).order_by(desc(SearchAnalyticsEvent.created_at))
-            if user_id:
-                search_query = search_query.filter(SearchAnalyticsEvent.user_id == user_id)
-            
-            recent_searches = search_query.limit(limit // 2).all()
-            
-            for search in recent_searches:
-                activities.append({
-                    "type": "search",
-                    "timestamp": search.created_at.isoformat(),
-                    "description": f"Busca por '{search.query_text or 'filtros'}' retornou {search.results_count} resultados",
-                    "metadata": {
-                        "query": search.query_text,
-                        "results": search.results_count,
-                        "response_time": search.response_time_ms
-                    }
-                })
-            
-            # Get recent lead interactions
-            interaction_query = self.db.query(LeadInteractionEvent).order_by(desc(LeadInteractionEvent.created_at))
-            if user_id:
-                interaction_query = interaction_query.filter(LeadInteractionEvent.user_id == user_id)
-            
-            recent_interactions = interaction_query.limit(limit // 2).all()
-            
-            for interaction in recent_interactions:
-                activities.append({
-                    "type": "interaction",
-                    "timestamp": interaction.created_at.isoformat(),
-                    "description": f"Lead {interaction.lead_id} - {interaction.interaction_type}",
-                    "metadata": {
-                        "lead_id": interaction.lead_id,
-                        "interaction_type": interaction.interaction_type,
-                        "data": interaction.interaction_data
-                    }
-                })
-            
-            # Sort by timestamp and limit
-            activities.sort(key=lambda x: x["timestamp"], reverse=True)
-            activities = activities[:limit]
+            for row in self.db.execute(
+                _activity_feed_stmt(bool(user_id)), _user_params(user_id, limit=limit)
+            ):
+                if row.type == "search":
+                    activities.append({
+                        "type": "search",
+                        "timestamp": row.created_at.isoformat(),
+                        "description": f"Busca por '{row.query_text or 'filtros'}' retornou {row.results_count} resultados",
+                        "metadata": {
+                            "query": row.query_text,
+                            "results": row.results_count,
+                            "response_time": row.response_time_ms
+                        }
+                    })
+                else:
+                    activities.append({
+                        "type": "interaction",
+                        "timestamp": row.created_at.isoformat(),
+                        "description": f"Lead {row.lead_id} - {row.interaction_type}",
+                        "metadata": {
+                            "lead_id": row.lead_id,
+                            "interaction_type": row.interaction_type,
+                            "data": row.interaction_data
+                        }
+                    })
             
             # Cache for 2 minutes
-            self.cache.cache_analytics_data(
+            self._cache_result(
                 cache_key,
                 activities,
                 self.dashboard_cache_ttl["activity_feed"]
@@ -290,25 +427,37 @@ class AnalyticsDashboardService:
             logger.error(f"Error getting activity feed: {e}")
             return []
     
+    def _get_cached(self, cache_key: str) -> Optional[Any]:
+        """Read a dashboard entry through the analytics in-process cache and Redis"""
+        return self.analytics_service._get_cached(cache_key)
+    
+    def _cache_result(self, cache_key: str, data: Any, ttl: int) -> None:
+        """Store a dashboard entry in Redis and the analytics in-process cache"""
+        self.analytics_service._cache_result(cache_key, data, ttl)
+    
+    def _compute_in_own_session(self, method_name: str, args: Tuple) -> Any:
+        """Run a dashboard method on a fresh session sharing this request's timestamp"""
+        def make_service(db: Session) -> "AnalyticsDashboardService":
+            service = AnalyticsDashboardService(db, self.cache)
+            service._request_now = self._now()
+            return service
+        
+        return _run_in_own_session(self.session_factory, make_service, method_name, args)
+    
     def _get_recent_activity(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Get recent activity summary"""
         try:
-            now = datetime.utcnow()
+            now = self._now()
             today = now.replace(hour=0, minute=0, second=0, microsecond=0)
             
-            # Today's activity
-            query = self.db.query(Lead).filter(Lead.created_at >= today)
-            if user_id:
-                query = query.filter(Lead.user_id == user_id)
-            
-            leads_today = query.count()
-            
-            # Recent searches
-            search_query = self.db.query(SearchAnalyticsEvent).filter(SearchAnalyticsEvent.created_at >= today)
-            if user_id:
-                search_query = search_query.filter(SearchAnalyticsEvent.user_id == user_id)
-            
-            searches_today = search_query.count()
+            # Today's counters from the pre-aggregated daily view when available
+            rows = self.analytics_service._read_view(
+                _daily_stats_stmt(bool(user_id)), _user_params(user_id, day=today)
+            )
+            if rows:
+                leads_today, searches_today = (int(value) for value in rows[0])
+            else:
+                leads_today, searches_today = self._count_activity_since(today, user_id)
             
             return {
                 "leads_added_today": leads_today,
@@ -321,23 +470,12 @@ class AnalyticsDashboardService:
             logger.error(f"Error getting recent activity: {e}")
             return {"leads_added_today": 0, "searches_today": 0, "last_activity": None, "trend": "stable"}
     
-    def _calculate_system_health(self, search_performance: Dict[str, Any]) -> str:
-        """Calculate overall system health status"""
-        try:
-            response_time = search_performance.get("avg_response_time_ms", 0)
-            cache_hit_rate = search_performance.get("cache_hit_rate", 0)
-            
-            if response_time < 200 and cache_hit_rate > 70:
-                return "excellent"
-            elif response_time < 500 and cache_hit_rate > 50:
-                return "good"
-            elif response_time < 1000:
-                return "fair"
-            else:
-                return "poor"
-                
-        except Exception:
-            return "unknown"
+    def _count_activity_since(self, since: datetime, user_id: Optional[int] = None):
+        """(leads added, searches) since a point in time, from the raw tables"""
+        leads, searches = self.db.execute(
+            _activity_since_stmt(bool(user_id)), _user_params(user_id, since=since)
+        ).one()
+        return int(leads or 0), int(searches or 0)
     
     def _get_performance_alerts(self, dashboard_metrics: Dict[str, Any], search_performance: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Get performance alerts for dashboard"""
@@ -382,27 +520,10 @@ class AnalyticsDashboardService:
     
     def _get_fallback_summary(self) -> Dict[str, Any]:
         """Get fallback summary when main calculation fails"""
-        return {
-            "overview": {
-                "total_leads": 0,
-                "qualified_leads": 0,
-                "conversion_rate": 0,
-                "growth_rate": 0,
-                "high_quality_leads": 0
-            },
-            "performance": {
-                "avg_response_time": 0,
-                "cache_hit_rate": 0,
-                "searches_today": 0,
-                "system_health": "unknown"
-            },
-            "recent_activity": {
-                "leads_added_today": 0,
-                "searches_today": 0,
-                "last_activity": None,
-                "trend": "stable"
-            },
-            "alerts": [],
-            "last_updated": datetime.utcnow().isoformat(),
-            "error": "Failed to load analytics data"
-        }
\ No newline at end of file
+        return _fallback_dashboard_summary(self._now().isoformat())
+    
+    def _now(self) -> datetime:
+        """Timestamp for this request (naive UTC, like the event columns), taken once"""
+        if self._request_now is None:
+            self._request_now = datetime.utcnow()
+        return self._request_now
\ No newline at end of file
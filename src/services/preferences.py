@@ -1,21 +1,32 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+from ..cache.manager import CacheManager
 from ..database.models import UserPreferences as DBUserPreferences
 from ..models.preferences import (
     UserPreferences, UserPreferencesCreate, UserPreferencesUpdate
 )
 
+# Bump when the cached UserPreferences shape changes
+PREFERENCES_CACHE_VERSION = "v1"
+
 class PreferencesService:
     """Service for managing user preferences"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache_manager: Optional[CacheManager] = None):
         self.db = db
+        self.cache = cache_manager
     
     def get_user_preferences(self, user_id: int) -> Optional[UserPreferences]:
         """Get user preferences by user ID"""
+        cached = self.cache.get_cached_user_preferences(self._cache_key(user_id)) if self.cache else None
+        if cached:
+            return UserPreferences.model_validate(cached)
+        
         db_preferences = self.db.query(DBUserPreferences).filter(
             DBUserPreferences.user_id == user_id
         ).first()
@@ -23,7 +34,9 @@ class PreferencesService:
         if not db_preferences:
             return None
         
-        return UserPreferences.model_validate(db_preferences)
+        preferences = UserPreferences.model_validate(db_preferences)
+        self._cache_preferences(user_id, preferences)
+        return preferences
     
     def create_user_preferences(
         self, 
@@ -57,22 +70,20 @@ class PreferencesService:
         preferences: UserPreferencesUpdate
     ) -> Optional[UserPreferences]:
         """Update existing user preferences"""
-        db_preferences = self.db.query(DBUserPreferences).filter(
+        # Update only provided fields, reading the row back in the same statement
+        stmt = update(DBUserPreferences).where(
             DBUserPreferences.user_id == user_id
-        ).first()
+        ).values(
+            **preferences.model_dump(exclude_unset=True),
+            updated_at=datetime.utcnow()
+        ).returning(DBUserPreferences)
         
+        db_preferences = self.db.scalars(stmt).one_or_none()
         if not db_preferences:
             return None
         
-        # Update only provided fields
-        update_data = preferences.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_preferences, field, value)
-        
-        db_preferences.updated_at = datetime.utcnow()
-        
         self.db.commit()
-        self.db.refresh(db_preferences)
+        self._invalidate_cache(user_id)
         
         return UserPreferences.model_validate(db_preferences)
     
@@ -87,16 +98,39 @@ class PreferencesService:
         
         self.db.delete(db_preferences)
         self.db.commit()
+        self._invalidate_cache(user_id)
         return True
     
     def get_or_create_default_preferences(self, user_id: int) -> UserPreferences:
         """Get user preferences or create default ones if they don't exist"""
         preferences = self.get_user_preferences(user_id)
+        if preferences:
+            return preferences
+        
+        defaults = UserPreferencesCreate()
+        
+        # Race-safe insert of the defaults; when a concurrent request created
+        # the row first nothing is returned and it is read back instead
+        stmt = pg_insert(DBUserPreferences).values(
+            user_id=user_id,
+            preferred_industries=defaults.preferred_industries,
+            preferred_locations=defaults.preferred_locations,
+            company_size_range=defaults.company_size_range,
+            revenue_range=defaults.revenue_range,
+            scoring_weights=defaults.scoring_weights
+        ).on_conflict_do_nothing(
+            index_elements=[DBUserPreferences.user_id]
+        ).returning(DBUserPreferences)
+        
+        db_preferences = self.db.scalars(stmt).one_or_none()
+        if db_preferences is None:
+            db_preferences = self.db.query(DBUserPreferences).filter(
+                DBUserPreferences.user_id == user_id
+            ).one()
+        preferences = UserPreferences.model_validate(db_preferences)
+        self.db.commit()
         
-        if not preferences:
-            default_preferences = UserPreferencesCreate()
-            preferences = self.create_user_preferences(user_id, default_preferences)
-        
+        self._cache_preferences(user_id, preferences)
         return preferences
     
     def apply_preferences_to_search_weights(
@@ -140,4 +174,20 @@ class PreferencesService:
         if preferences.revenue_range:
             filters["revenue_range"] = preferences.revenue_range
         
-        return filters
\ No newline at end of file
+        return filters
+    
+    def _cache_key(self, user_id: int) -> str:
+        """Versioned cache identifier for a user's preferences"""
+        return f"{PREFERENCES_CACHE_VERSION}:{user_id}"
+    
+    def _cache_preferences(self, user_id: int, preferences: UserPreferences) -> None:
+        """Store preferences read from the database"""
+        if self.cache:
+            self.cache.cache_user_preferences(
+                self._cache_key(user_id), preferences.model_dump(mode="json")
+            )
+    
+    def _invalidate_cache(self, user_id: int) -> None:
+        """Drop cached preferences once a change is committed"""
+        if self.cache:
+            self.cache.invalidate_user_preferences(self._cache_key(user_id))
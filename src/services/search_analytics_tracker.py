@@ -3,25 +3,330 @@ Search Analytics Tracker for Huntly MVP
 Tracks search events and user interactions for analytics
 """
 
+import io
+import json
 import logging
-import uuid
-from typing import Dict, List, Any, Optional
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
+from sqlalchemy import Text, bindparam, case, func, insert, select, text, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..database.models import SearchAnalyticsEvent, LeadInteractionEvent, Lead
-from ..cache.manager import CacheManager
+from ..cache.buffer import BatchBuffer
+from ..cache.manager import CacheManager, popular_search_buffer
+from .analytics import AnalyticsService, _count_if, _run_in_own_session, _user_params
 
 logger = logging.getLogger(__name__)
 
+# Search events are buffered per process and written in batches once either
+# threshold is reached, by the background writer when one is running
+SEARCH_EVENT_BATCH_SIZE = int(os.getenv("SEARCH_EVENT_BATCH_SIZE", "500"))
+SEARCH_EVENT_FLUSH_SECONDS = float(os.getenv("SEARCH_EVENT_FLUSH_SECONDS", "1"))
+# Batches at least this large are loaded with COPY on PostgreSQL
+SEARCH_EVENT_COPY_MIN_ROWS = 100
+# Seconds the search summary and popular queries are served from cache
+SEARCH_SUMMARY_CACHE_TTL = 120
+# Window of the popular_queries_30d materialized view
+POPULAR_QUERIES_VIEW_DAYS = 30
+
+search_event_buffer = BatchBuffer(
+    batch_size=SEARCH_EVENT_BATCH_SIZE,
+    max_age=SEARCH_EVENT_FLUSH_SECONDS,
+    limit=SEARCH_EVENT_BATCH_SIZE * 10
+)
+
+@lru_cache(maxsize=4096)
+def _encode_filters_key(key: tuple) -> str:
+    return json.dumps({
+        name: [item for _, item in value] if kind is list else value
+        for name, kind, value in key
+    }, default=str)
+
+def _encode_filters(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    JSON for a filters dict, encoded once per distinct filter set.
+    
+    Search filters are flat (scalars and lists of strings) and repeat a lot,
+    so they are interned by value; anything unhashable is encoded directly.
+    Values are keyed with their type, since True, 1 and 1.0 hash alike but
+    encode differently.
+    """
+    if filters is None:
+        return None
+    try:
+        return _encode_filters_key(tuple(
+            (name, list, tuple((type(item), item) for item in value))
+            if isinstance(value, list) else (name, type(value), value)
+            for name, value in filters.items()
+        ))
+    except TypeError:
+        return json.dumps(filters, default=str)
+
+# Buffered rows carry filters_applied already encoded, so it is bound as text
+# instead of going through the JSON column type again
+_insert_search_events_stmt = insert(SearchAnalyticsEvent.__table__).values(
+    filters_applied=bindparam("filters_applied", type_=Text)
+)
+
+def _csv_field(value: Any) -> str:
+    """A COPY CSV field: NULL is an unquoted empty field, text is always quoted"""
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_search_events(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Load rows with COPY FROM STDIN inside the session's transaction (PostgreSQL)"""
+    columns = list(rows[0])
+    data = io.StringIO()
+    for row in rows:
+        data.write(",".join(_csv_field(row[column]) for column in columns))
+        data.write("\n")
+    data.seek(0)
+    
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {SearchAnalyticsEvent.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            data
+        )
+    finally:
+        cursor.close()
+
+def _write_search_events(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Write rows that share the same columns, with COPY for large batches on PostgreSQL"""
+    if len(rows) >= SEARCH_EVENT_COPY_MIN_ROWS and db.get_bind().dialect.name == "postgresql":
+        _copy_search_events(db, rows)
+    else:
+        db.execute(_insert_search_events_stmt, rows)
+
+def flush_search_events(db: Session) -> int:
+    """Insert the buffered search events in one transaction; returns rows written"""
+    rows = search_event_buffer.drain()
+    if not rows:
+        return 0
+    
+    try:
+        # Events without a session_id omit the column, so they are written
+        # separately for the database default to apply
+        with_session = [row for row in rows if "session_id" in row]
+        without_session = [row for row in rows if "session_id" not in row]
+        for group in (with_session, without_session):
+            if group:
+                _write_search_events(db, group)
+        db.commit()
+        search_event_buffer.flushed()
+        logger.debug(f"Flushed {len(rows)} search events")
+        return len(rows)
+    except Exception as e:
+        # COPY raises driver errors rather than SQLAlchemy ones
+        logger.error(f"Database error flushing search events: {e}")
+        db.rollback()
+        # Kept for the next flush, which waits out a backoff first
+        dropped = search_event_buffer.requeue(rows)
+        if dropped:
+            logger.warning(f"Search event buffer full, dropped {dropped} events")
+        return 0
+
+@lru_cache(maxsize=None)
+def _lead_counters_stmt(interaction_type: str):
+    """Atomic counter UPDATE for one interaction type (None if it counts nothing)"""
+    if interaction_type == "view":
+        values = {"view_count": func.coalesce(Lead.view_count, 0) + 1}
+    elif interaction_type in ("contact", "email", "call"):
+        values = {
+            "contact_count": func.coalesce(Lead.contact_count, 0) + 1,
+            "last_contact": bindparam("now")
+        }
+    elif interaction_type == "convert":
+        score = func.coalesce(Lead.conversion_score, 0) + 0.1
+        values = {"conversion_score": case((score > 1.0, 1.0), else_=score)}
+    else:
+        return None
+    
+    return update(Lead).where(Lead.id == bindparam("lead_id")).values(**values).execution_options(
+        synchronize_session=False
+    )
+
+# Search event counter bumped by each conversion type
+CONVERSION_COUNTER_COLUMNS = {
+    "contact": "contacted_leads",
+    "qualified": "converted_leads",
+    "sale": "converted_leads"
+}
+
+@lru_cache(maxsize=None)
+def _search_event_counter_stmt(counter: Optional[str]):
+    """Increment a search event counter, returning its query text (just read it for None)"""
+    where = SearchAnalyticsEvent.id == bindparam("search_event_id")
+    if counter is None:
+        return select(SearchAnalyticsEvent.query_text).where(where)
+    
+    column = getattr(SearchAnalyticsEvent, counter)
+    return update(SearchAnalyticsEvent).where(where).values(
+        {counter: func.coalesce(column, 0) + 1}
+    ).returning(SearchAnalyticsEvent.query_text).execution_options(synchronize_session=False)
+
+@lru_cache(maxsize=None)
+def _popular_queries_view_stmt(user_scoped: bool):
+    # Same result shape as the live query in get_popular_queries, read from the
+    # popular_queries_30d materialized view (see create_analytics_views)
+    where = "WHERE user_id = :user_id" if user_scoped else ""
+    return text(f"""
+        SELECT query_text,
+               SUM(searches) AS count,
+               SUM(results_sum) * 1.0 / NULLIF(SUM(results_n), 0) AS avg_results,
+               SUM(response_time_sum) * 1.0 / NULLIF(SUM(response_time_n), 0) AS avg_response_time
+        FROM popular_queries_30d
+        {where}
+        GROUP BY query_text
+        ORDER BY count DESC
+        LIMIT :limit
+    """)
+
+@lru_cache(maxsize=None)
+def _search_summary_stmt(user_scoped: bool):
+    """Every summary total for the events since :since in one aggregate query"""
+    stmt = select(
+        func.count(SearchAnalyticsEvent.id),
+        func.coalesce(func.sum(SearchAnalyticsEvent.response_time_ms), 0),
+        _count_if(SearchAnalyticsEvent.cache_hit == "hit"),
+        func.coalesce(func.sum(SearchAnalyticsEvent.results_count), 0),
+        func.coalesce(func.sum(SearchAnalyticsEvent.clicked_results), 0),
+        func.coalesce(func.sum(SearchAnalyticsEvent.converted_leads + SearchAnalyticsEvent.contacted_leads), 0)
+    ).where(SearchAnalyticsEvent.created_at >= bindparam("since"))
+    if user_scoped:
+        stmt = stmt.where(SearchAnalyticsEvent.user_id == bindparam("user_id"))
+    return stmt
+
+class SearchEventWriter(threading.Thread):
+    """Background thread that writes buffered search events (and popular-search
+    counts, given a cache manager) off the request path"""
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        cache_manager: Optional[CacheManager] = None,
+        interval: float = SEARCH_EVENT_FLUSH_SECONDS
+    ):
+        super().__init__(name="search-event-writer", daemon=True)
+        self.session_factory = session_factory
+        self.cache_manager = cache_manager
+        self.interval = interval
+        self._stopping = threading.Event()
+    
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            search_event_buffer.wait_due(self.interval)
+            self.flush()
+    
+    def flush(self, force: bool = False) -> int:
+        """Write whatever is buffered, unless backing off after a failure; returns events written"""
+        if self.cache_manager is not None and len(popular_search_buffer) and (force or popular_search_buffer.ready()):
+            self.cache_manager.flush_popular_searches()
+        
+        if not len(search_event_buffer) or not (force or search_event_buffer.ready()):
+            return 0
+        
+        db = self.session_factory()
+        try:
+            return flush_search_events(db)
+        except Exception as e:
+            logger.error(f"Error writing search events: {e}")
+            return 0
+        finally:
+            db.close()
+    
+    def start(self) -> None:
+        search_event_buffer.flushed_in_background = True
+        popular_search_buffer.flushed_in_background = self.cache_manager is not None
+        super().start()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the thread and write what is still buffered"""
+        self._stopping.set()
+        search_event_buffer.wake()
+        self.join(timeout)
+        search_event_buffer.flushed_in_background = False
+        popular_search_buffer.flushed_in_background = False
+        self.flush(force=True)
+
+_search_event_writer: Optional[SearchEventWriter] = None
+
+def start_search_event_writer(
+    session_factory: Callable[[], Session],
+    cache_manager: Optional[CacheManager] = None
+) -> SearchEventWriter:
+    """Start this process's background writer"""
+    global _search_event_writer
+    if _search_event_writer is None or not _search_event_writer.is_alive():
+        _search_event_writer = SearchEventWriter(session_factory, cache_manager)
+        _search_event_writer.start()
+    return _search_event_writer
+
+def stop_search_event_writer() -> None:
+    """Stop the background writer, flushing what is left"""
+    global _search_event_writer
+    if _search_event_writer is not None:
+        _search_event_writer.stop()
+        _search_event_writer = None
+
 class SearchAnalyticsTracker:
     """Tracks search analytics events and user interactions"""
     
-    def __init__(self, db_session: Session, cache_manager: CacheManager):
-        """Initialize analytics tracker with database and cache"""
+    def __init__(
+        self,
+        db_session: Session,
+        cache_manager: CacheManager,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        """Initialize analytics tracker with database and cache.
+        
+        `session_factory`, when given, opens the sessions used to run
+        independent read queries concurrently (e.g. on a read replica).
+        """
         self.db = db_session
         self.cache = cache_manager
+        self.session_factory = session_factory
+        self._in_batch = False
+    
+    @contextmanager
+    def batch(self):
+        """
+        Commit the events tracked inside the block once, when it exits
+        
+        Nested blocks join the outermost one. An exception rolls the whole
+        batch back and is re-raised.
+        """
+        if self._in_batch:
+            yield self
+            return
+        
+        self._in_batch = True
+        try:
+            yield self
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self._in_batch = False
+    
+    def _commit(self) -> None:
+        """Commit now unless a batch will commit later"""
+        if not self._in_batch:
+            self.db.commit()
         
     def track_search_event(
         self,
@@ -50,35 +355,38 @@ class SearchAnalyticsTracker:
             ip_address: User IP address
             
         Returns:
-            ID of the created search event or None if failed
+            Always None: the event is buffered and written in a later batch
         """
         try:
-            # Create search analytics event
-            search_event = SearchAnalyticsEvent(
-                user_id=user_id,
-                query_text=query_text,
-                filters_applied=filters_applied,
-                results_count=results_count,
-                response_time_ms=response_time_ms,
-                cache_hit=cache_hit,
-                session_id=session_id or str(uuid.uuid4()),
-                user_agent=user_agent,
-                ip_address=ip_address
-            )
-            
-            self.db.add(search_event)
-            self.db.commit()
+            # Buffer the event. A due buffer wakes the background writer; without
+            # one running (scripts, tests) it is written here instead
+            row = {
+                "user_id": user_id,
+                "query_text": query_text,
+                "filters_applied": _encode_filters(filters_applied),
+                "results_count": results_count,
+                "response_time_ms": response_time_ms,
+                "cache_hit": cache_hit,
+                "user_agent": user_agent,
+                "ip_address": ip_address,
+                "created_at": datetime.utcnow()
+            }
+            # Without a session the column is left out and the database
+            # default generates one
+            if session_id:
+                row["session_id"] = session_id
+            due = search_event_buffer.add(row)
+            if due and not search_event_buffer.flushed_in_background:
+                flush_search_events(self.db)
             
             # Update cache with search analytics
-            self._update_search_analytics_cache(query_text, cache_hit, response_time_ms)
+            self._update_search_analytics_cache(query_text)
+            if user_id:
+                self.cache.add_active_user(user_id)
             
             logger.debug(f"Tracked search event: user={user_id}, query='{query_text}', results={results_count}")
-            return search_event.id
-            
-        except SQLAlchemyError as e:
-            logger.error(f"Database error tracking search event: {e}")
-            self.db.rollback()
             return None
+            
         except Exception as e:
             logger.error(f"Error tracking search event: {e}")
             return None
@@ -107,28 +415,15 @@ class SearchAnalyticsTracker:
             ID of the created interaction event or None if failed
         """
         try:
-            # Create lead interaction event
-            interaction_event = LeadInteractionEvent(
-                user_id=user_id,
-                lead_id=lead_id,
-                interaction_type=interaction_type,
-                interaction_data=interaction_data or {},
-                source_search_query=source_search_query,
-                source_campaign_id=source_campaign_id
+            interaction_id = self._record_lead_interaction(
+                user_id, lead_id, interaction_type, interaction_data,
+                source_search_query, source_campaign_id
             )
             
-            self.db.add(interaction_event)
-            
-            # Update lead interaction counters
-            self._update_lead_counters(lead_id, interaction_type)
-            
-            self.db.commit()
-            
-            # Update cache with interaction analytics
-            self._update_interaction_analytics_cache(interaction_type, lead_id)
+            self._commit()
             
             logger.debug(f"Tracked lead interaction: user={user_id}, lead={lead_id}, type={interaction_type}")
-            return interaction_event.id
+            return interaction_id
             
         except SQLAlchemyError as e:
             logger.error(f"Database error tracking lead interaction: {e}")
@@ -138,6 +433,34 @@ class SearchAnalyticsTracker:
             logger.error(f"Error tracking lead interaction: {e}")
             return None
     
+    def _record_lead_interaction(
+        self,
+        user_id: int,
+        lead_id: int,
+        interaction_type: str,
+        interaction_data: Optional[Dict[str, Any]] = None,
+        source_search_query: Optional[str] = None,
+        source_campaign_id: Optional[int] = None
+    ) -> int:
+        """Insert an interaction event and bump the lead's counters without committing"""
+        # Write-only row: a Core insert skips the unit of work and hands
+        # back the id even inside a batch that has not been flushed yet
+        interaction_id = self.db.execute(
+            insert(LeadInteractionEvent).values(
+                user_id=user_id,
+                lead_id=lead_id,
+                interaction_type=interaction_type,
+                interaction_data=interaction_data or {},
+                source_search_query=source_search_query,
+                source_campaign_id=source_campaign_id
+            ).returning(LeadInteractionEvent.id)
+        ).scalar_one()
+        
+        # Update lead interaction counters
+        self._update_lead_counters(lead_id, interaction_type)
+        
+        return interaction_id
+    
     def track_search_result_click(
         self,
         search_event_id: int,
@@ -158,17 +481,20 @@ class SearchAnalyticsTracker:
             True if successfully tracked, False otherwise
         """
         try:
-            # Update search event with click
-            search_event = self.db.query(SearchAnalyticsEvent).filter(
-                SearchAnalyticsEvent.id == search_event_id
-            ).first()
-            
-            if search_event:
-                search_event.clicked_results += 1
+            # The click and its lead interaction are committed together
+            with self.batch():
+                # Atomic increment that also returns the query text
+                search_event = self.db.execute(
+                    _search_event_counter_stmt("clicked_results"), {"search_event_id": search_event_id}
+                ).first()
+                
+                if not search_event:
+                    return False
                 
-                # Track as lead interaction
+                # Recorded in the same transaction, so a failure rolls back
+                # the counter increment as well
                 if user_id:
-                    self.track_lead_interaction(
+                    self._record_lead_interaction(
                         user_id=user_id,
                         lead_id=lead_id,
                         interaction_type="view",
@@ -179,12 +505,9 @@ class SearchAnalyticsTracker:
                         },
                         source_search_query=search_event.query_text
                     )
-                
-                self.db.commit()
-                logger.debug(f"Tracked search result click: search={search_event_id}, lead={lead_id}, pos={position}")
-                return True
             
-            return False
+            logger.debug(f"Tracked search result click: search={search_event_id}, lead={lead_id}, pos={position}")
+            return True
             
         except Exception as e:
             logger.error(f"Error tracking search result click: {e}")
@@ -211,20 +534,21 @@ class SearchAnalyticsTracker:
             True if successfully tracked, False otherwise
         """
         try:
-            # Update search event with conversion
-            search_event = self.db.query(SearchAnalyticsEvent).filter(
-                SearchAnalyticsEvent.id == search_event_id
-            ).first()
-            
-            if search_event:
-                if conversion_type == "contact":
-                    search_event.contacted_leads += 1
-                elif conversion_type in ["qualified", "sale"]:
-                    search_event.converted_leads += 1
+            # The conversion and its lead interaction are committed together
+            with self.batch():
+                # Atomic increment that also returns the query text
+                search_event = self.db.execute(
+                    _search_event_counter_stmt(CONVERSION_COUNTER_COLUMNS.get(conversion_type)),
+                    {"search_event_id": search_event_id}
+                ).first()
                 
-                # Track as lead interaction
+                if not search_event:
+                    return False
+                
+                # Recorded in the same transaction, so a failure rolls back
+                # the counter increment as well
                 if user_id:
-                    self.track_lead_interaction(
+                    self._record_lead_interaction(
                         user_id=user_id,
                         lead_id=lead_id,
                         interaction_type="convert",
@@ -235,12 +559,9 @@ class SearchAnalyticsTracker:
                         },
                         source_search_query=search_event.query_text
                     )
-                
-                self.db.commit()
-                logger.debug(f"Tracked search conversion: search={search_event_id}, lead={lead_id}, type={conversion_type}")
-                return True
             
-            return False
+            logger.debug(f"Tracked search conversion: search={search_event_id}, lead={lead_id}, type={conversion_type}")
+            return True
             
         except Exception as e:
             logger.error(f"Error tracking search conversion: {e}")
@@ -262,6 +583,11 @@ class SearchAnalyticsTracker:
         Returns:
             Dictionary with analytics summary
         """
+        cache_key = f"search_summary_{user_id or 'global'}_{days}"
+        cached_data = self.cache.get_cached_analytics_data(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
         try:
             from datetime import timedelta
             
@@ -269,18 +595,17 @@ class SearchAnalyticsTracker:
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
             
-            # Build query
-            query = self.db.query(SearchAnalyticsEvent).filter(
-                SearchAnalyticsEvent.created_at >= start_date
-            )
-            
-            if user_id:
-                query = query.filter(SearchAnalyticsEvent.user_id == user_id)
-            
-            events = query.all()
-            
-            if not events:
-                return {
+            # Totals are aggregated by the database; no event rows are loaded
+            row = self.db.execute(
+                _search_summary_stmt(bool(user_id)), _user_params(user_id, since=start_date)
+            ).one()
+            (
+                total_searches, total_response_time, cache_hits,
+                total_results, total_clicks, total_conversions
+            ) = (int(value or 0) for value in row)
+            
+            if not total_searches:
+                summary = {
                     "total_searches": 0,
                     "avg_response_time_ms": 0,
                     "cache_hit_rate": 0.0,
@@ -290,22 +615,17 @@ class SearchAnalyticsTracker:
                     "click_through_rate": 0.0,
                     "conversion_rate": 0.0
                 }
+                self.cache.cache_analytics_data(cache_key, summary, SEARCH_SUMMARY_CACHE_TTL)
+                return summary
             
             # Calculate metrics
-            total_searches = len(events)
-            total_response_time = sum(e.response_time_ms for e in events if e.response_time_ms)
-            cache_hits = sum(1 for e in events if e.cache_hit == "hit")
-            total_results = sum(e.results_count for e in events)
-            total_clicks = sum(e.clicked_results for e in events)
-            total_conversions = sum(e.converted_leads + e.contacted_leads for e in events)
-            
             avg_response_time = total_response_time / total_searches if total_searches > 0 else 0
             cache_hit_rate = (cache_hits / total_searches * 100) if total_searches > 0 else 0.0
             avg_results_per_search = total_results / total_searches if total_searches > 0 else 0.0
             click_through_rate = (total_clicks / total_searches * 100) if total_searches > 0 else 0.0
             conversion_rate = (total_conversions / total_searches * 100) if total_searches > 0 else 0.0
             
-            return {
+            summary = {
                 "total_searches": total_searches,
                 "avg_response_time_ms": round(avg_response_time),
                 "cache_hit_rate": round(cache_hit_rate, 1),
@@ -317,10 +637,51 @@ class SearchAnalyticsTracker:
                 "period_days": days
             }
             
+            # Aggregates tolerate a short delay, so expiry is the only invalidation
+            self.cache.cache_analytics_data(cache_key, summary, SEARCH_SUMMARY_CACHE_TTL)
+            return summary
+            
         except Exception as e:
             logger.error(f"Error getting search analytics summary: {e}")
             return {}
     
+    def get_search_insights(
+        self,
+        user_id: Optional[int] = None,
+        days: int = 30,
+        limit: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Get the search summary and popular queries together
+        
+        With a session factory both reads run concurrently, each on its own
+        session, so the wait is the slower of the two rather than their sum.
+        """
+        if self.session_factory is not None:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                summary_future = executor.submit(
+                    self._compute_in_own_session, "get_search_analytics_summary", (user_id, days)
+                )
+                popular_future = executor.submit(
+                    self._compute_in_own_session, "get_popular_queries", (user_id, days, limit)
+                )
+                summary = summary_future.result()
+                popular_queries = popular_future.result()
+        else:
+            summary = self.get_search_analytics_summary(user_id, days)
+            popular_queries = self.get_popular_queries(user_id, days, limit)
+        
+        return {"summary": summary, "popular_queries": popular_queries}
+    
+    def _compute_in_own_session(self, method_name: str, args: Tuple) -> Any:
+        """Run a read method on a fresh tracker"""
+        return _run_in_own_session(
+            self.session_factory,
+            lambda db: SearchAnalyticsTracker(db, self.cache),
+            method_name,
+            args
+        )
+    
     def get_popular_queries(
         self,
         user_id: Optional[int] = None,
@@ -338,6 +699,11 @@ class SearchAnalyticsTracker:
         Returns:
             List of popular queries with counts
         """
+        cache_key = f"popular_queries_{user_id or 'global'}_{days}_{limit}"
+        cached_data = self.cache.get_cached_analytics_data(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
         try:
             from datetime import timedelta
             from sqlalchemy import func, desc
@@ -346,26 +712,34 @@ class SearchAnalyticsTracker:
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
             
-            # Build query
-            query = self.db.query(
-                SearchAnalyticsEvent.query_text,
-                func.count(SearchAnalyticsEvent.id).label('count'),
-                func.avg(SearchAnalyticsEvent.results_count).label('avg_results'),
-                func.avg(SearchAnalyticsEvent.response_time_ms).label('avg_response_time')
-            ).filter(
-                SearchAnalyticsEvent.created_at >= start_date,
-                SearchAnalyticsEvent.query_text.isnot(None),
-                SearchAnalyticsEvent.query_text != ""
-            )
-            
-            if user_id:
-                query = query.filter(SearchAnalyticsEvent.user_id == user_id)
-            
-            results = query.group_by(SearchAnalyticsEvent.query_text).order_by(
-                desc(func.count(SearchAnalyticsEvent.id))
-            ).limit(limit).all()
+            # The default 30-day window is pre-aggregated in a materialized view
+            results = None
+            if days == POPULAR_QUERIES_VIEW_DAYS:
+                results = AnalyticsService(self.db, self.cache)._read_view(
+                    _popular_queries_view_stmt(bool(user_id)), _user_params(user_id, limit=limit)
+                )
+            
+            if results is None:
+                query = self.db.query(
+                    SearchAnalyticsEvent.query_text,
+                    # count(*) rather than count(id): id is not in the covering index
+                    func.count().label('count'),
+                    func.avg(SearchAnalyticsEvent.results_count).label('avg_results'),
+                    func.avg(SearchAnalyticsEvent.response_time_ms).label('avg_response_time')
+                ).filter(
+                    SearchAnalyticsEvent.created_at >= start_date,
+                    SearchAnalyticsEvent.query_text.isnot(None),
+                    SearchAnalyticsEvent.query_text != ""
+                )
+                
+                if user_id:
+                    query = query.filter(SearchAnalyticsEvent.user_id == user_id)
+                
+                results = query.group_by(SearchAnalyticsEvent.query_text).order_by(
+                    desc(func.count())
+                ).limit(limit).all()
             
-            return [
+            popular_queries = [
                 {
                     "query": result.query_text,
                     "count": int(result.count),
@@ -375,83 +749,29 @@ class SearchAnalyticsTracker:
                 for result in results
             ]
             
+            self.cache.cache_analytics_data(cache_key, popular_queries, SEARCH_SUMMARY_CACHE_TTL)
+            return popular_queries
+            
         except Exception as e:
             logger.error(f"Error getting popular queries: {e}")
             return []
     
     def _update_lead_counters(self, lead_id: int, interaction_type: str) -> None:
-        """Update lead interaction counters"""
+        """Update lead interaction counters in the database, in one statement"""
         try:
-            lead = self.db.query(Lead).filter(Lead.id == lead_id).first()
-            if lead:
-                if interaction_type == "view":
-                    lead.view_count = (lead.view_count or 0) + 1
-                elif interaction_type in ["contact", "email", "call"]:
-                    lead.contact_count = (lead.contact_count or 0) + 1
-                    lead.last_contact = datetime.utcnow()
-                elif interaction_type == "convert":
-                    lead.conversion_score = min((lead.conversion_score or 0) + 0.1, 1.0)
+            stmt = _lead_counters_stmt(interaction_type)
+            if stmt is not None:
+                self.db.execute(stmt, {"lead_id": lead_id, "now": datetime.utcnow()})
                 
         except Exception as e:
             logger.error(f"Error updating lead counters: {e}")
     
-    def _update_search_analytics_cache(
-        self,
-        query_text: Optional[str],
-        cache_hit: str,
-        response_time_ms: int
-    ) -> None:
+    def _update_search_analytics_cache(self, query_text: Optional[str]) -> None:
         """Update search analytics in cache"""
         try:
             # Add to popular searches if query exists
             if query_text and query_text.strip():
                 self.cache.add_popular_search(query_text.strip())
             
-            # Update performance metrics in cache
-            cache_key = "search_performance_realtime"
-            current_data = self.cache.get_cached_analytics_data(cache_key) or {
-                "total_searches": 0,
-                "total_response_time": 0,
-                "cache_hits": 0
-            }
-            
-            current_data["total_searches"] += 1
-            current_data["total_response_time"] += response_time_ms
-            if cache_hit == "hit":
-                current_data["cache_hits"] += 1
-            
-            # Cache for 5 minutes
-            self.cache.cache_analytics_data(cache_key, current_data, 300)
-            
         except Exception as e:
             logger.error(f"Error updating search analytics cache: {e}")
-    
-    def _update_interaction_analytics_cache(
-        self,
-        interaction_type: str,
-        lead_id: int
-    ) -> None:
-        """Update interaction analytics in cache"""
-        try:
-            cache_key = "interaction_analytics_realtime"
-            current_data = self.cache.get_cached_analytics_data(cache_key) or {
-                "total_interactions": 0,
-                "views": 0,
-                "contacts": 0,
-                "conversions": 0
-            }
-            
-            current_data["total_interactions"] += 1
-            
-            if interaction_type == "view":
-                current_data["views"] += 1
-            elif interaction_type in ["contact", "email", "call"]:
-                current_data["contacts"] += 1
-            elif interaction_type == "convert":
-                current_data["conversions"] += 1
-            
-            # Cache for 5 minutes
-            self.cache.cache_analytics_data(cache_key, current_data, 300)
-            
-        except Exception as e:
-            logger.error(f"Error updating interaction analytics cache: {e}")
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Shared test configuration
+"""
+import os
+
+import pytest
+from sqlalchemy import ARRAY, create_engine, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+# The lowest bcrypt cost keeps password hashing cheap in tests; set before any
+# test module imports src.auth.utils
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from src.database.models import Base
+
+
+# Postgres-only column types are stored as plain text so the schema can be
+# created on an in-memory SQLite database
+@compiles(ARRAY, "sqlite")
+@compiles(TSVECTOR, "sqlite")
+def _compile_text_on_sqlite(type_, compiler, **kw):
+    return "TEXT"
+
+
+def register_sqlite_functions(dbapi_connection, connection_record):
+    """Provide the PostgreSQL date_trunc('month', ...) used by leads_by_month"""
+    dbapi_connection.create_function(
+        "date_trunc", 2, lambda unit, value: f"{value[:7]}-01 00:00:00" if value else None
+    )
+
+
+@pytest.fixture(scope="session")
+def known_hash():
+    """Hash each password once per test session and reuse it"""
+    from src.auth.utils import get_password_hash
+
+    hashes = {}
+
+    def hash_password(password):
+        if password not in hashes:
+            hashes[password] = get_password_hash(password)
+        return hashes[password]
+
+    return hash_password
+
+
+@pytest.fixture(scope="session")
+def sqlite_engine():
+    """In-memory SQLite database with the full schema, created once per session"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    # pysqlite defers BEGIN and mishandles SAVEPOINT; let SQLAlchemy emit both
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        register_sqlite_functions(dbapi_connection, connection_record)
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_session(sqlite_engine):
+    """Session rolled back after the test; its commits only release savepoints"""
+    connection = sqlite_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
@@ -0,0 +1,223 @@
+"""
+Tests for the analytics dashboard service
+"""
+
+import pytest
+from unittest.mock import Mock, MagicMock
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+from src.services.analytics import _local_cache
+from src.services.analytics_dashboard import AnalyticsDashboardService
+from src.cache.manager import CacheManager
+from src.database.models import Lead, SearchAnalyticsEvent, LeadInteractionEvent
+from src.database.query_counter import QueryCounter
+
+
+class TestAnalyticsDashboardService:
+    """Test cases for AnalyticsDashboardService"""
+
+    def setup_method(self):
+        """Setup test fixtures"""
+        _local_cache.clear()
+        self.mock_db = Mock(spec=Session)
+        self.mock_cache = Mock(spec=CacheManager)
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.dashboard_service = AnalyticsDashboardService(self.mock_db, self.mock_cache)
+
+    def test_recent_activity_reads_daily_stats_view(self):
+        """On PostgreSQL today's counters come from dashboard_daily_stats"""
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.dashboard_service.analytics_service._reads_bounded = True
+        self.mock_db.begin_nested.return_value = MagicMock()
+        self.mock_db.execute.return_value.all.return_value = [(4, 9)]
+
+        result = self.dashboard_service._get_recent_activity(user_id=1)
+
+        stmt, params = self.mock_db.execute.call_args[0]
+        assert "dashboard_daily_stats" in str(stmt)
+        assert params["user_id"] == 1
+        assert result["leads_added_today"] == 4
+        assert result["searches_today"] == 9
+        self.mock_db.query.assert_not_called()
+
+
+    def test_repeated_reads_served_from_local_cache(self):
+        """A worker that just served an entry skips the Redis round trip"""
+        self.mock_cache.get_cached_analytics_data.return_value = {"funnel": [], "total_leads": 7}
+
+        first = self.dashboard_service.get_conversion_funnel(user_id=1)
+        second = self.dashboard_service.get_conversion_funnel(user_id=1)
+
+        assert first == second == {"funnel": [], "total_leads": 7}
+        self.mock_cache.get_cached_analytics_data.assert_called_once_with("conversion_funnel_1")
+        self.mock_db.execute.assert_not_called()
+
+
+    def test_summary_runs_sections_on_own_sessions(self):
+        """With a session factory, each summary section gets its own session"""
+        cached = {
+            "dashboard_metrics_1": {"total_leads": 10, "conversion_rate": 25.0},
+            "search_performance_global": {
+                "avg_response_time_ms": 120, "cache_hit_rate": 80.0, "system_health": "excellent"
+            }
+        }
+        self.mock_cache.get_cached_analytics_data.side_effect = cached.get
+        sessions = []
+
+        def session_factory():
+            session = Mock(spec=Session)
+            sessions.append(session)
+            return session
+
+        service = AnalyticsDashboardService(self.mock_db, self.mock_cache, session_factory=session_factory)
+        summary = service.get_dashboard_summary(user_id=1)
+
+        assert len(sessions) == 3
+        for session in sessions:
+            session.close.assert_called_once()
+        self.mock_db.execute.assert_not_called()
+        assert summary["overview"]["total_leads"] == 10
+        assert summary["performance"]["avg_response_time"] == 120
+        assert summary["performance"]["system_health"] == "excellent"
+        assert "leads_added_today" in summary["recent_activity"]
+
+
+    def test_fallback_summary_stamps_request_time(self):
+        """Each fallback carries this request's timestamp and its own nested dicts"""
+        first = self.dashboard_service._get_fallback_summary()
+        second = self.dashboard_service._get_fallback_summary()
+
+        assert first["last_updated"] == second["last_updated"] == self.dashboard_service._now().isoformat()
+        assert first["error"] == "Failed to load analytics data"
+
+        first["overview"]["total_leads"] = 99
+        first["alerts"].append({"type": "error"})
+        assert second["overview"]["total_leads"] == 0
+        assert second["alerts"] == []
+
+
+class TestAnalyticsDashboardQueries:
+    """Query-count tests against an in-memory database"""
+
+    @pytest.fixture(autouse=True)
+    def setup_database(self, sqlite_engine, sqlite_session):
+        """Seed leads and events inside the per-test transaction"""
+        _local_cache.clear()
+        self.engine = sqlite_engine
+        self.db = sqlite_session
+
+        now = datetime.utcnow()
+        self.db.add_all([
+            Lead(user_id=1, company="Acme", email="a@acme.com", view_count=3, contact_count=1,
+                 conversion_score=0.8, created_at=now),
+            Lead(user_id=1, company="Beta", phone="1", view_count=1, created_at=now - timedelta(days=2)),
+            Lead(user_id=1, company="Gama", created_at=now - timedelta(days=5)),
+            Lead(user_id=2, company="Other", email="o@other.com", view_count=1, created_at=now),
+            SearchAnalyticsEvent(user_id=1, query_text="tech", results_count=3, response_time_ms=40,
+                                 created_at=now - timedelta(seconds=30)),
+            SearchAnalyticsEvent(user_id=2, query_text="retail", results_count=1, response_time_ms=55,
+                                 created_at=now - timedelta(minutes=20)),
+            SearchAnalyticsEvent(user_id=1, query_text="old", results_count=0, response_time_ms=70,
+                                 created_at=now - timedelta(days=2)),
+            LeadInteractionEvent(user_id=1, lead_id=1, interaction_type="view",
+                                 created_at=now - timedelta(minutes=10)),
+        ])
+        self.db.commit()
+
+        self.mock_cache = Mock(spec=CacheManager)
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.dashboard_service = AnalyticsDashboardService(self.db, self.mock_cache)
+
+    def test_conversion_funnel_single_query(self):
+        """All funnel stages are counted with one conditional aggregate"""
+        with QueryCounter(self.engine) as counter:
+            result = self.dashboard_service.get_conversion_funnel(user_id=1)
+
+        assert counter.count == 1
+        counts = {stage["stage"]: stage["count"] for stage in result["funnel"]}
+        assert counts == {
+            "discovered": 3,
+            "viewed": 2,
+            "contacted": 1,
+            "qualified": 2,
+            "converted": 1
+        }
+        assert result["total_leads"] == 3
+        assert result["overall_conversion_rate"] == 33.3
+        assert result["biggest_drop_off"] == "contacted"
+        assert [stage["drop_off_rate"] for stage in result["funnel"]] == [0, 33.3, 50.0, -100.0, 50.0]
+
+    def test_real_time_metrics_single_query(self):
+        """Without Redis, last-hour searches, interactions and active users come from one statement"""
+        self.mock_cache.health_check.return_value = {"status": "healthy"}
+        self.mock_cache.count_active_users.return_value = None
+
+        with QueryCounter(self.engine) as counter:
+            result = self.dashboard_service.get_real_time_metrics()
+
+        assert counter.count == 1
+        assert result["activity"] == {
+            "searches_last_hour": 2,
+            "interactions_last_hour": 1,
+            "active_users": 2
+        }
+
+    def test_real_time_metrics_active_users_from_sketch(self):
+        """With Redis, active users come from the HyperLogLog, not COUNT DISTINCT"""
+        self.mock_cache.health_check.return_value = {"status": "healthy"}
+        self.mock_cache.count_active_users.return_value = 42
+
+        with QueryCounter(self.engine) as counter:
+            result = self.dashboard_service.get_real_time_metrics()
+
+        assert "DISTINCT" not in counter.statements[0].upper()
+        assert result["activity"]["active_users"] == 42
+        assert result["activity"]["searches_last_hour"] == 2
+
+    def test_real_time_metrics_user_scoped(self):
+        """User-scoped metrics only count that user's events"""
+        self.mock_cache.health_check.return_value = {"status": "healthy"}
+
+        result = self.dashboard_service.get_real_time_metrics(user_id=2)
+
+        assert result["activity"]["searches_last_hour"] == 1
+        assert result["activity"]["interactions_last_hour"] == 0
+
+
+    def test_recent_activity_falls_back_to_raw_tables(self):
+        """Without the daily view, today's counters come from one query on the raw tables"""
+        with QueryCounter(self.engine) as counter:
+            result = self.dashboard_service._get_recent_activity(user_id=1)
+
+        assert counter.count == 1
+        assert result["leads_added_today"] == 1
+        assert result["searches_today"] == 1
+
+
+    def test_activity_feed_selects_only_shown_columns(self):
+        """The feed reads the shown columns of both streams in one query"""
+        with QueryCounter(self.engine) as counter:
+            feed = self.dashboard_service.get_activity_feed(user_id=1, limit=4)
+
+        assert counter.count == 1
+        statements = " ".join(counter.statements)
+        assert "filters_applied" not in statements
+        assert "source_search_query" not in statements
+        assert [item["type"] for item in feed] == ["search", "interaction", "search"]
+        assert feed[0]["metadata"] == {"query": "tech", "results": 3, "response_time": 40}
+
+
+    def test_activity_feed_limit_spans_both_streams(self):
+        """A sparse stream does not cap the feed at half the limit"""
+        feed = self.dashboard_service.get_activity_feed(limit=2)
+
+        assert [item["type"] for item in feed] == ["search", "interaction"]
+
+        feed = self.dashboard_service.get_activity_feed(limit=4)
+
+        assert [item["type"] for item in feed] == ["search", "interaction", "search", "search"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
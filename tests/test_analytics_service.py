@@ -2,14 +2,36 @@
 Tests for Analytics Service
 """
 
+import json
 import pytest
 from unittest.mock import Mock, MagicMock
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session, selectinload
 
-from src.services.analytics import AnalyticsService
+from src.services.analytics import (
+    AnalyticsService,
+    CONVERTING_FILTER_DIMENSIONS,
+    SEARCH_TRENDS_JSON,
+    _dashboard_metrics_stmt,
+    _percent,
+    _local_cache,
+    memo_policy
+)
 from src.cache.manager import CacheManager
 from src.database.models import Lead, User, Campaign
+from src.database.query_counter import QueryCounter
+
+
+# Statement budgets per analytics method: (method, kwargs, max statements)
+QUERY_BUDGETS = [
+    ("get_dashboard_metrics", {"user_id": 1}, 1),
+    ("get_leads_by_month", {"user_id": 1, "months": 6}, 1),
+    ("get_industry_breakdown", {"user_id": 1, "limit": 10}, 1),
+    ("get_source_metrics", {"user_id": 1}, 1),
+    ("get_quality_scores", {"user_id": 1}, 1),
+    ("get_search_facets", {"user_id": 1}, 2),
+]
 
 
 class TestAnalyticsService:
@@ -17,6 +39,8 @@ class TestAnalyticsService:
     
     def setup_method(self):
         """Setup test fixtures"""
+        _local_cache.clear()
+        memo_policy.reset()
         self.mock_db = Mock(spec=Session)
         self.mock_cache = Mock(spec=CacheManager)
         self.analytics_service = AnalyticsService(self.mock_db, self.mock_cache)
@@ -39,7 +63,7 @@ class TestAnalyticsService:
         self.mock_cache.get_cached_analytics_data.assert_called_once_with("dashboard_metrics_1")
         
         # Verify database was not queried
-        self.mock_db.query.assert_not_called()
+        self.mock_db.execute.assert_not_called()
         
         # Verify result
         assert result == cached_data
@@ -50,10 +74,7 @@ class TestAnalyticsService:
         self.mock_cache.get_cached_analytics_data.return_value = None
         
         # Setup mock query results
-        mock_query = Mock()
-        mock_query.count.return_value = 100
-        mock_query.filter.return_value = mock_query
-        self.mock_db.query.return_value = mock_query
+        self.mock_db.execute.return_value.one.return_value = (100, 50, 20, 10, 5, 4)
         
         # Call method
         result = self.analytics_service.get_dashboard_metrics(user_id=1)
@@ -62,7 +83,7 @@ class TestAnalyticsService:
         self.mock_cache.get_cached_analytics_data.assert_called_once_with("dashboard_metrics_1")
         
         # Verify database was queried
-        self.mock_db.query.assert_called()
+        self.mock_db.execute.assert_called_once()
         
         # Verify cache was updated
         self.mock_cache.cache_analytics_data.assert_called()
@@ -72,6 +93,22 @@ class TestAnalyticsService:
         assert "qualified_leads" in result
         assert "conversion_rate" in result
         assert "average_roi" in result
+        assert result["total_leads"] == 100
+        assert result["conversion_rate"] == 50.0
+        assert result["growth_rate"] == 25.0
+    
+    def test_request_timestamp_shared_across_metrics(self):
+        """All metrics computed by one service instance share one timestamp"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.execute.return_value.one.return_value = (100, 50, 20, 10, 5, 4)
+        self.mock_cache.get_popular_searches.return_value = []
+        self.mock_cache.health_check.return_value = {"status": "healthy"}
+        
+        dashboard = self.analytics_service.get_dashboard_metrics(user_id=1)
+        performance = self.analytics_service.get_search_performance_metrics()
+        
+        assert dashboard["last_updated"] == performance["last_updated"]
+        assert datetime.fromisoformat(dashboard["last_updated"]).tzinfo is not None
     
     def test_get_search_performance_metrics(self):
         """Test search performance metrics calculation"""
@@ -94,6 +131,9 @@ class TestAnalyticsService:
         assert "popular_queries" in result
         assert "search_trends" in result
         assert "indexing_status" in result
+        assert result["system_health"] == self.analytics_service._calculate_system_health(
+            result["avg_response_time_ms"], result["cache_hit_rate"]
+        )
         
         # Verify popular queries format
         assert isinstance(result["popular_queries"], list)
@@ -101,24 +141,46 @@ class TestAnalyticsService:
             assert "query" in result["popular_queries"][0]
             assert "count" in result["popular_queries"][0]
     
+    def test_search_trends_built_from_constants(self):
+        """Search trends need no cache or database access"""
+        trends = self.analytics_service._calculate_search_trends()
+        trends["hourly_distribution"]["14"] = 0
+        
+        assert trends["peak_hours"] == ["14:00", "16:00", "09:00"]
+        assert trends["total_searches_today"] == 216
+        assert self.analytics_service._calculate_search_trends()["hourly_distribution"]["14"] == 20
+        self.mock_cache.get_cached_analytics_data.assert_not_called()
+        self.mock_db.execute.assert_not_called()
+        assert json.loads(SEARCH_TRENDS_JSON) == self.analytics_service._calculate_search_trends()
+    
+    def test_cache_hit_rate_memoized_in_process(self):
+        """Redis INFO is read at most once per memo window"""
+        self.mock_cache.enabled = True
+        self.mock_cache.get_stats_and_health.return_value = (
+            {"hits": 3, "misses": 1}, {"status": "healthy"}
+        )
+        
+        assert self.analytics_service._estimate_cache_hit_rate() == 75.0
+        assert AnalyticsService(self.mock_db, self.mock_cache)._estimate_cache_hit_rate() == 75.0
+        
+        self.mock_cache.get_stats_and_health.assert_called_once()
+        self.mock_cache.health_check.assert_not_called()
+        self.mock_cache.get_cached_analytics_data.assert_not_called()
+    
     def test_get_leads_by_month(self):
         """Test leads by month calculation"""
         # Setup cache miss
         self.mock_cache.get_cached_analytics_data.return_value = None
         
         # Setup mock query results
+        this_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
         mock_monthly_data = [
-            Mock(year=2024, month=1, total_leads=50, qualified_leads=25),
-            Mock(year=2024, month=2, total_leads=60, qualified_leads=30),
+            Mock(month_start=last_month, total_leads=50, qualified_leads=25),
+            Mock(month_start=this_month, total_leads=60, qualified_leads=30),
         ]
         
-        mock_query = Mock()
-        mock_query.filter.return_value = mock_query
-        mock_query.group_by.return_value = mock_query
-        mock_query.order_by.return_value = mock_query
-        mock_query.all.return_value = mock_monthly_data
-        
-        self.mock_db.query.return_value = mock_query
+        self.mock_db.execute.return_value.all.return_value = mock_monthly_data
         
         # Call method
         result = self.analytics_service.get_leads_by_month(user_id=1, months=6)
@@ -130,6 +192,10 @@ class TestAnalyticsService:
             assert "leads" in result[0]
             assert "qualified" in result[0]
             assert "year" in result[0]
+        assert len(result) >= 6
+        assert [(r["leads"], r["qualified"]) for r in result[-2:]] == [(50, 25), (60, 30)]
+        assert all(r["leads"] == 0 for r in result[:-2])
+        assert result[-1]["year"] == this_month.year
     
     def test_get_industry_breakdown(self):
         """Test industry breakdown calculation"""
@@ -142,14 +208,7 @@ class TestAnalyticsService:
             Mock(industry="Healthcare", count=30),
         ]
         
-        mock_query = Mock()
-        mock_query.filter.return_value = mock_query
-        mock_query.group_by.return_value = mock_query
-        mock_query.order_by.return_value = mock_query
-        mock_query.limit.return_value = mock_query
-        mock_query.all.return_value = mock_industry_data
-        
-        self.mock_db.query.return_value = mock_query
+        self.mock_db.execute.return_value.all.return_value = mock_industry_data
         
         # Call method
         result = self.analytics_service.get_industry_breakdown(user_id=1, limit=10)
@@ -160,6 +219,303 @@ class TestAnalyticsService:
             assert "industry" in result[0]
             assert "count" in result[0]
     
+    def test_percent_rounds_half_up(self):
+        """Rates are rounded to one decimal without float round()"""
+        assert _percent(2, 3) == 66.7
+        assert _percent(1, 8) == 12.5
+        assert _percent(1, 16) == 6.3
+        assert _percent(5, 5) == 100.0
+        assert _percent(1, 0) == 0.0
+    
+    def test_approx_total_leads_uses_planner_estimate(self):
+        """Large PostgreSQL tables read reltuples instead of counting"""
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.mock_db.execute.return_value.scalar.return_value = 2_500_000
+        
+        assert self.analytics_service._approx_total_leads() == 2_500_000
+        self.mock_db.execute.assert_called_once()
+    
+    def test_indexing_status_uses_row_estimate(self):
+        """Large tables take the total from reltuples and count indexed leads only"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.analytics_service._reads_bounded = True
+        self.mock_db.execute.return_value.scalar.return_value = 1_000_000
+        self.mock_db.execute.return_value.one.return_value = (500_000, 1_000, None)
+        
+        status = self.analytics_service._get_indexing_status()
+        
+        assert self.mock_db.execute.call_count == 2
+        assert status["total_leads"] == 1_000_000
+        assert status["coverage_percent"] == 50.0
+        assert status["status"] == "needs_attention"
+    
+    def test_indexing_status_borderline_uses_exact_count(self):
+        """Coverage near the healthy threshold is recomputed exactly"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.analytics_service._reads_bounded = True
+        self.mock_db.execute.return_value.scalar.return_value = 1_000_000
+        self.mock_db.execute.return_value.one.side_effect = [
+            (900_000, 1_000, None),
+            (990_000, 900_000, 1_000, None)
+        ]
+        
+        status = self.analytics_service._get_indexing_status()
+        
+        assert self.mock_db.execute.call_count == 3
+        assert status["total_leads"] == 990_000
+        assert status["status"] == "healthy"
+    
+    def test_cache_miss_bounds_transaction_once_on_postgresql(self):
+        """A cache miss sets a statement timeout and read-only mode once"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        
+        self.analytics_service._get_cached("dashboard_metrics_1")
+        self.analytics_service._get_cached("quality_scores_1")
+        
+        self.mock_db.execute.assert_called_once()
+        statement = str(self.mock_db.execute.call_args[0][0])
+        assert "statement_timeout" in statement
+        assert "transaction_read_only" in statement
+    
+    def test_cache_miss_does_not_bound_other_dialects(self):
+        """The read bounds are only applied on PostgreSQL"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "sqlite"
+        
+        self.analytics_service._get_cached("dashboard_metrics_1")
+        
+        self.mock_db.execute.assert_not_called()
+    
+    def test_get_full_dashboard_only_recomputes_missing_sections(self):
+        """Cached sections come from one MGET; only misses are recomputed"""
+        self.mock_cache.mget_analytics.return_value = ({
+            "dashboard_metrics_1": {"total_leads": 10, "last_updated": "now"},
+            "search_performance_global": {"cache_hit_rate": 80.0},
+            "search_conversion_1": {"search_to_contact_rate": 5.0},
+            "leads_by_month_1_6": [{"month": "Jan"}],
+            "industry_breakdown_1_10": [{"industry": "Tech"}],
+            "quality_scores_1": {"high_quality": {"count": 1}}
+        }, [])
+        self.analytics_service.get_source_metrics = Mock(return_value=[{"source": "Website"}])
+        
+        result = self.analytics_service.get_full_dashboard(user_id=1)
+        
+        self.mock_cache.mget_analytics.assert_called_once()
+        self.mock_cache.get_cached_analytics_data.assert_not_called()
+        self.analytics_service.get_source_metrics.assert_called_once_with(1)
+        assert result["source_metrics"] == [{"source": "Website"}]
+        assert result["dashboard"]["total_leads"] == 10
+        assert result["last_updated"] == "now"
+    
+    def test_empty_cached_metric_is_a_hit(self):
+        """A cached empty list is served without touching the database"""
+        self.mock_cache.get_cached_analytics_data.return_value = []
+        
+        assert self.analytics_service.get_source_metrics(42) == []
+        
+        self.mock_db.execute.assert_not_called()
+        self.mock_cache.cache_analytics_data.assert_not_called()
+    
+    def test_get_full_dashboard_serves_empty_cached_sections(self):
+        """Empty cached sections are hits, not recomputed"""
+        self.mock_cache.mget_analytics.return_value = ({
+            "dashboard_metrics_1": {"total_leads": 0, "last_updated": "now"},
+            "search_performance_global": {"cache_hit_rate": 0.0},
+            "search_conversion_1": {"search_to_contact_rate": 0.0},
+            "leads_by_month_1_6": [],
+            "industry_breakdown_1_10": [],
+            "quality_scores_1": {},
+            "source_metrics_1": []
+        }, [])
+        
+        result = self.analytics_service.get_full_dashboard(user_id=1)
+        
+        self.mock_cache.get_cached_analytics_data.assert_not_called()
+        self.mock_db.execute.assert_not_called()
+        assert result["source_metrics"] == []
+        assert result["leads_by_month"] == []
+    
+    def test_get_full_dashboard_recomputes_stale_section_once(self):
+        """A stale section is recomputed past the cache by the lock holder"""
+        self.mock_cache.mget_analytics.return_value = ({
+            "dashboard_metrics_1": {"total_leads": 10, "last_updated": "now"},
+            "search_performance_global": {"cache_hit_rate": 80.0},
+            "search_conversion_1": {"search_to_contact_rate": 5.0},
+            "leads_by_month_1_6": [{"month": "Jan"}],
+            "industry_breakdown_1_10": [{"industry": "Tech"}],
+            "quality_scores_1": {"high_quality": {"count": 1}},
+            "source_metrics_1": [{"source": "Old"}]
+        }, ["source_metrics_1", "quality_scores_1"])
+        self.mock_cache.claim_analytics_refresh.side_effect = lambda key: key == "source_metrics_1"
+        self.mock_db.execute.return_value.one.return_value = (10, 3, 2, 1)
+        
+        result = self.analytics_service.get_full_dashboard(user_id=1)
+        
+        self.mock_cache.get_cached_analytics_data.assert_not_called()
+        assert result["source_metrics"] != [{"source": "Old"}]
+        assert result["quality_scores"] == {"high_quality": {"count": 1}}
+        assert self.mock_cache.cache_analytics_data.call_args[0][0] == "source_metrics_1"
+        assert not self.analytics_service._force_refresh
+    
+    def test_get_search_facets_reads_materialized_view(self):
+        """On PostgreSQL facets come from the leads_facets view"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.mock_db.begin_nested.return_value = MagicMock()
+        self.mock_db.execute.return_value.all.return_value = [
+            Mock(kind="industries", value="Technology", count=12),
+            Mock(kind="revenue_ranges", value="1M-10M", count=3),
+        ]
+        
+        result = self.analytics_service.get_search_facets(user_id=1)
+        
+        self.mock_db.begin_nested.assert_called_once()
+        stmt, params = self.mock_db.execute.call_args[0]
+        assert "leads_facets" in str(stmt)
+        assert params == {"user_id": 1}
+        assert result["industries"] == [{"value": "Technology", "count": 12}]
+        assert result["revenue_ranges"] == [{"value": "1M-10M", "count": 3}]
+        assert result["locations"] == []
+    
+    def test_top_converting_filters_read_conversion_views(self):
+        """Unfiltered top filters come from the conversion views on PostgreSQL"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.analytics_service._reads_bounded = True
+        self.mock_db.begin_nested.return_value = MagicMock()
+        self.mock_db.execute.return_value.all.return_value = [
+            Mock(kind="industry", value="Technology", usage=12, rate=25.0)
+        ]
+        query = Mock(whereclause=None)
+        
+        result = self.analytics_service._calculate_top_converting_filters(query)
+        
+        self.mock_db.execute.assert_called_once()
+        stmt = str(self.mock_db.execute.call_args[0][0])
+        assert "leads_by_industry_conversion" in stmt
+        assert "leads_by_location_conversion" in stmt
+        assert result == [
+            {"filter": "industry:Technology", "usage": 12, "conversion_rate": 25.0}
+        ]
+    
+    def test_top_converting_filters_filtered_query_skips_views(self):
+        """Filtered requests rank their own leads live instead of reading the views"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.analytics_service._reads_bounded = True
+        self.mock_db.execute.return_value.all.return_value = []
+        query = Session().query(Lead).filter(Lead.user_id == 1)
+        
+        self.analytics_service._calculate_top_converting_filters(query)
+        
+        self.mock_db.begin_nested.assert_not_called()
+        stmt = str(self.mock_db.execute.call_args[0][0])
+        assert "_conversion" not in stmt
+        assert stmt.count("leads.user_id = ") == len(CONVERTING_FILTER_DIMENSIONS)
+    
+    def test_get_full_dashboard_recomputes_on_separate_sessions(self):
+        """Missing sections run concurrently, each on its own session"""
+        self.mock_cache.mget_analytics.return_value = ({
+            "dashboard_metrics_1": {"total_leads": 10, "last_updated": "now"},
+            "search_performance_global": {"cache_hit_rate": 80.0},
+            "search_conversion_1": {"search_to_contact_rate": 5.0},
+            "leads_by_month_1_6": [{"month": "Jan"}],
+            "industry_breakdown_1_10": [{"industry": "Tech"}]
+        }, [])
+        self.mock_cache.get_cached_analytics_data.return_value = {"cached": True}
+        sessions = []
+        
+        def session_factory():
+            session = Mock(spec=Session)
+            sessions.append(session)
+            return session
+        
+        service = AnalyticsService(self.mock_db, self.mock_cache, session_factory=session_factory)
+        result = service.get_full_dashboard(user_id=1)
+        
+        assert len(sessions) == 2
+        for session in sessions:
+            session.close.assert_called_once()
+        self.mock_db.execute.assert_not_called()
+        assert result["source_metrics"] == {"cached": True}
+        assert result["quality_scores"] == {"cached": True}
+    
+    def test_local_cache_serves_repeated_reads(self):
+        """Hot keys are served from the in-process cache without Redis"""
+        cached_data = {"total_leads": 100}
+        self.mock_cache.get_cached_analytics_data.return_value = cached_data
+        
+        self.analytics_service.get_dashboard_metrics(user_id=1)
+        other_request = AnalyticsService(Mock(spec=Session), self.mock_cache)
+        result = other_request.get_dashboard_metrics(user_id=1)
+        
+        assert result == cached_data
+        self.mock_cache.get_cached_analytics_data.assert_called_once_with("dashboard_metrics_1")
+    
+    def test_cache_outcomes_recorded_for_ttl_tuning(self):
+        """Hits and recomputed misses are recorded per metric"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.execute.return_value.one.return_value = (0, 0, 0, 0, 0, 0)
+        
+        self.analytics_service.get_dashboard_metrics(user_id=1)
+        self.analytics_service.get_dashboard_metrics(user_id=1)
+        
+        assert memo_policy._counts[("dashboard_metrics", "miss")] == 1
+        assert memo_policy._counts[("dashboard_metrics", "hit")] == 1
+    
+    def test_tuned_ttl_used_when_caching(self):
+        """Metrics are cached with the TTL from the memo_policy:ttl hash"""
+        self.mock_cache.redis_client = Mock()
+        self.mock_cache.redis_client.hgetall.return_value = {"leads_by_month": "120"}
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.execute.return_value.all.return_value = []
+        
+        self.analytics_service.get_leads_by_month(user_id=1, months=6)
+        
+        assert self.mock_cache.cache_analytics_data.call_args[0][2] == 120
+    
+    def test_invalidate_clears_local_cache(self):
+        """Invalidation drops the user's entries from the in-process cache"""
+        _local_cache.set("dashboard_metrics_1", {"total_leads": 1})
+        _local_cache.set("leads_by_month_1_6", [])
+        _local_cache.set("dashboard_metrics_2", {"total_leads": 2})
+        
+        self.analytics_service.invalidate_analytics_cache(user_id=1)
+        
+        assert _local_cache.get("dashboard_metrics_1") is None
+        assert _local_cache.get("leads_by_month_1_6") is None
+        assert _local_cache.get("dashboard_metrics_2") == {"total_leads": 2}
+    
+    def test_search_conversion_helpers_run_on_separate_sessions(self):
+        """Breakdown helpers run on their own sessions alongside the counts query"""
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.mock_db.get_bind.return_value.dialect.name = "sqlite"
+        self.mock_db.execute.return_value.one.return_value = (10, 2, 5, 1)
+        self.mock_db.query.return_value.filter.return_value = (
+            Session().query(Lead).filter(Lead.user_id == 1)
+        )
+        sessions = []
+        
+        def session_factory():
+            session = Mock(spec=Session)
+            sessions.append(session)
+            return session
+        
+        service = AnalyticsService(self.mock_db, self.mock_cache, session_factory=session_factory)
+        result = service.get_search_conversion_metrics(user_id=1)
+        
+        assert len(sessions) == 2
+        for session in sessions:
+            session.execute.assert_called_once()
+            session.close.assert_called_once()
+        # Total and conversion counts in one statement on the request session
+        assert self.mock_db.execute.call_count == 1
+        assert result["search_to_contact_rate"] == 20.0
+        assert result["search_to_qualified_rate"] == 50.0
+    
     def test_invalidate_analytics_cache(self):
         """Test analytics cache invalidation"""
         # Test user-specific invalidation
@@ -167,6 +523,8 @@ class TestAnalyticsService:
         
         # Verify cache invalidation was called
         self.mock_cache.invalidate_pattern.assert_called()
+        self.mock_cache.invalidate_pattern.assert_any_call("analytics:top_converting_filters_1_*")
+        self.mock_cache.invalidate_pattern.assert_any_call("analytics:conversion_by_query_type_1_*")
         assert result is True
         
         # Test global invalidation
@@ -182,7 +540,7 @@ class TestAnalyticsService:
         self.mock_cache.get_cached_analytics_data.return_value = None
         
         # Setup database error
-        self.mock_db.query.side_effect = Exception("Database error")
+        self.mock_db.execute.side_effect = Exception("Database error")
         
         # Call method
         result = self.analytics_service.get_dashboard_metrics(user_id=1)
@@ -194,5 +552,235 @@ class TestAnalyticsService:
         assert result["conversion_rate"] == 0.0
 
 
+class TestAnalyticsQueryBudget:
+    """Query-count regression tests against an in-memory database"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_database(self, sqlite_engine, sqlite_session):
+        """Seed a few leads inside the per-test transaction"""
+        _local_cache.clear()
+        self.engine = sqlite_engine
+        self.db = sqlite_session
+        
+        now = datetime.utcnow()
+        self.db.add_all([
+            Lead(user_id=1, company="Acme", email="a@acme.com", phone="1", industry="Tech",
+                 location="SP", score=80, created_at=now - timedelta(days=1)),
+            Lead(user_id=1, company="Beta", email="b@beta.com", industry="Tech",
+                 score=40, created_at=now - timedelta(days=10)),
+            Lead(user_id=1, company="Gama", score=10, created_at=now - timedelta(days=30)),
+            Lead(user_id=2, company="Other", email="o@other.com", score=90, created_at=now),
+        ])
+        self.db.commit()
+        
+        self.mock_cache = Mock(spec=CacheManager)
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.analytics_service = AnalyticsService(self.db, self.mock_cache)
+    
+    @pytest.mark.parametrize("method_name,kwargs,budget", QUERY_BUDGETS)
+    def test_query_budget(self, method_name, kwargs, budget):
+        """Each analytics method stays within its statement budget"""
+        with QueryCounter(self.engine) as counter:
+            result = getattr(self.analytics_service, method_name)(**kwargs)
+        
+        assert counter.count <= budget, counter.statements
+        assert not (isinstance(result, dict) and "error" in result)
+    
+    def test_leads_by_month_counts(self):
+        """Monthly buckets come from the grouped query"""
+        result = self.analytics_service.get_leads_by_month(user_id=1, months=6)
+        
+        assert sum(r["leads"] for r in result) == 3
+        assert sum(r["qualified"] for r in result) == 2
+    
+    def test_empty_user_metrics_cached_with_empty_ttl(self):
+        """An empty user's metrics are cached briefly and served from cache on the next read"""
+        for method_name in ("get_source_metrics", "get_dashboard_metrics", "get_quality_scores"):
+            method = getattr(self.analytics_service, method_name)
+            with QueryCounter(self.engine) as counter:
+                first = method(user_id=42)
+            assert counter.count == 1
+            assert self.mock_cache.cache_analytics_data.call_args[0][2] == self.analytics_service.cache_ttl["empty"]
+            
+            with QueryCounter(self.engine) as counter:
+                assert method(user_id=42) == first
+            assert counter.count == 0
+    
+    def test_dashboard_metrics_single_query(self):
+        """Dashboard metrics are computed in one round trip"""
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service.get_dashboard_metrics(user_id=1)
+        
+        assert counter.count == 1
+        assert "error" not in result
+        assert result["total_leads"] == 3
+        assert result["qualified_leads"] == 2
+        assert result["high_quality_leads"] == 1
+        assert result["recent_leads"] == 1
+        assert result["growth_rate"] == 0.0
+        # (1 * 500 + 1 * 200 + 1 * 50) / 3
+        assert result["average_roi"] == 250
+    
+    def test_total_leads_memoized_within_request(self):
+        """Totals computed by one metric are reused by the next"""
+        self.analytics_service.get_dashboard_metrics(user_id=1)
+        
+        with QueryCounter(self.engine) as counter:
+            assert self.analytics_service._total_leads(1) == 3
+        assert counter.count == 0
+        
+        self.analytics_service.invalidate_analytics_cache(user_id=1)
+        with QueryCounter(self.engine) as counter:
+            assert self.analytics_service._total_leads(1) == 3
+        assert counter.count == 1
+    
+    def test_search_conversion_rates_use_exact_total(self):
+        """Rates divide by the exact lead count, not the planner estimate"""
+        self.analytics_service._approx_row_count = Mock(return_value=2_500_000)
+        
+        result = self.analytics_service.get_search_conversion_metrics()
+        
+        # 3 of the 4 seeded leads have an email or phone
+        assert result["search_to_qualified_rate"] == 75.0
+    
+    def test_approx_total_leads_falls_back_to_exact_count(self):
+        """Non-PostgreSQL databases use the exact count"""
+        assert self.analytics_service._approx_total_leads() == 4
+        assert self.analytics_service._approx_total_leads(user_id=1) == 3
+    
+    def test_source_metrics_single_query(self):
+        """Source breakdown is computed in one round trip"""
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service.get_source_metrics(user_id=1)
+        
+        assert counter.count == 1
+        by_source = {row["source"]: row["leads"] for row in result}
+        assert by_source["Website"] == 1
+        assert by_source["LinkedIn"] == 0
+        assert by_source["Referências"] == 2
+        assert result[0] == {"source": "Referências", "leads": 2, "percentage": 66.7}
+        assert [row["leads"] for row in result] == [2, 1, 0, 0]
+    
+    def test_search_facets_single_query(self):
+        """All facet dimensions are fetched in one round trip"""
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service.get_search_facets(user_id=1)
+        
+        assert counter.count == 1
+        assert result["industries"] == [{"value": "Tech", "count": 2}]
+        assert result["locations"] == [{"value": "SP", "count": 1}]
+        assert result["company_sizes"] == []
+        assert result["revenue_ranges"] == []
+    
+    def test_statements_built_once_per_scope(self):
+        """Statement factories reuse one statement per scope"""
+        assert _dashboard_metrics_stmt(True) is _dashboard_metrics_stmt(True)
+        assert _dashboard_metrics_stmt(True) is not _dashboard_metrics_stmt(False)
+        
+        global_metrics = self.analytics_service.get_dashboard_metrics()
+        user_metrics = self.analytics_service.get_dashboard_metrics(user_id=2)
+        assert global_metrics["total_leads"] == 4
+        assert user_metrics["total_leads"] == 1
+    
+    def test_lead_relationships_do_not_lazy_load(self):
+        """Iterating leads cannot silently issue one query per row"""
+        leads = self.db.query(Lead).filter(Lead.user_id == 1).all()
+        with pytest.raises(InvalidRequestError):
+            leads[0].user
+        
+        self.db.expunge_all()
+        with QueryCounter(self.engine) as counter:
+            leads = self.db.query(Lead).options(selectinload(Lead.user)).all()
+            [lead.user for lead in leads]
+        assert counter.count == 2
+    
+    def test_indexing_status_single_query(self):
+        """Indexing coverage and recent activity come from one aggregate"""
+        now = datetime.utcnow()
+        leads = self.db.query(Lead).order_by(Lead.id).all()
+        leads[0].indexed_at = now - timedelta(hours=1)
+        leads[1].indexed_at = now - timedelta(days=3)
+        self.db.commit()
+        
+        with QueryCounter(self.engine) as counter:
+            status = self.analytics_service._get_indexing_status()
+        
+        assert counter.count == 1
+        assert status["total_leads"] == 4
+        assert status["indexed_leads"] == 2
+        assert status["recent_indexed_24h"] == 1
+        assert status["coverage_percent"] == 50.0
+    
+    def test_helper_results_are_cached(self):
+        """Slow-changing helper results are cached under shared keys"""
+        self.analytics_service._get_indexing_status()
+        with QueryCounter(self.engine) as counter:
+            self.analytics_service._get_indexing_status()
+        assert counter.count == 0
+        
+        keys = [call.args[0] for call in self.mock_cache.cache_analytics_data.call_args_list]
+        assert keys == ["indexing_status_global"]
+        
+        user_1 = self.db.query(Lead).filter(Lead.user_id == 1)
+        user_2 = self.db.query(Lead).filter(Lead.user_id == 2)
+        key_1 = self.analytics_service._query_cache_key("top_converting_filters", user_1, 1)
+        assert key_1 == self.analytics_service._query_cache_key(
+            "top_converting_filters", self.db.query(Lead).filter(Lead.user_id == 1), 1
+        )
+        assert key_1.startswith("top_converting_filters_1_")
+        assert key_1 != self.analytics_service._query_cache_key("top_converting_filters", user_2, 2)
+        assert self.analytics_service._query_cache_key(
+            "top_converting_filters", self.db.query(Lead)
+        ) == "top_converting_filters_global"
+    
+    def test_conversion_by_query_type_single_query(self):
+        """Query-type conversion counters come from one aggregate"""
+        query = self.db.query(Lead).filter(Lead.user_id == 1)
+        
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service._calculate_conversion_by_query_type(query)
+        
+        assert counter.count == 1
+        assert result == [{
+            "type": "Industry + Location",
+            "searches": 1,
+            "conversions": 1,
+            "rate": 100.0
+        }]
+    
+    def test_top_converting_filters_single_query(self):
+        """Industry and location filters are fetched with one UNION ALL"""
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service._calculate_top_converting_filters(self.db.query(Lead))
+        
+        assert counter.count == 1
+        assert result == [
+            {"filter": "industry:Tech", "usage": 2, "conversion_rate": 100.0},
+            {"filter": "location:SP", "usage": 1, "conversion_rate": 100.0}
+        ]
+    
+    def test_top_converting_filters_apply_query_filters(self):
+        """User-scoped requests only rank that user's leads"""
+        query = self.db.query(Lead).filter(Lead.user_id == 2)
+        
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service._calculate_top_converting_filters(query, 2)
+        
+        assert counter.count == 1
+        # User 2's only lead has neither an industry nor a location
+        assert result == []
+    
+    def test_quality_scores_single_query(self):
+        """Quality buckets are counted in one grouped query"""
+        with QueryCounter(self.engine) as counter:
+            result = self.analytics_service.get_quality_scores(user_id=1)
+        
+        assert counter.count == 1
+        assert result["high_quality"]["count"] == 0
+        assert result["good_quality"]["count"] == 1
+        assert result["medium_quality"]["count"] == 1
+        assert result["low_quality"]["count"] == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -17,12 +17,13 @@ from src.auth.utils import (
 class TestPasswordUtils:
     """Test password hashing and verification utilities"""
     
-    def test_password_hashing(self):
+    def test_password_hashing(self, known_hash):
         """Test password hashing works correctly"""
         password = "testpassword123"
-        hashed = get_password_hash(password)
+        hashed = known_hash(password)
         
         assert hashed != password
+        assert known_hash(password) is hashed
         assert verify_password(password, hashed) is True
         assert verify_password("wrongpassword", hashed) is False
     
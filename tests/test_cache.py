@@ -3,10 +3,15 @@ Unit tests for Redis cache manager
 """
 import pytest
 import json
+import orjson
+import redis
 import time
+from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock
-from src.cache.manager import CacheManager
+from src.cache.manager import CacheManager, popular_search_buffer
 from src.cache.config import CacheConfig
+from src.cache.local import LocalTTLCache
+from src.cache.policy import MemoPolicy, best_ttl
 from src.cache.decorators import (
     cache_result, 
     cache_search_results, 
@@ -54,6 +59,7 @@ class TestCacheManager:
     @pytest.fixture
     def mock_redis(self):
         """Mock Redis client"""
+        popular_search_buffer.clear()
         mock_client = Mock()
         mock_client.ping.return_value = True
         mock_client.setex.return_value = True
@@ -61,7 +67,7 @@ class TestCacheManager:
         mock_client.delete.return_value = 1
         mock_client.exists.return_value = False
         mock_client.ttl.return_value = 3600
-        mock_client.keys.return_value = []
+        mock_client.scan_iter.side_effect = lambda **kwargs: iter([])
         mock_client.zincrby.return_value = 1
         mock_client.zrevrange.return_value = []
         mock_client.flushdb.return_value = True
@@ -132,7 +138,8 @@ class TestCacheManager:
         
         # Same content should produce same hash regardless of order
         assert hash1 == hash2
-        assert len(hash1) == 32  # MD5 hash length
+        assert len(hash1) == 32  # 128-bit BLAKE2b digest
+        assert cache_manager._hash_query({"text": "other"}) != hash1
     
     def test_set_get_cache(self, cache_manager, mock_redis):
         """Test basic cache set and get operations"""
@@ -183,13 +190,26 @@ class TestCacheManager:
     
     def test_invalidate_pattern(self, cache_manager, mock_redis):
         """Test pattern-based cache invalidation"""
-        mock_redis.keys.return_value = ["search:key1", "search:key2"]
-        mock_redis.delete.return_value = 2
+        mock_redis.scan_iter.side_effect = lambda **kwargs: iter(["search:key1", "search:key2"])
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [2]
         
         result = cache_manager.invalidate_pattern("search:*")
         assert result == 2
-        mock_redis.keys.assert_called_with("search:*")
-        mock_redis.delete.assert_called_with("search:key1", "search:key2")
+        mock_redis.scan_iter.assert_called_with(match="search:*", count=CacheConfig.INVALIDATION_BATCH_SIZE)
+        pipe.unlink.assert_called_once_with("search:key1", "search:key2")
+        mock_redis.keys.assert_not_called()
+    
+    def test_invalidate_pattern_unlinks_in_batches(self, cache_manager, mock_redis, monkeypatch):
+        """Matching keys are unlinked in fixed-size batches, each sent once it fills"""
+        monkeypatch.setattr(CacheConfig, "INVALIDATION_BATCH_SIZE", 2)
+        mock_redis.scan_iter.side_effect = lambda **kwargs: iter(["k1", "k2", "k3"])
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.side_effect = [[2], [1]]
+        
+        assert cache_manager.invalidate_pattern("k*") == 3
+        assert [call.args for call in pipe.unlink.call_args_list] == [("k1", "k2"), ("k3",)]
+        assert pipe.execute.call_count == 2
     
     def test_cache_search_results(self, cache_manager, mock_redis):
         """Test search results caching"""
@@ -236,24 +256,52 @@ class TestCacheManager:
         
         result = cache_manager.cache_lead_data(123, lead_data)
         assert result is True
-        mock_redis.setex.assert_called_with("lead:123", 7200, json.dumps(lead_data, default=str))
+        key, ttl, payload = mock_redis.setex.call_args[0]
+        assert (key, ttl) == ("lead:123", 7200)
+        assert orjson.loads(payload) == lead_data
+    
+    def test_serialize_data_is_compact(self, cache_manager):
+        """Payloads are written without padding or escaped UTF-8"""
+        data = {"source": "Referências", "leads": [1, 2]}
+        
+        serialized = cache_manager._serialize_data(data)
+        
+        assert serialized == '{"source":"Referências","leads":[1,2]}'.encode()
+        assert cache_manager._deserialize_data(serialized) == data
+    
+    def test_serialize_data_handles_datetimes_and_int_keys(self, cache_manager):
+        """Datetimes become ISO strings and non-string keys are stringified"""
+        data = {"last_updated": datetime(2024, 1, 2, 3, 4, 5), "hours": {9: 12}}
+        
+        serialized = cache_manager._serialize_data(data)
+        
+        assert cache_manager._deserialize_data(serialized) == {
+            "last_updated": "2024-01-02T03:04:05",
+            "hours": {"9": 12}
+        }
     
     def test_invalidate_search_cache(self, cache_manager, mock_redis):
         """Test search cache invalidation"""
-        mock_redis.keys.return_value = ["search:hash1", "search:hash2"]
-        mock_redis.delete.return_value = 2
+        mock_redis.scan_iter.side_effect = lambda **kwargs: iter(["search:hash1", "search:hash2"])
+        mock_redis.pipeline.return_value.execute.return_value = [2]
         
         result = cache_manager.invalidate_search_cache()
         assert result == 2
-        mock_redis.keys.assert_called_with("search:*")
+        mock_redis.scan_iter.assert_called_with(match="search:*", count=CacheConfig.INVALIDATION_BATCH_SIZE)
     
     def test_popular_searches(self, cache_manager, mock_redis):
         """Test popular searches functionality"""
-        # Test adding popular search
-        mock_redis.zincrby.return_value = 1
+        # Test adding popular search; increments are buffered until flushed
+        pipe = mock_redis.pipeline.return_value
         result = cache_manager.add_popular_search("test query")
         assert result is True
-        mock_redis.zincrby.assert_called_with("popular_searches", 1, "test query")
+        cache_manager.add_popular_search("test query")
+        pipe.zincrby.assert_not_called()
+        
+        assert cache_manager.flush_popular_searches() == 1
+        pipe.zincrby.assert_called_once_with("popular_searches", 2, "test query")
+        pipe.execute.assert_called_once()
+        mock_redis.zincrby.assert_not_called()
         
         # Test getting popular searches
         mock_redis.zrevrange.return_value = ["query1", "query2", "query3"]
@@ -261,6 +309,155 @@ class TestCacheManager:
         assert result == ["query1", "query2", "query3"]
         mock_redis.zrevrange.assert_called_with("popular_searches", 0, 2)
     
+    def test_popular_searches_flushed_when_batch_fills(self, cache_manager, mock_redis, monkeypatch):
+        """A full buffer is written by the call that fills it"""
+        monkeypatch.setattr(popular_search_buffer, "batch_size", 2)
+        pipe = mock_redis.pipeline.return_value
+        
+        cache_manager.add_popular_search("tech")
+        pipe.execute.assert_not_called()
+        cache_manager.add_popular_search("retail")
+        
+        pipe.execute.assert_called_once()
+        assert len(popular_search_buffer) == 0
+    
+    def test_failed_popular_search_flush_keeps_counts(self, cache_manager, mock_redis):
+        """Counts that could not be written stay buffered for the next flush"""
+        mock_redis.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+        cache_manager.add_popular_search("tech")
+        
+        assert cache_manager.flush_popular_searches() == 0
+        assert popular_search_buffer.drain() == ["tech"]
+    
+    def test_failed_popular_search_flush_backs_off(self, cache_manager, mock_redis, monkeypatch):
+        """After a failed write, full batches wait out a backoff instead of retrying per request"""
+        monkeypatch.setattr(popular_search_buffer, "batch_size", 1)
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.side_effect = redis.ConnectionError("down")
+        
+        cache_manager.add_popular_search("tech")
+        cache_manager.add_popular_search("retail")
+        
+        pipe.execute.assert_called_once()
+        assert not popular_search_buffer.ready()
+        
+        pipe.execute.side_effect = None
+        assert cache_manager.flush_popular_searches() == 2
+        assert popular_search_buffer.ready()
+    
+    def test_popular_searches_left_to_background_writer(self, cache_manager, mock_redis, monkeypatch):
+        """A due batch is not written on the request path while a writer owns flushing"""
+        monkeypatch.setattr(popular_search_buffer, "batch_size", 1)
+        monkeypatch.setattr(popular_search_buffer, "flushed_in_background", True)
+        
+        cache_manager.add_popular_search("tech")
+        
+        mock_redis.pipeline.return_value.execute.assert_not_called()
+        assert len(popular_search_buffer) == 1
+    
+    def test_mget_analytics(self, cache_manager, mock_redis):
+        """Test analytics entries are fetched in one pipelined round trip"""
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [json.dumps({"total_leads": 5}), None]
+        
+        result = cache_manager.mget_analytics(["dashboard_metrics_1", "source_metrics_1"])
+        
+        assert result == ({"dashboard_metrics_1": {"total_leads": 5}}, [])
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        pipe.get.assert_any_call("analytics:dashboard_metrics_1")
+        pipe.get.assert_any_call("analytics:source_metrics_1")
+        pipe.execute.assert_called_once()
+        mock_redis.get.assert_not_called()
+    
+    def test_acquire_job_lock_once_per_interval(self, cache_manager, mock_redis):
+        """Test a periodic job is claimed with SET NX EX and skipped while the lock is held"""
+        mock_redis.set.side_effect = [True, None]
+        
+        assert cache_manager.acquire_job_lock("analytics_view_refresh", 299) is True
+        assert cache_manager.acquire_job_lock("analytics_view_refresh", 299) is False
+        mock_redis.set.assert_called_with("job_lock:analytics_view_refresh", 1, nx=True, ex=299)
+    
+    def test_mget_analytics_lists_stale_keys_without_locking(self, cache_manager, mock_redis):
+        """Test stale entries are returned with their keys and no refresh lock is taken"""
+        stale = {"_value": {"total_leads": 5}, "_computed_at": time.time() - 600, "_soft_ttl": 300}
+        mock_redis.pipeline.return_value.execute.return_value = [json.dumps(stale)]
+        
+        result = cache_manager.mget_analytics(["dashboard_metrics_1"])
+        
+        assert result == ({"dashboard_metrics_1": {"total_leads": 5}}, ["dashboard_metrics_1"])
+        mock_redis.set.assert_not_called()
+    
+    def test_cache_analytics_data_keeps_stale_window(self, cache_manager, mock_redis):
+        """Test analytics entries are stored with their soft TTL and a stale window"""
+        result = cache_manager.cache_analytics_data("dashboard_metrics_1", {"total_leads": 5}, ttl=300)
+        
+        assert result is True
+        call_args = mock_redis.setex.call_args
+        assert call_args[0][0] == "analytics:dashboard_metrics_1"
+        assert call_args[0][1] == 300 + CacheConfig.ANALYTICS_STALE_TTL
+        entry = json.loads(call_args[0][2])
+        assert entry["_value"] == {"total_leads": 5}
+        assert entry["_soft_ttl"] == 300
+        mock_redis.delete.assert_called_with("analytics:lock:dashboard_metrics_1")
+    
+    def test_get_cached_analytics_data_fresh(self, cache_manager, mock_redis):
+        """Test fresh analytics entries are returned without taking the lock"""
+        entry = {"_value": {"total_leads": 5}, "_computed_at": time.time(), "_soft_ttl": 300}
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [600, json.dumps(entry)]
+        
+        assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") == {"total_leads": 5}
+        pipe.ttl.assert_called_once_with("analytics:dashboard_metrics_1")
+        pipe.get.assert_called_once_with("analytics:dashboard_metrics_1")
+        mock_redis.get.assert_not_called()
+        mock_redis.set.assert_not_called()
+    
+    def test_get_cached_analytics_data_stale(self, cache_manager, mock_redis):
+        """Test only the caller that wins the refresh lock sees a miss"""
+        entry = {"_value": {"total_leads": 5}, "_computed_at": time.time() - 400, "_soft_ttl": 300}
+        mock_redis.pipeline.return_value.execute.return_value = [200, json.dumps(entry)]
+        
+        # Lock acquired: this caller recomputes, without decoding the payload
+        mock_redis.set.return_value = True
+        with patch.object(cache_manager, "_deserialize_data") as deserialize:
+            assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") is None
+        deserialize.assert_not_called()
+        mock_redis.set.assert_called_with(
+            "analytics:lock:dashboard_metrics_1", 1, nx=True, ex=CacheConfig.ANALYTICS_LOCK_TTL
+        )
+        
+        # Lock held elsewhere: serve the stale value
+        mock_redis.set.return_value = None
+        assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") == {"total_leads": 5}
+        assert mock_redis.set.call_count == 2
+    
+    def test_get_cached_analytics_data_early_refresh(self, cache_manager, mock_redis):
+        """Test entries near the end of their TTL may be refreshed early by one caller"""
+        entry = {"_value": {"total_leads": 5}, "_computed_at": time.time() - 290, "_soft_ttl": 300}
+        mock_redis.pipeline.return_value.execute.return_value = [310, json.dumps(entry)]
+        mock_redis.set.return_value = True
+        
+        with patch("src.cache.manager.random.random", return_value=0.99):
+            assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") == {"total_leads": 5}
+        mock_redis.set.assert_not_called()
+        
+        with patch("src.cache.manager.random.random", return_value=0.0):
+            assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") is None
+        mock_redis.set.assert_called_once()
+    
+    def test_add_and_count_active_users(self, cache_manager, mock_redis):
+        """Test active users go to hourly HyperLogLogs and are counted over two hours"""
+        at = datetime(2024, 5, 1, 10, 30)
+        pipe = mock_redis.pipeline.return_value
+        mock_redis.pfcount.return_value = 12
+        
+        assert cache_manager.add_active_user(7, at=at) is True
+        pipe.pfadd.assert_called_once_with("active_users:2024050110", 7)
+        pipe.expire.assert_called_once_with("active_users:2024050110", CacheConfig.ACTIVE_USERS_TTL)
+        
+        assert cache_manager.count_active_users(at=at) == 12
+        mock_redis.pfcount.assert_called_once_with("active_users:2024050110", "active_users:2024050109")
+    
     def test_health_check_healthy(self, cache_manager, mock_redis):
         """Test health check when Redis is healthy"""
         mock_redis.setex.return_value = True
@@ -272,6 +469,31 @@ class TestCacheManager:
         assert result["redis_available"] is True
         assert "connected_clients" in result
     
+    def test_get_stats_and_health_single_info(self, cache_manager, mock_redis):
+        """Stats and health come from one INFO call"""
+        mock_redis.info.return_value = {
+            "keyspace_hits": 30,
+            "keyspace_misses": 10,
+            "connected_clients": 2,
+            "db0": {"keys": 7, "expires": 3}
+        }
+        
+        stats, health = cache_manager.get_stats_and_health()
+        
+        mock_redis.info.assert_called_once_with()
+        mock_redis.setex.assert_not_called()
+        assert stats["hits"] == 30
+        assert stats["misses"] == 10
+        assert stats["keys_count"] == 7
+        assert health["status"] == "healthy"
+        assert health["connected_clients"] == 2
+    
+    def test_get_stats_and_health_disabled(self, disabled_cache_manager):
+        """Disabled cache reports no stats"""
+        stats, health = disabled_cache_manager.get_stats_and_health()
+        assert stats is None
+        assert health["status"] == "disabled"
+    
     def test_health_check_disabled(self, disabled_cache_manager):
         """Test health check when cache is disabled"""
         result = disabled_cache_manager.health_check()
@@ -287,6 +509,69 @@ class TestCacheManager:
         assert disabled_cache_manager.get_ttl("search", "key") == -1
         assert disabled_cache_manager.invalidate_pattern("*") == 0
 
+class TestCacheManagerWithFakeRedis:
+    """Cache manager round trips against an in-process Redis"""
+    
+    @pytest.fixture
+    def fake_redis(self):
+        """In-process Redis with the same decoding as the production client"""
+        fakeredis = pytest.importorskip("fakeredis")
+        popular_search_buffer.clear()
+        return fakeredis.FakeRedis(decode_responses=True)
+    
+    @pytest.fixture
+    def cache_manager(self, fake_redis):
+        """Cache manager backed by fakeredis"""
+        return CacheManager(fake_redis)
+    
+    def test_set_get_round_trip(self, cache_manager):
+        """Values written as orjson bytes read back through a decoding client"""
+        data = {"source": "Referências", "at": datetime(2024, 1, 2), "hours": {9: 1}}
+        
+        assert cache_manager.set("lead", "1", data, ttl=60)
+        
+        assert cache_manager.get("lead", "1") == {
+            "source": "Referências", "at": "2024-01-02T00:00:00", "hours": {"9": 1}
+        }
+        assert 0 < cache_manager.get_ttl("lead", "1") <= 60
+        assert cache_manager.get("lead", "missing") is None
+    
+    def test_search_results_round_trip(self, cache_manager):
+        """Equivalent queries share one cache entry"""
+        results = [{"id": 1, "name": "Lead 1"}]
+        
+        cache_manager.cache_search_results({"text": "tech", "filters": {"industry": "x"}}, results)
+        cached = cache_manager.get_cached_search_results({"filters": {"industry": "x"}, "text": "tech"})
+        
+        assert cached["results"] == results
+        assert cached["count"] == 1
+    
+    def test_invalidate_pattern_removes_only_matches(self, cache_manager, fake_redis, monkeypatch):
+        """SCAN + UNLINK in batches removes every matching key and nothing else"""
+        monkeypatch.setattr(CacheConfig, "INVALIDATION_BATCH_SIZE", 2)
+        for identifier in ("a", "b", "c"):
+            cache_manager.set("search", identifier, {"q": identifier})
+        cache_manager.cache_lead_data(1, {"id": 1})
+        
+        assert cache_manager.invalidate_search_cache() == 3
+        assert fake_redis.keys("search:*") == []
+        assert cache_manager.get_cached_lead_data(1) == {"id": 1}
+    
+    def test_analytics_entry_round_trip(self, cache_manager):
+        """Fresh analytics entries come back unwrapped from the pipelined read"""
+        cache_manager.cache_analytics_data("dashboard_metrics_1", {"total_leads": 3}, ttl=300)
+        
+        assert cache_manager.get_cached_analytics_data("dashboard_metrics_1") == {"total_leads": 3}
+        assert cache_manager.get_cached_analytics_data("missing") is None
+    
+    def test_popular_searches_ranked(self, cache_manager):
+        """Popular searches come back most frequent first"""
+        for query in ("retail", "tech", "tech"):
+            cache_manager.add_popular_search(query)
+        cache_manager.flush_popular_searches()
+        
+        assert cache_manager.get_popular_searches(limit=2) == ["tech", "retail"]
+
 class TestCacheDecorators:
     """Test cache decorators"""
     
@@ -383,5 +668,90 @@ class TestCacheDecorators:
         mock_cache_manager.get.assert_not_called()
         mock_cache_manager.set.assert_not_called()
 
+class TestLocalTTLCache:
+    """Test the in-process L1 cache"""
+    
+    def test_get_and_expire(self):
+        """Entries are returned until their TTL passes"""
+        cache = LocalTTLCache(maxsize=4, ttl=60)
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2}, ttl=0)
+        
+        assert cache.get("a") == {"v": 1}
+        assert cache.get("b") is None
+        assert cache.get("missing") is None
+    
+    def test_evicts_least_recently_used(self):
+        """The least recently read entry is evicted when full"""
+        cache = LocalTTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert len(cache) == 2
+    
+    def test_invalidate_pattern(self):
+        """Glob patterns remove only matching keys"""
+        cache = LocalTTLCache()
+        cache.set("leads_by_month_1_6", [])
+        cache.set("leads_by_month_12_6", [])
+        
+        assert cache.invalidate_pattern("leads_by_month_1_*") == 1
+        assert cache.get("leads_by_month_12_6") == []
+
+class TestMemoPolicy:
+    """Test adaptive TTL bookkeeping and tuning"""
+    
+    def setup_method(self):
+        """Setup a policy with a mocked Redis client"""
+        self.redis = Mock()
+        self.pipe = self.redis.pipeline.return_value
+        self.policy = MemoPolicy(candidates=[60, 300, 3600], staleness_cost=1.0, min_requests=1)
+    
+    def test_best_ttl_trades_savings_against_staleness(self):
+        """Unchanging data gets the longest TTL, frequently changing data a shorter one"""
+        assert best_ttl(1.0, 0.2, 0.0, [60, 300, 3600], 1.0) == 3600
+        assert best_ttl(1.0, 0.2, 0.01, [60, 300, 3600], 1.0) == 60
+    
+    def test_flush_pipes_counters(self):
+        """Recorded outcomes are added to the shared hash in one pipeline"""
+        self.policy.record("facets", "hit")
+        self.policy.record("facets", "miss", compute_seconds=0.25)
+        
+        self.policy.flush(self.redis)
+        
+        self.pipe.hincrby.assert_any_call("memo_policy:stats", "facets:hit", 1)
+        self.pipe.hincrby.assert_any_call("memo_policy:stats", "facets:miss", 1)
+        self.pipe.hincrbyfloat.assert_called_once_with("memo_policy:stats", "facets:compute_seconds", 0.25)
+        self.pipe.execute.assert_called_once()
+    
+    def test_tune_stores_ttls_and_resets_window(self):
+        """Tuned TTLs go to the memo_policy:ttl hash and the stats window is reset atomically"""
+        self.pipe.execute.return_value = [{
+            "window_start": "1000",
+            "facets:hit": "99",
+            "facets:miss": "1",
+            "facets:compute_seconds": "0.5"
+        }, 1]
+        
+        ttls = self.policy.tune(self.redis, now=1100)
+        
+        assert ttls == {"facets": 3600}
+        self.redis.pipeline.assert_called_once_with(transaction=True)
+        self.pipe.hgetall.assert_called_once_with("memo_policy:stats")
+        self.pipe.delete.assert_called_once_with("memo_policy:stats")
+        self.redis.hset.assert_called_once_with("memo_policy:ttl", mapping={"facets": 3600})
+    
+    def test_ttl_for_reads_tuned_hash_once(self):
+        """Tuned TTLs are read from Redis once per refresh and default otherwise"""
+        self.redis.hgetall.return_value = {"facets": "300"}
+        
+        assert self.policy.ttl_for(self.redis, "facets", 600) == 300
+        assert self.policy.ttl_for(self.redis, "leads_by_month", 3600) == 3600
+        self.redis.hgetall.assert_called_once_with("memo_policy:ttl")
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
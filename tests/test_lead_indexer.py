@@ -64,6 +64,10 @@ class TestLeadIndexer:
         # Test duplicates removal
         result = self.indexer._tokenize_text("tech tech technology")
         assert len([t for t in result if t == "tech"]) == 1
+        
+        # Test first-seen order is preserved
+        result = self.indexer._tokenize_text("zeta alpha zeta beta")
+        assert result == ["zeta", "alpha", "beta"]
     
     def test_extract_keywords_from_text(self):
         """Test keyword extraction from text"""
@@ -209,6 +213,29 @@ class TestLeadIndexer:
         self.mock_cache.remove_from_inverted_index.assert_called()
         self.mock_cache.invalidate_lead_cache.assert_called_with(lead_id)
     
+    def test_remove_lead_from_index_uses_stored_tokens(self):
+        """Test removal reads stored tokens instead of re-tokenizing"""
+        cached_data = {
+            "company_tokens": ["techcorp"],
+            "industry_tokens": [],
+            "location_tokens": [],
+            "keywords": [],
+            "searchable_text": "techcorp technology saas python",
+            "all_tokens": ["techcorp", "technology", "saas", "python"]
+        }
+        
+        self.mock_cache.get_cached_lead_data = Mock(return_value=cached_data)
+        self.mock_cache.remove_from_inverted_index = Mock(return_value=True)
+        self.mock_cache.invalidate_lead_cache = Mock(return_value=True)
+        self.indexer._tokenize_text = Mock()
+        
+        result = self.indexer.remove_lead_from_index(1)
+        
+        assert result is True
+        self.indexer._tokenize_text.assert_not_called()
+        removed = {c.args[0] for c in self.mock_cache.remove_from_inverted_index.call_args_list}
+        assert removed == {"techcorp", "technology", "saas", "python"}
+    
     def test_search_leads_by_tokens(self):
         """Test searching leads using Redis inverted index"""
         tokens = ["technology", "saas"]
@@ -277,6 +304,65 @@ class TestLeadIndexer:
         assert stats.failed_leads == 0
         assert stats.processing_time > 0
     
+    def test_bulk_index_leads_shares_batch_timestamp(self):
+        """Test that leads in one batch share indexed_at and a single commit"""
+        mock_leads = []
+        for i in range(3):
+            mock_lead = Mock(spec=LeadModel)
+            mock_lead.id = i + 1
+            mock_lead.company = f"Company {i+1}"
+            mock_lead.description = None
+            mock_lead.industry = "Technology"
+            mock_lead.location = "São Paulo"
+            mock_lead.keywords = []
+            mock_lead.contact = None
+            mock_lead.email = None
+            mock_lead.website = None
+            mock_lead.phone = None
+            mock_lead.revenue = None
+            mock_lead.employees = None
+            mock_leads.append(mock_lead)
+        
+        mock_query = Mock()
+        mock_offset_limit = Mock()
+        mock_offset_limit.all.side_effect = [mock_leads, []]
+        mock_query.offset.return_value.limit.return_value = mock_offset_limit
+        mock_query.count.return_value = len(mock_leads)
+        self.mock_db.query.return_value = mock_query
+        self.mock_db.commit = Mock()
+        
+        self.mock_cache.add_to_inverted_index = Mock(return_value=True)
+        self.mock_cache.cache_lead_data = Mock(return_value=True)
+        
+        stats = self.indexer.bulk_index_leads(batch_size=3)
+        
+        assert stats.indexed_leads == 3
+        assert len({lead.indexed_at for lead in mock_leads}) == 1
+        self.mock_db.commit.assert_called_once()
+    
+    def test_bulk_index_leads_caps_recorded_errors(self):
+        """Test that per-lead errors are capped and the overflow counted"""
+        from src.search.indexer import MAX_RECORDED_ERRORS
+        
+        total = MAX_RECORDED_ERRORS + 5
+        mock_leads = [Mock(spec=LeadModel, id=i + 1) for i in range(total)]
+        
+        mock_query = Mock()
+        mock_offset_limit = Mock()
+        mock_offset_limit.all.side_effect = [mock_leads, []]
+        mock_query.offset.return_value.limit.return_value = mock_offset_limit
+        mock_query.count.return_value = total
+        self.mock_db.query.return_value = mock_query
+        self.mock_db.commit = Mock()
+        
+        self.indexer._index_lead_no_commit = Mock(side_effect=RuntimeError("boom"))
+        
+        stats = self.indexer.bulk_index_leads(batch_size=total)
+        
+        assert stats.failed_leads == total
+        assert len(stats.errors) == MAX_RECORDED_ERRORS
+        assert stats.errors_truncated == 5
+    
     def test_get_indexing_status(self):
         """Test getting indexing status"""
         # Mock database queries
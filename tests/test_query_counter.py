@@ -0,0 +1,89 @@
+"""
+Tests for query counting helpers
+"""
+
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from src.database.query_counter import (
+    QueryBudgetMiddleware,
+    QueryCounter,
+    install_request_query_counter
+)
+
+
+class TestQueryBudgetMiddleware:
+    """Test request-scoped statement budgets"""
+
+    def setup_method(self):
+        """Setup an app that runs a fixed number of statements per request"""
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        install_request_query_counter(self.engine)
+
+        app = FastAPI()
+        app.add_middleware(QueryBudgetMiddleware, budgets={"/analytics": 2})
+
+        @app.get("/analytics/{statements}")
+        async def run_statements(statements: int):
+            with self.engine.connect() as conn:
+                for _ in range(statements):
+                    conn.execute(text("SELECT 1"))
+            return {"ok": True}
+
+        @app.get("/other")
+        async def other():
+            with self.engine.connect() as conn:
+                for _ in range(5):
+                    conn.execute(text("SELECT 1"))
+            return {"ok": True}
+
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        """Dispose of the in-memory database"""
+        self.engine.dispose()
+
+    def test_logs_when_budget_exceeded(self, caplog):
+        """Requests over budget are logged"""
+        with caplog.at_level(logging.WARNING, logger="src.database.query_counter"):
+            assert self.client.get("/analytics/3").status_code == 200
+
+        assert "3 statements (budget 2)" in caplog.text
+
+    def test_silent_within_budget_or_unbudgeted(self, caplog):
+        """Requests within budget and paths without a budget are not logged"""
+        with caplog.at_level(logging.WARNING, logger="src.database.query_counter"):
+            self.client.get("/analytics/2")
+            self.client.get("/other")
+
+        assert "Query budget exceeded" not in caplog.text
+
+    def test_query_counter_context(self):
+        """QueryCounter only counts statements inside the context"""
+        with self.engine.connect() as conn:
+            with QueryCounter(self.engine) as counter:
+                conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+
+        assert counter.count == 1
+
+    def test_query_counter_skips_transaction_control(self, sqlite_engine, sqlite_session):
+        """Savepoints around a test's commits are not counted as queries"""
+        with QueryCounter(sqlite_engine) as counter:
+            sqlite_session.execute(text("SELECT 1"))
+            sqlite_session.commit()
+
+        assert counter.statements == ["SELECT 1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,477 @@
+"""
+Tests for the search analytics tracker
+"""
+
+import time
+import pytest
+from unittest.mock import Mock, MagicMock
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.services.search_analytics_tracker import (
+    SearchAnalyticsTracker, search_event_buffer, flush_search_events,
+    SearchEventWriter, start_search_event_writer, stop_search_event_writer, _csv_field, _encode_filters,
+    SEARCH_EVENT_COPY_MIN_ROWS
+)
+from src.cache.buffer import BatchBuffer
+from src.cache.manager import CacheManager, popular_search_buffer
+from src.database.models import Lead, SearchAnalyticsEvent, LeadInteractionEvent
+from src.database.query_counter import QueryCounter
+
+
+class TestSearchEventBuffering:
+    """Search events are buffered and written in batches"""
+
+    @pytest.fixture(autouse=True)
+    def setup_database(self, sqlite_engine, sqlite_session):
+        """Use the shared in-memory database and start with an empty buffer"""
+        search_event_buffer.clear()
+        self.engine = sqlite_engine
+        self.db = sqlite_session
+        self.mock_cache = Mock(spec=CacheManager)
+        self.tracker = SearchAnalyticsTracker(self.db, self.mock_cache)
+        yield
+        search_event_buffer.clear()
+
+    def writer_sessions(self):
+        # Writer sessions join the test's transaction, so their commits are
+        # rolled back with it
+        return sessionmaker(bind=self.db.bind, join_transaction_mode="create_savepoint")
+
+    def track(self, query_text="tech"):
+        return self.tracker.track_search_event(
+            user_id=None,
+            query_text=query_text,
+            filters_applied={"industry": "Tecnologia"},
+            results_count=3,
+            response_time_ms=40
+        )
+
+    def count_events(self):
+        return self.db.scalar(select(func.count(SearchAnalyticsEvent.id)))
+
+    def test_events_are_buffered_until_flushed(self):
+        """Tracking does not touch the database until the buffer is flushed"""
+        with QueryCounter(self.engine) as counter:
+            self.track()
+            self.track("retail")
+
+        assert counter.count == 0
+        assert len(search_event_buffer) == 2
+        self.mock_cache.add_popular_search.assert_any_call("retail")
+
+        with QueryCounter(self.engine) as counter:
+            assert flush_search_events(self.db) == 2
+
+        assert counter.count == 1
+        assert self.count_events() == 2
+        assert len(search_event_buffer) == 0
+
+    def test_full_buffer_is_flushed_by_the_tracking_call(self, monkeypatch):
+        """Reaching the batch size writes the whole batch in one statement"""
+        monkeypatch.setattr(search_event_buffer, "batch_size", 3)
+
+        self.track()
+        self.track()
+        assert self.count_events() == 0
+
+        self.track()
+
+        assert self.count_events() == 3
+        row = self.db.scalars(select(SearchAnalyticsEvent)).first()
+        assert row.filters_applied == {"industry": "Tecnologia"}
+        assert row.created_at is not None
+
+    def test_background_writer_flushes_off_the_request_path(self, monkeypatch):
+        """With the writer running, a due buffer is written by the writer thread"""
+        monkeypatch.setattr(search_event_buffer, "batch_size", 2)
+        writer = start_search_event_writer(self.writer_sessions())
+        try:
+            with QueryCounter(self.engine) as counter:
+                self.track()
+                self.track()
+                deadline = time.monotonic() + 2
+                while len(search_event_buffer) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        finally:
+            stop_search_event_writer()
+
+        assert not writer.is_alive()
+        assert counter.count == 1
+        assert self.count_events() == 2
+
+    def test_stopping_the_writer_flushes_remaining_events(self):
+        """Events still buffered at shutdown are written"""
+        start_search_event_writer(self.writer_sessions())
+        self.track()
+
+        stop_search_event_writer()
+
+        assert self.count_events() == 1
+
+    def test_failed_flush_requeues_rows(self):
+        """Rows whose insert failed go back into the buffer"""
+        db = Mock(spec=Session)
+        db.execute.side_effect = OperationalError("INSERT", {}, Exception("down"))
+        self.track()
+
+        assert flush_search_events(db) == 0
+
+        db.rollback.assert_called_once()
+        assert len(search_event_buffer) == 1
+        assert not search_event_buffer.ready()
+
+    def test_writer_skips_flush_while_backing_off(self):
+        """The writer leaves requeued events alone until the backoff has passed"""
+        self.track()
+        search_event_buffer.requeue(search_event_buffer.drain())
+        session_factory = Mock()
+        writer = SearchEventWriter(session_factory)
+
+        assert writer.flush() == 0
+        session_factory.assert_not_called()
+
+        assert writer.flush(force=True) == 1
+        session_factory.return_value.commit.assert_called_once()
+
+    def test_writer_flushes_popular_searches(self):
+        """Popular-search counts are written by the writer, not the request path"""
+        popular_search_buffer.clear()
+        cache_manager = Mock(spec=CacheManager)
+        writer = start_search_event_writer(self.writer_sessions(), cache_manager)
+        try:
+            assert popular_search_buffer.flushed_in_background
+            popular_search_buffer.add("tech")
+        finally:
+            stop_search_event_writer()
+
+        assert not popular_search_buffer.flushed_in_background
+        cache_manager.flush_popular_searches.assert_called()
+        popular_search_buffer.clear()
+
+    def test_requeue_keeps_newest_rows_within_limit(self):
+        """A buffer past its limit drops the oldest rows"""
+        buffer = BatchBuffer(batch_size=10, max_age=60, limit=3)
+        buffer.add({"n": 3})
+        buffer.add({"n": 4})
+
+        assert buffer.requeue([{"n": 1}, {"n": 2}]) == 1
+        assert [row["n"] for row in buffer.drain()] == [2, 3, 4]
+
+    def test_large_batches_use_copy_on_postgresql(self):
+        """Big batches are streamed with COPY instead of an INSERT"""
+        db = Mock(spec=Session)
+        db.get_bind.return_value.dialect.name = "postgresql"
+        cursor = db.connection.return_value.connection.cursor.return_value
+        for _ in range(SEARCH_EVENT_COPY_MIN_ROWS):
+            self.track('say "hi"')
+
+        assert flush_search_events(db) == SEARCH_EVENT_COPY_MIN_ROWS
+
+        db.execute.assert_not_called()
+        db.commit.assert_called_once()
+        sql, data = cursor.copy_expert.call_args[0]
+        assert sql.startswith("COPY search_analytics_events (user_id, query_text,")
+        assert "FORMAT csv" in sql
+        first_line = data.getvalue().splitlines()[0]
+        assert first_line.startswith(',"say ""hi""","{""industry"": ""Tecnologia""}",3,40,')
+        cursor.close.assert_called_once()
+
+    def test_csv_field_distinguishes_null_from_empty_text(self):
+        """NULL is an unquoted empty field while empty text stays quoted"""
+        assert _csv_field(None) == ""
+        assert _csv_field("") == '""'
+        assert _csv_field(7) == "7"
+        assert _csv_field("a,b\nc") == '"a,b\nc"'
+
+
+    def test_filters_encoded_once_per_distinct_set(self):
+        """Repeated filter sets reuse the interned JSON and read back as dicts"""
+        filters = {"industry": "Tecnologia", "keywords": ["saas", "b2b"]}
+
+        assert _encode_filters(filters) is _encode_filters(dict(filters))
+        assert _encode_filters(None) is None
+        assert _encode_filters({"nested": [{"a": 1}]}) == '{"nested": [{"a": 1}]}'
+        assert _encode_filters({"remote": 1}) == '{"remote": 1}'
+        assert _encode_filters({"remote": True}) == '{"remote": true}'
+        assert _encode_filters({"remote": 1.0}) == '{"remote": 1.0}'
+        assert _encode_filters({"sizes": [1]}) != _encode_filters({"sizes": [True]})
+
+        self.track()
+        flush_search_events(self.db)
+
+        event = self.db.scalars(select(SearchAnalyticsEvent)).one()
+        assert event.filters_applied == {"industry": "Tecnologia"}
+
+
+    def test_events_without_session_leave_column_to_database(self):
+        """Anonymous events omit session_id so the server default can fill it"""
+        self.track()
+        self.tracker.track_search_event(
+            user_id=None, query_text="retail", filters_applied=None,
+            results_count=1, response_time_ms=30, session_id="abc"
+        )
+
+        with QueryCounter(self.engine) as counter:
+            assert flush_search_events(self.db) == 2
+
+        assert counter.count == 2
+        assert "session_id" in counter.statements[0]
+        assert "session_id" not in counter.statements[1]
+        sessions = dict(self.db.execute(
+            select(SearchAnalyticsEvent.query_text, SearchAnalyticsEvent.session_id)
+        ).all())
+        assert sessions == {"tech": None, "retail": "abc"}
+
+
+class TestInteractionTracking:
+    """Lead interactions, clicks and conversions against an in-memory database"""
+
+    @pytest.fixture(autouse=True)
+    def setup_database(self, sqlite_engine, sqlite_session):
+        """Seed a lead and a search event inside the per-test transaction"""
+        self.engine = sqlite_engine
+        self.db = sqlite_session
+        self.db.add_all([
+            Lead(id=1, user_id=1, company="Acme"),
+            SearchAnalyticsEvent(id=1, user_id=1, query_text="tech", results_count=3,
+                                 clicked_results=0, contacted_leads=0, converted_leads=0)
+        ])
+        self.db.commit()
+
+        self.commits = 0
+        commit = self.db.commit
+
+        def counting_commit():
+            self.commits += 1
+            commit()
+
+        self.db.commit = counting_commit
+        self.mock_cache = Mock(spec=CacheManager)
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.tracker = SearchAnalyticsTracker(self.db, self.mock_cache)
+
+    def test_click_commits_once(self):
+        """A click and its lead interaction share one commit"""
+        assert self.tracker.track_search_result_click(1, lead_id=1, position=2, user_id=1) is True
+
+        assert self.commits == 1
+        assert self.db.get(SearchAnalyticsEvent, 1).clicked_results == 1
+        interaction = self.db.scalars(select(LeadInteractionEvent)).one()
+        assert interaction.source_search_query == "tech"
+        assert self.db.get(Lead, 1).view_count == 1
+
+    def test_click_increments_without_select(self):
+        """The click counter is bumped by UPDATE ... RETURNING, with no prior SELECT"""
+        with QueryCounter(self.engine) as counter:
+            assert self.tracker.track_search_result_click(1, lead_id=1, position=1) is True
+
+        assert counter.count == 1
+        assert "RETURNING" in counter.statements[0].upper()
+        assert self.db.get(SearchAnalyticsEvent, 1).clicked_results == 1
+
+    def test_click_with_interaction_in_one_transaction(self):
+        """The counter bump, interaction insert and lead counters go out in one transaction"""
+        with QueryCounter(self.engine) as counter:
+            assert self.tracker.track_search_result_click(1, lead_id=1, position=2, user_id=1) is True
+
+        assert counter.count == 3
+
+    def test_failed_interaction_rolls_back_click(self, monkeypatch):
+        """An interaction that cannot be recorded undoes the click counter too"""
+        record = self.tracker._record_lead_interaction
+
+        def failing_record(*args, **kwargs):
+            record(*args, **kwargs)
+            raise OperationalError("INSERT", {}, Exception("disk I/O error"))
+
+        monkeypatch.setattr(self.tracker, "_record_lead_interaction", failing_record)
+
+        assert self.tracker.track_search_result_click(1, lead_id=1, position=2, user_id=1) is False
+
+        assert self.commits == 0
+        assert self.db.get(SearchAnalyticsEvent, 1).clicked_results == 0
+        assert self.db.scalar(select(func.count(LeadInteractionEvent.id))) == 0
+
+    def test_click_on_missing_event(self):
+        """Clicks on an unknown search event are not tracked"""
+        assert self.tracker.track_search_result_click(99, lead_id=1, position=1, user_id=1) is False
+        assert self.db.scalar(select(func.count(LeadInteractionEvent.id))) == 0
+
+    def test_conversion_counters(self):
+        """Each conversion type bumps its own counter"""
+        assert self.tracker.track_search_conversion(1, lead_id=1, conversion_type="contact") is True
+        assert self.tracker.track_search_conversion(1, lead_id=1, conversion_type="sale", user_id=1) is True
+        assert self.tracker.track_search_conversion(1, lead_id=1, conversion_type="other") is True
+
+        event = self.db.get(SearchAnalyticsEvent, 1)
+        assert (event.contacted_leads, event.converted_leads) == (1, 1)
+        interaction = self.db.scalars(select(LeadInteractionEvent)).one()
+        assert interaction.source_search_query == "tech"
+
+    def test_lead_counters_updated_in_one_statement(self):
+        """Counters are incremented by the database, without reading the lead"""
+        self.db.get(Lead, 1).conversion_score = 0.95
+        self.db.commit()
+
+        with QueryCounter(self.engine) as counter:
+            self.tracker._update_lead_counters(1, "call")
+            self.tracker._update_lead_counters(1, "convert")
+            self.tracker._update_lead_counters(1, "unknown")
+
+        assert counter.count == 2
+        assert all(statement.lstrip().upper().startswith("UPDATE") for statement in counter.statements)
+        self.db.commit()
+        lead = self.db.get(Lead, 1)
+        assert lead.contact_count == 1
+        assert lead.last_contact is not None
+        assert lead.conversion_score == 1.0
+
+    def test_summary_aggregated_in_one_query(self):
+        """The summary totals come from one aggregate query"""
+        self.db.add_all([
+            SearchAnalyticsEvent(user_id=1, query_text="retail", results_count=5, response_time_ms=60,
+                                 cache_hit="hit", clicked_results=1, contacted_leads=1, converted_leads=0),
+            SearchAnalyticsEvent(user_id=2, query_text="other", results_count=9, response_time_ms=10)
+        ])
+        self.db.commit()
+
+        with QueryCounter(self.engine) as counter:
+            summary = self.tracker.get_search_analytics_summary(user_id=1)
+
+        assert counter.count == 1
+        assert summary["total_searches"] == 2
+        assert summary["avg_response_time_ms"] == 30
+        assert summary["cache_hit_rate"] == 50.0
+        assert summary["avg_results_per_search"] == 4.0
+        assert summary["total_clicks"] == 1
+        assert summary["total_conversions"] == 1
+        assert summary["period_days"] == 30
+
+    def test_summary_and_popular_queries_cached(self):
+        """Computed results are cached and served from the cache next time"""
+        summary = self.tracker.get_search_analytics_summary(user_id=1, days=7)
+        popular = self.tracker.get_popular_queries(user_id=1, days=7, limit=5)
+
+        self.mock_cache.cache_analytics_data.assert_any_call("search_summary_1_7", summary, 120)
+        self.mock_cache.cache_analytics_data.assert_any_call("popular_queries_1_7_5", popular, 120)
+        assert popular == [{"query": "tech", "count": 1, "avg_results": 3.0, "avg_response_time_ms": 0}]
+
+        self.mock_cache.get_cached_analytics_data.return_value = []
+        with QueryCounter(self.engine) as counter:
+            assert self.tracker.get_popular_queries(user_id=1, days=7, limit=5) == []
+
+        assert counter.count == 0
+
+    def test_summary_without_events(self):
+        """A window without events returns the zeroed summary"""
+        summary = self.tracker.get_search_analytics_summary(user_id=99)
+
+        assert summary["total_searches"] == 0
+        assert summary["cache_hit_rate"] == 0.0
+
+    def test_insights_without_session_factory_use_request_session(self):
+        """Without a session factory the summary and popular queries are read in turn"""
+        insights = self.tracker.get_search_insights(user_id=1, days=7, limit=5)
+
+        assert insights["summary"]["total_searches"] == 1
+        assert [query["query"] for query in insights["popular_queries"]] == ["tech"]
+
+    def test_insights_read_on_own_sessions(self):
+        """With a session factory each read gets its own session"""
+        cached = {
+            "search_summary_1_7": {"total_searches": 4},
+            "popular_queries_1_7_5": [{"query": "tech", "count": 4}]
+        }
+        self.mock_cache.get_cached_analytics_data.side_effect = cached.get
+        sessions = []
+
+        def session_factory():
+            session = Mock(spec=Session)
+            sessions.append(session)
+            return session
+
+        tracker = SearchAnalyticsTracker(self.db, self.mock_cache, session_factory=session_factory)
+
+        with QueryCounter(self.engine) as counter:
+            insights = tracker.get_search_insights(user_id=1, days=7, limit=5)
+
+        assert counter.count == 0
+        assert len(sessions) == 2
+        for session in sessions:
+            session.close.assert_called_once()
+        assert insights == {
+            "summary": {"total_searches": 4},
+            "popular_queries": [{"query": "tech", "count": 4}]
+        }
+
+    def test_interaction_inserted_with_returning(self):
+        """The interaction row is written by one INSERT ... RETURNING, even inside a batch"""
+        with self.tracker.batch():
+            with QueryCounter(self.engine) as counter:
+                interaction_id = self.tracker.track_lead_interaction(
+                    user_id=1, lead_id=1, interaction_type="call"
+                )
+
+        inserts = [sql for sql in counter.statements if sql.lstrip().upper().startswith("INSERT")]
+        assert len(inserts) == 1
+        assert "RETURNING" in inserts[0].upper()
+        assert interaction_id == self.db.scalar(select(LeadInteractionEvent.id))
+
+    def test_batch_commits_once_for_many_interactions(self):
+        """Interactions tracked inside a batch are committed when it exits"""
+        with self.tracker.batch():
+            self.tracker.track_lead_interaction(user_id=1, lead_id=1, interaction_type="view")
+            self.tracker.track_lead_interaction(user_id=1, lead_id=1, interaction_type="call")
+            assert self.commits == 0
+
+        assert self.commits == 1
+        assert self.db.scalar(select(func.count(LeadInteractionEvent.id))) == 2
+
+    def test_batch_rolls_back_on_error(self):
+        """An exception inside a batch discards everything tracked in it"""
+        with pytest.raises(RuntimeError):
+            with self.tracker.batch():
+                self.tracker.track_lead_interaction(user_id=1, lead_id=1, interaction_type="view")
+                raise RuntimeError("boom")
+
+        assert self.commits == 0
+        assert self.db.scalar(select(func.count(LeadInteractionEvent.id))) == 0
+
+
+class TestPopularQueriesView:
+    """Popular queries read from the pre-aggregated view on PostgreSQL"""
+
+    def setup_method(self):
+        """Setup a mocked PostgreSQL session"""
+        self.mock_db = Mock(spec=Session)
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        self.mock_db.begin_nested.return_value = MagicMock()
+        self.mock_cache = Mock(spec=CacheManager)
+        self.mock_cache.get_cached_analytics_data.return_value = None
+        self.tracker = SearchAnalyticsTracker(self.mock_db, self.mock_cache)
+
+    def test_thirty_day_window_reads_view(self):
+        """The default window is served by popular_queries_30d"""
+        row = Mock(query_text="tech", count=4, avg_results=2.5, avg_response_time=41.6)
+        self.mock_db.execute.return_value.all.return_value = [row]
+
+        result = self.tracker.get_popular_queries(user_id=1, limit=5)
+
+        stmt, params = self.mock_db.execute.call_args[0]
+        assert "popular_queries_30d" in str(stmt)
+        assert params == {"user_id": 1, "limit": 5}
+        assert result == [{"query": "tech", "count": 4, "avg_results": 2.5, "avg_response_time_ms": 42}]
+        self.mock_db.query.assert_not_called()
+
+    def test_other_windows_query_events(self):
+        """Windows other than 30 days aggregate the raw events"""
+        self.tracker.get_popular_queries(user_id=1, days=7)
+
+        self.mock_db.execute.assert_not_called()
+        self.mock_db.query.assert_called_once()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])